@@ -2,6 +2,8 @@ import serial
 import time
 import sys
 
+from core import nmea0183
+
 # --- Parámetros de la Pixhawk (TELEM2) ---
 # En Raspberry Pi, el puerto UART suele ser '/dev/ttyS0' o '/dev/ttyAMA0'.
 # Asegúrate de habilitar el puerto serial de la RPi y deshabilitar la consola serial.
@@ -16,28 +18,6 @@ VELOCIDAD_VIENTO_MS = 2.0
 # Convertir m/s a Nudos (aproximadamente)
 VELOCIDAD_VIENTO_NUDOS = VELOCIDAD_VIENTO_MS * 1.94384
 
-def calcular_checksum(sentencia):
-    """Calcula el checksum NMEA (XOR de todos los caracteres entre $ y *)"""
-    checksum = 0
-    # Comenzar desde el primer carácter después de '$'
-    for char in sentencia[1:]:
-        checksum ^= ord(char)
-    # Formatear el checksum como un string hexadecimal de 2 dígitos
-    return f"{checksum:02X}"
-
-def generar_mwv(angulo, velocidad, unidad_velocidad='N', referencia_angulo='R'):
-    """Genera la sentencia NMEA 0183 MWV (Wind Speed and Angle)"""
-    # Referencia de ángulo: R=Relative (relativo al vehículo/barco), T=True (respecto al Norte)
-    # Unidad de velocidad: N=Nudos, M=Metros por segundo (No siempre soportado, N es común)
-    
-    # Formato: $WIMWV,AAA.A,R,VVV.V,N,A*CC
-    
-    data = f"WIMWV,{angulo:.1f},{referencia_angulo},{velocidad:.1f},{unidad_velocidad},A"
-    checksum = calcular_checksum('$' + data)
-    
-    sentencia_completa = f"${data}*{checksum}\r\n"
-    return sentencia_completa
-
 def enviar_datos_nmea():
     """Inicializa el puerto serial y envía los datos de viento"""
     print(f"Puerto: {PUERTO_SERIAL} | Baudios: {BAUD_RATE}")
@@ -54,18 +34,17 @@ def enviar_datos_nmea():
     try:
         while True:
             # 1. Generar la sentencia NMEA 0183 MWV (usando Nudos)
-            mwv_sentence = generar_mwv(
+            mwv_sentence = nmea0183.mwv(
                 ANGULO_VIENTO,
                 VELOCIDAD_VIENTO_NUDOS,
-                unidad_velocidad='N',
-                referencia_angulo='R'
+                reference=b'R',
+                unit=b'N'
             )
             
-            # 2. Convertir a bytes y enviar
-            data_to_send = mwv_sentence.encode('ascii')
-            ser.write(data_to_send)
+            # 2. Enviar (ya son bytes)
+            ser.write(mwv_sentence)
             
-            print(f"Enviado: {mwv_sentence.strip()}")
+            print(f"Enviado: {mwv_sentence.decode().strip()}")
             
             # Esperar 1 segundo antes de enviar el siguiente dato
             time.sleep(1) 
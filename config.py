@@ -8,6 +8,16 @@ DB_PATH = os.path.join(BASE_DIR, "storage", "telemetria.db")
 # --- CONFIGURACIÓN VIENTO (NMEA2000 -> NMEA0183) ---
 # Puerto del conversor Actisense NGT-1 (USB)
 PORT_WIND_IN = "/dev/ttyUSB0"  
+BAUD_WIND_IN = 115200
+
+# Decodificación NMEA2000: "native" lee las tramas binarias del NGT-1 en el
+# propio proceso (core/actisense.py); "analyzer" usa actisense-serial | analyzer -json
+WIND_DECODER = "native"
+# Con el decodificador nativo: guardar también las muestras crudas de cada PGN
+# (wind_samples, nav_samples, environment_samples de storage/db.py)
+N2K_STORE_SAMPLES = True
+# Cada cuántos segundos se escriben en el log los contadores/coste por PGN
+N2K_STATS_INTERVAL = 60.0
 
 # Puerto UART de la Raspberry (GPIO) hacia TELEM2 de la Pixhawk
 # Usamos /dev/serial0 que es el enlace simbólico recomendado en Raspberry Pi
@@ -16,11 +26,128 @@ PORT_WIND_OUT = "/dev/serial0"
 # Baudios para NMEA0183 
 BAUD_WIND_OUT = 4800           
 
+# Salida MWV (core/mwv_output.py): se envía siempre el último viento a esta
+# frecuencia. A 4800 baudios caben unas 15 frases/s; por encima del 80 % del
+# enlace se limita automáticamente.
+MWV_RATE_HZ = 5.0
+# Si el puerto tiene más bytes que estos sin enviar, la frase se descarta
+MWV_MAX_QUEUE_BYTES = 64
+
+# Supervisión de actisense-serial / analyzer y del lector del NGT-1
+# (core/supervisor.py): la espera antes de relanzar una etapa caída empieza
+# en SUPERVISOR_BACKOFF_MIN, se duplica en cada fallo seguido hasta
+# SUPERVISOR_BACKOFF_MAX y vuelve al mínimo si la etapa aguantó
+# SUPERVISOR_STABLE_S segundos
+SUPERVISOR_BACKOFF_MIN = 0.1
+SUPERVISOR_BACKOFF_MAX = 5.0
+SUPERVISOR_STABLE_S = 10.0
+# Métricas de reinicios y tiempos de recuperación (JSON, se reescribe en cada cambio)
+SUPERVISOR_METRICS_PATH = os.path.join(BASE_DIR, "storage", "supervisor.json")
+
+# Latencias por salto (core/latency.py): del trozo leído del NGT-1 a la MWV
+# en la UART, al commit en 'telemetria' y a la respuesta de /api/live.
+# Presupuesto para que el piloto automático reciba el viento
+LATENCY_BUDGET_MS = 100
+# Muestras recientes por salto para los percentiles
+LATENCY_WINDOW = 10000
+# Cada cuántos segundos se exportan (JSON) y se resumen en el log
+LATENCY_EXPORT_INTERVAL = 10.0
+LATENCY_METRICS_PATH = os.path.join(BASE_DIR, "storage", "latency.json")
+
 # --- CONFIGURACIÓN MAVLINK (PIXHAWK) ---
 # Conexión por el puerto USB micro/C de la Pixhawk
 PORT_MAVLINK = "/dev/ttyACM0"  
 BAUD_MAVLINK = 57600           
 
+# --- MODO DE EJECUCIÓN (main.py) ---
+# "threads" = un hilo por sensor (bloqueando en el puerto/tubería);
+# "asyncio" = un único bucle de eventos (core/async_runtime.py).
+# Se puede cambiar al arrancar: python main.py --runtime asyncio
+RUNTIME_MODE = "threads"
+
+# --- FLUJOS MAVLINK (lo que pedimos a la Pixhawk) ---
+# Mensaje -> frecuencia objetivo (Hz). Tras el heartbeat (y tras cada
+# reconexión) se piden con SET_MESSAGE_INTERVAL; el resto no se lee.
+MAVLINK_STREAMS = {
+    "ATTITUDE": 10,
+    "GLOBAL_POSITION_INT": 5,
+    "SERVO_OUTPUT_RAW": 2,
+    "RAW_IMU": 25,              # se guarda en imu_samples (storage/db.py)
+}
+# Antes de pedirlos, parar los flujos por defecto (SRx_* de ArduPilot)
+MAVLINK_STOP_DEFAULT_STREAMS = True
+# Cada cuántos segundos se miden las frecuencias reales y se escriben en el log
+MAVLINK_RATE_CHECK_INTERVAL = 30.0
+# Si un mensaje llega por debajo de esta fracción de su objetivo, se vuelve a pedir
+MAVLINK_RATE_TOLERANCE = 0.8
+
+# --- GRABACIÓN CRUDA MAVLINK (tlog, ver storage/tlog.py) ---
+# Copia los bytes tal cual llegan de la Pixhawk a ficheros rotativos con un
+# índice tiempo -> posición; se decodifican después, bajo demanda. Con la
+# grabación activa RAW_IMU ya no se guarda en imu_samples (sin ella, va por
+# lotes con el escritor de core.database).
+MAVLINK_TLOG = False
+TLOG_DIR = os.path.join(BASE_DIR, "storage", "tlog")
+# Tamaño a partir del cual se empieza un fichero nuevo
+TLOG_MAX_FILE_MB = 64
+# Espacio total máximo: al superarlo se borran los ficheros más antiguos
+TLOG_MAX_TOTAL_MB = 4096
+
 # --- INTERVALOS ---
 # Frecuencia de guardado en la base de datos (en segundos)
 WIND_SAVE_INTERVAL = 1.0
+
+# Frecuencia (Hz) a la que el hilo de fusión escribe filas completas en 'telemetria'
+FUSION_RATE_HZ = 5.0
+
+# --- PERFIL SQLITE ---
+# PRAGMAs aplicados a cada conexión (una por hilo, viva todo el proceso).
+# WAL permite que los dashboards lean mientras los hilos de ingesta escriben.
+DB_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",      # en WAL solo hace fsync en los checkpoints
+    "mmap_size": 64 * 1024 * 1024,  # 64 MB mapeados en memoria
+    "cache_size": -8000,          # negativo = KiB (unos 8 MB de caché)
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,         # ms esperando un bloqueo antes de fallar
+}
+
+# --- PARTICIONADO (shards) DE LAS TABLAS *_samples ---
+# Las muestras de storage/db.py se reparten en un fichero por periodo.
+# "day" = un fichero por día UTC, "session" = uno por arranque,
+# None = sin particionar (todo en DB_PATH, como antes).
+SHARD_PERIOD = "day"
+SHARD_DIR = os.path.join(BASE_DIR, "storage", "shards")
+# Los shards que terminaron hace más de estos días se borran al abrir uno nuevo
+SHARD_RETENTION_DAYS = 30
+
+# --- ARCHIVO FRÍO (bloques comprimidos, ver storage/archive.py) ---
+# Las muestras *_samples más antiguas que esto se compactan en bloques
+ARCHIVE_AFTER_HOURS = 24
+# Cada cuántos segundos se ejecuta el compactador
+ARCHIVE_INTERVAL = 600
+
+# --- ESCRITURA EN BASE DE DATOS (write-behind) ---
+# Tamaño máximo de la cola entre los hilos de sensores y el hilo escritor
+DB_QUEUE_MAXSIZE = 10000
+# Filas por transacción: se hace commit cada N filas...
+DB_BATCH_SIZE = 200
+# ...o cada T segundos, lo que ocurra antes
+DB_FLUSH_INTERVAL = 0.5
+
+# --- BUFFER EN VIVO (memoria compartida, ver core/live_buffer.py) ---
+# main.py publica aquí cada fila fusionada; los dashboards lo leen sin tocar la BD.
+# /dev/shm es RAM en la Raspberry; si no existe se usa el directorio temporal.
+LIVE_BUFFER_PATH = "/dev/shm/sailbridge_live" if os.path.isdir("/dev/shm") else os.path.join(
+    os.environ.get("TMPDIR", "/tmp"), "sailbridge_live")
+# Segundos de historia que caben en el anillo (a FUSION_RATE_HZ filas/s)
+LIVE_BUFFER_SECONDS = 600
+
+# --- CANAL DE EMPUJE (socket UNIX, ver core/live_stream.py) ---
+# main.py envía cada fila fusionada a los suscriptores (el dashboard Flask,
+# que la reparte por SSE en /api/stream a cada navegador).
+LIVE_STREAM_PATH = os.path.join(os.environ.get("TMPDIR", "/tmp"), "sailbridge_live.sock")
+# Actualizaciones en cola por navegador: si no da abasto se descartan las más antiguas
+LIVE_STREAM_CLIENT_QUEUE = 20
+# Comentario SSE de mantenimiento si no hay datos (s): detecta clientes desconectados
+LIVE_STREAM_HEARTBEAT = 15.0
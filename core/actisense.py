@@ -0,0 +1,283 @@
+# core/actisense.py
+import math
+import time
+import struct
+import logging
+from collections import namedtuple
+
+import serial
+
+# Tramas del Actisense NGT-1 (protocolo binario que usa actisense-serial):
+#   DLE STX <comando> <longitud> <payload...> <checksum> DLE ETX
+# Dentro de la trama cada DLE se duplica (DLE DLE). El checksum hace que la
+# suma de comando + longitud + payload + checksum sea 0 (mod 256).
+DLE = 0x10
+STX = 0x02
+ETX = 0x03
+_START = bytes([DLE, STX])
+_ESCAPED_DLE = bytes([DLE, DLE])
+
+N2K_MSG_RECEIVED = 0x93   # mensaje NMEA2000 recibido del bus
+NGT_MSG_SEND = 0xA1       # comando al propio NGT-1
+
+# Orden de arranque de actisense-serial: modo "recibir todos los PGN"
+NGT_STARTUP_MSG = bytes([0x11, 0x02, 0x00])
+
+# Velocidad del puerto USB del NGT-1
+ACTISENSE_BAUD = 115200
+
+N2kMessage = namedtuple("N2kMessage", "pgn prio src dst timestamp_ms data")
+
+# Tabla de PGN: pgn -> (descripción, campos). Cada campo es
+# (nombre, bit de inicio, nº de bits, resolución, con signo). Los datos son
+# little-endian; un valor con todos los bits a 1 (0x7F.. con signo)
+# significa "no disponible". Los ángulos se dan en grados.
+_RAD4 = math.degrees(0.0001)   # 0.0001 rad -> grados
+
+PGN_TABLE = {
+    127250: ("Vessel Heading", (
+        ("sid", 0, 8, 1, False),
+        ("heading_deg", 8, 16, _RAD4, False),
+        ("deviation_deg", 24, 16, _RAD4, True),
+        ("variation_deg", 40, 16, _RAD4, True),
+        ("reference", 56, 2, 1, False),
+    )),
+    128259: ("Speed", (
+        ("sid", 0, 8, 1, False),
+        ("stw_ms", 8, 16, 0.01, False),
+        ("speed_ground_ms", 24, 16, 0.01, False),
+        ("stw_type", 40, 8, 1, False),
+    )),
+    129025: ("Position, Rapid Update", (
+        ("lat_deg", 0, 32, 1e-7, True),
+        ("lon_deg", 32, 32, 1e-7, True),
+    )),
+    129026: ("COG & SOG, Rapid Update", (
+        ("sid", 0, 8, 1, False),
+        ("cog_reference", 8, 2, 1, False),
+        ("cog_deg", 16, 16, _RAD4, False),
+        ("sog_ms", 32, 16, 0.01, False),
+    )),
+    130306: ("Wind Data", (
+        ("sid", 0, 8, 1, False),
+        ("wind_speed_ms", 8, 16, 0.01, False),
+        ("wind_angle_deg", 24, 16, _RAD4, False),
+        ("reference", 40, 3, 1, False),
+    )),
+    130310: ("Environmental Parameters (obsolete)", (
+        ("sid", 0, 8, 1, False),
+        ("water_temp_k", 8, 16, 0.01, False),
+        ("air_temp_k", 24, 16, 0.01, False),
+        ("pressure_hpa", 40, 16, 1, False),
+    )),
+    130311: ("Environmental Parameters", (
+        ("sid", 0, 8, 1, False),
+        ("temp_source", 8, 6, 1, False),
+        ("humidity_source", 14, 2, 1, False),
+        ("temp_k", 16, 16, 0.01, False),
+        ("humidity_pct", 32, 16, 0.004, True),
+        ("pressure_hpa", 48, 16, 1, False),
+    )),
+}
+
+_STRUCT_CODES = {(8, False): "B", (16, False): "H", (32, False): "I",
+                 (8, True): "b", (16, True): "h", (32, True): "i"}
+
+
+# ============================================================
+#   DECODIFICACIÓN DE CAMPOS
+# ============================================================
+def compile_extractor(fields):
+    """
+    Precompila los campos de un PGN en una función data -> dict.
+
+    Si todos los campos están alineados a byte se usa un único
+    struct.unpack_from; si no, desplazamientos y máscaras precalculados
+    sobre el entero little-endian de los datos.
+    """
+    specs = []
+    for name, start, length, resolution, signed in fields:
+        mask = (1 << length) - 1
+        na = mask >> 1 if signed else mask
+        specs.append((name, start, length, mask, na, signed, None if resolution == 1 else resolution))
+
+    if all(start % 8 == 0 and (length, signed) in _STRUCT_CODES for _, start, length, _, _, signed, _ in specs):
+        fmt = "<"
+        pos = 0
+        for _, start, length, _, _, signed, _ in sorted(specs, key=lambda f: f[1]):
+            fmt += "x" * (start // 8 - pos) + _STRUCT_CODES[(length, signed)]
+            pos = (start + length) // 8
+        unpack = struct.Struct(fmt).unpack_from
+        size = pos
+        ordered = [(name, na, res) for name, _, _, _, na, _, res in sorted(specs, key=lambda f: f[1])]
+
+        def extract(data):
+            if len(data) < size:
+                return _extract_bits(specs, data)
+            return {
+                name: None if raw == na else (raw if res is None else raw * res)
+                for (name, na, res), raw in zip(ordered, unpack(data))
+            }
+        return extract
+
+    return lambda data: _extract_bits(specs, data)
+
+
+def _extract_bits(specs, data):
+    bits = int.from_bytes(data, "little")
+    n_bits = len(data) * 8
+    fields = {}
+    for name, start, length, mask, na, signed, res in specs:
+        if start + length > n_bits:
+            fields[name] = None
+            continue
+        raw = (bits >> start) & mask
+        if raw == na:
+            fields[name] = None
+            continue
+        if signed and raw >> (length - 1):
+            raw -= 1 << length
+        fields[name] = raw if res is None else raw * res
+    return fields
+
+
+# Extractores precompilados de toda la tabla
+EXTRACTORS = {pgn: compile_extractor(fields) for pgn, (_, fields) in PGN_TABLE.items()}
+
+
+def decode_fields(msg):
+    """Campos de un N2kMessage según PGN_TABLE (None si el PGN no está en la tabla)."""
+    extract = EXTRACTORS.get(msg.pgn)
+    return extract(msg.data) if extract is not None else None
+
+
+# ============================================================
+#   TRAMAS
+# ============================================================
+def encode_frame(command, payload):
+    """Trama completa (con escape de DLE y checksum) para 'command' y 'payload'."""
+    body = bytes([command, len(payload)]) + bytes(payload)
+    body += bytes([(-sum(body)) & 0xFF])
+    return _START + body.replace(b"\x10", _ESCAPED_DLE) + bytes([DLE, ETX])
+
+
+def encode_n2k(pgn, data, prio=2, src=0, dst=255, timestamp_ms=0):
+    """Trama N2K_MSG_RECEIVED como la que envía el NGT-1 (útil para pruebas y benchmarks)."""
+    payload = (
+        bytes([prio, pgn & 0xFF, (pgn >> 8) & 0xFF, (pgn >> 16) & 0xFF, dst, src])
+        + (timestamp_ms & 0xFFFFFFFF).to_bytes(4, "little")
+        + bytes([len(data)])
+        + bytes(data)
+    )
+    return encode_frame(N2K_MSG_RECEIVED, payload)
+
+
+class FrameParser:
+    """
+    Parser incremental de tramas del NGT-1.
+
+    feed() recibe bytes tal y como llegan del puerto (trozos de cualquier
+    tamaño) y devuelve los N2kMessage completos. Si se indica 'pgns', el PGN
+    se mira en la cabecera cruda y el resto de tramas se descartan sin
+    quitar el escape ni comprobar el checksum.
+    """
+
+    def __init__(self, pgns=None):
+        self.pgns = frozenset(pgns) if pgns else None
+        self._buf = bytearray()
+        self.stats = {"frames": 0, "matched": 0, "bad_frames": 0}
+        # Marca monotónica de la última lectura del puerto (la pone read_messages)
+        self.last_read = None
+
+    def _frame_end(self, buf, i):
+        """Posición del DLE ETX que cierra la trama, -1 si falta, o -(pos+2) si hay un DLE STX antes."""
+        while True:
+            j = buf.find(DLE, i)
+            if j < 0 or j + 1 >= len(buf):
+                return -1
+            nxt = buf[j + 1]
+            if nxt == DLE:
+                i = j + 2
+            elif nxt == ETX:
+                return j
+            else:
+                # Trama cortada: DLE STX (u otro byte) sin ETX previo
+                return -(j + 2)
+
+    def feed(self, data):
+        buf = self._buf
+        buf += data
+        out = []
+        pos = 0
+        while True:
+            start = buf.find(_START, pos)
+            if start < 0:
+                # Conservamos un DLE final por si es el inicio de la siguiente trama
+                pos = len(buf) - 1 if buf and buf[-1] == DLE else len(buf)
+                break
+            end = self._frame_end(buf, start + 2)
+            if end == -1:
+                pos = start
+                break
+            if end < -1:
+                self.stats["bad_frames"] += 1
+                pos = -end - 2
+                continue
+            pos = end + 2
+            self.stats["frames"] += 1
+
+            # Filtro por PGN sobre la cabecera cruda: si no hay DLE en los
+            # primeros bytes, el PGN está en posición fija sin quitar el escape
+            head = buf[start + 2:start + 9]
+            if self.pgns is not None and DLE not in head and len(head) == 7:
+                if head[0] != N2K_MSG_RECEIVED or (head[3] | head[4] << 8 | head[5] << 16) not in self.pgns:
+                    continue
+
+            msg = self._parse(bytes(buf[start + 2:end]).replace(_ESCAPED_DLE, b"\x10"))
+            if msg is None:
+                self.stats["bad_frames"] += 1
+            elif self.pgns is None or msg.pgn in self.pgns:
+                self.stats["matched"] += 1
+                out.append(msg)
+        del buf[:pos]
+        return out
+
+    @staticmethod
+    def _parse(raw):
+        """N2kMessage de una trama ya sin escape, o None si no es válida."""
+        if len(raw) < 3 or raw[1] + 3 != len(raw) or sum(raw) & 0xFF:
+            return None
+        if raw[0] != N2K_MSG_RECEIVED:
+            return None
+        p = raw[2:-1]
+        if len(p) < 11 or p[10] + 11 > len(p):
+            return None
+        return N2kMessage(
+            pgn=p[1] | p[2] << 8 | p[3] << 16,
+            prio=p[0],
+            dst=p[4],
+            src=p[5],
+            timestamp_ms=int.from_bytes(p[6:10], "little"),
+            data=p[11:11 + p[10]],
+        )
+
+
+# ============================================================
+#   PUERTO SERIE
+# ============================================================
+def open_port(port, baud=ACTISENSE_BAUD):
+    """Abre el NGT-1 y lo pone en modo 'recibir todos los PGN' (como actisense-serial)."""
+    ser = serial.Serial(port, baud, timeout=1)
+    ser.write(encode_frame(NGT_MSG_SEND, NGT_STARTUP_MSG))
+    logging.info(f"✅ Actisense NGT-1 abierto en {port} @ {baud}")
+    return ser
+
+
+def read_messages(ser, pgns=None, parser=None):
+    """Generador de N2kMessage leídos del puerto, filtrados por 'pgns'."""
+    parser = parser or FrameParser(pgns)
+    while True:
+        chunk = ser.read(ser.in_waiting or 1)
+        if chunk:
+            parser.last_read = time.monotonic()
+            yield from parser.feed(chunk)
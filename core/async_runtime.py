@@ -0,0 +1,405 @@
+# core/async_runtime.py
+import os
+import time
+import signal
+import asyncio
+import logging
+
+import serial
+
+from config import PORT_WIND_IN, BAUD_WIND_IN, PORT_WIND_OUT, BAUD_WIND_OUT, WIND_DECODER
+from config import PORT_MAVLINK, FUSION_RATE_HZ, N2K_STATS_INTERVAL
+from config import DB_BATCH_SIZE, DB_FLUSH_INTERVAL, ARCHIVE_INTERVAL, LATENCY_EXPORT_INTERVAL
+from core import actisense, n2k_dispatch, database, nmea0183, supervisor, latency
+from core.wind_manager import WIND_PGN, ANALYZER_STAGES, NGT1_STAGE
+from core.wind_manager import enviar_viento, viento_de_json, limpiar_procesos
+from core.mwv_output import MwvOutput
+from core.mavlink_manager import open_link, procesar_mensaje, request_streams, StreamMonitor
+from core.state_manager import emit_row
+from storage import archive
+
+# Modo alternativo al de un hilo por sensor de main.py: los puertos serie y
+# las tuberías se registran como descriptores no bloqueantes en un único
+# bucle de eventos, junto con la fusión, el escritor de DB, la salida MWV y
+# los temporizadores de estado. Solo hay un hilo, que duerme en epoll hasta
+# que llegan datos o vence un temporizador.
+
+READ_SIZE = 4096
+# Bytes máximos pendientes hacia la Pixhawk (una MWV atrasada ya no sirve)
+MWV_MAX_PENDING = 1024
+
+
+# ============================================================
+#   DESCRIPTORES NO BLOQUEANTES
+# ============================================================
+async def watch_fd(fd, on_readable):
+    """
+    Llama a on_readable() cada vez que 'fd' tenga datos, hasta que lance
+    una excepción (EOFError al cerrarse), que se propaga al que espera.
+    """
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def readable():
+        try:
+            on_readable()
+        except BlockingIOError:
+            pass
+        except BaseException as e:
+            loop.remove_reader(fd)
+            if not done.done():
+                done.set_exception(e)
+
+    os.set_blocking(fd, False)
+    loop.add_reader(fd, readable)
+    try:
+        await done
+    except EOFError:
+        pass
+    finally:
+        loop.remove_reader(fd)
+
+
+def fd_reader(fd, on_data):
+    """on_readable para watch_fd: lee lo disponible y lo pasa a on_data(bytes)."""
+    def read():
+        chunk = os.read(fd, READ_SIZE)
+        if not chunk:
+            raise EOFError
+        on_data(chunk)
+    return read
+
+
+class FdWriter:
+    """
+    Escritura no bloqueante en un descriptor: lo que no cabe se queda en un
+    buffer que el bucle vacía cuando el descriptor admite más datos.
+    """
+
+    def __init__(self, fd, max_pending=MWV_MAX_PENDING):
+        self.fd = fd
+        self.max_pending = max_pending
+        self._pending = bytearray()
+        self.dropped = 0
+        os.set_blocking(fd, False)
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def write(self, data):
+        """Devuelve los bytes aceptados (0 si el buffer está lleno)."""
+        if self._pending:
+            if len(self._pending) + len(data) > self.max_pending:
+                self.dropped += 1
+                return 0
+            self._pending += data
+            return len(data)
+        try:
+            n = os.write(self.fd, data)
+        except BlockingIOError:
+            n = 0
+        if n < len(data):
+            self._pending += data[n:]
+            asyncio.get_running_loop().add_writer(self.fd, self._drain)
+        return len(data)
+
+    def _drain(self):
+        try:
+            n = os.write(self.fd, self._pending)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logging.error(f"❌ Error escribiendo en el fd {self.fd}: {e}")
+            n = len(self._pending)
+        del self._pending[:n]
+        if not self._pending:
+            asyncio.get_running_loop().remove_writer(self.fd)
+
+    def close(self):
+        try:
+            asyncio.get_running_loop().remove_writer(self.fd)
+        except RuntimeError:
+            pass
+        self._pending.clear()
+
+
+# ============================================================
+#   ESCRITOR DE DB
+# ============================================================
+class DBBatcher:
+    """Agrupa filas de 'telemetria' y hace commit cada DB_BATCH_SIZE filas o DB_FLUSH_INTERVAL s."""
+
+    def __init__(self):
+        self._rows = []
+        self._timer = None
+
+    def insert(self, row):
+        self._rows.append(dict(row))
+        if len(self._rows) >= DB_BATCH_SIZE:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(DB_FLUSH_INTERVAL, self.flush)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+        try:
+            database.write_rows(rows)
+        except Exception as e:
+            logging.error(f"Error escribiendo lote en DB ({len(rows)} filas): {e}")
+
+
+# ============================================================
+#   FUENTES
+# ============================================================
+async def _supervise(name, source, *args):
+    """Ejecuta la corrutina 'source' y la relanza tras un error o fin del flujo (con backoff)."""
+    backoff = supervisor.Backoff()
+    while True:
+        started = time.monotonic()
+        try:
+            await source(*args)
+            logging.warning(f"⚠️ El flujo de {name} se ha detenido inesperadamente.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"❌ Error en {name}: {e}")
+        delay = backoff.failed(time.monotonic() - started)
+        logging.info(f"🔄 Reintentando {name} en {delay * 1000:.0f} ms...")
+        await asyncio.sleep(delay)
+
+
+async def wind_source():
+    """NGT-1 (nativo o analyzer) -> dispatch/MWV, con la Pixhawk como salida."""
+    ser_out = serial.Serial(PORT_WIND_OUT, BAUD_WIND_OUT, timeout=1)
+    out = FdWriter(ser_out.fileno())
+    salida = MwvOutput(out.write, nmea0183.mwv, queue_depth=lambda: out.pending, baud=BAUD_WIND_OUT)
+    sender = asyncio.create_task(mwv_timer(salida))
+    logging.info(f"✅ Puerto serial {PORT_WIND_OUT} listo.")
+    entrada = asyncio.create_task(_wind_input(salida))
+    try:
+        # La entrada se relanza sola y no termina: si algo acaba es la salida MWV
+        done, _ = await asyncio.wait((sender, entrada), return_when=asyncio.FIRST_COMPLETED)
+        if entrada in done:
+            await entrada
+        raise serial.SerialException(f"la salida MWV hacia {PORT_WIND_OUT} falla")
+    finally:
+        for task in (sender, entrada):
+            task.cancel()
+        await asyncio.gather(sender, entrada, return_exceptions=True)
+        out.close()
+        ser_out.close()
+
+
+async def _wind_input(salida):
+    """Entrada de viento: si falla se relanza solo ella, con la espera del supervisor."""
+    backoff = supervisor.Backoff()
+    while True:
+        started = time.monotonic()
+        try:
+            if WIND_DECODER == "analyzer":
+                await _wind_analyzer(salida)
+            else:
+                await _wind_native(salida)
+            motivo = "fin del flujo"
+            logging.warning("⚠️ El flujo de viento se ha detenido inesperadamente.")
+        except (OSError, serial.SerialException) as e:
+            motivo = str(e)
+            logging.error(f"❌ Error en la entrada de viento: {e}")
+        supervisor.mark_down(NGT1_STAGE, motivo)
+        delay = backoff.failed(time.monotonic() - started)
+        logging.info(f"🔄 Relanzando la entrada de viento en {delay * 1000:.0f} ms...")
+        await asyncio.sleep(delay)
+
+
+async def _wind_native(salida):
+    ser_in = actisense.open_port(PORT_WIND_IN, BAUD_WIND_IN)
+    parser = actisense.FrameParser(pgns=n2k_dispatch.registered_pgns())
+    logging.info(f"🚀 Lectura directa Actisense iniciada (PGN {sorted(n2k_dispatch.registered_pgns())}).")
+
+    def on_data(chunk):
+        t_read = latency.now()
+        for msg in parser.feed(chunk):
+            fields = n2k_dispatch.dispatch(msg, t_read)
+            if msg.pgn != WIND_PGN or fields is None:
+                continue
+            if fields["wind_speed_ms"] is None or fields["wind_angle_deg"] is None:
+                continue
+            if supervisor.down:
+                supervisor.mark_up()
+            t_parse = latency.now()
+            latency.record("read_parse", t_read, t_parse)
+            enviar_viento(salida, fields["wind_angle_deg"], fields["wind_speed_ms"], t_read, t_parse)
+
+    try:
+        await watch_fd(ser_in.fileno(), fd_reader(ser_in.fileno(), on_data))
+    finally:
+        ser_in.close()
+
+
+async def _wind_analyzer(salida):
+    # Los hijos los relanza el supervisor (un hilo que espera a cada uno);
+    # aquí solo se lee la salida de analyzer, que no se corta al relanzarlos
+    pipeline = supervisor.Pipeline(ANALYZER_STAGES).start()
+    logging.info("🚀 Pipeline Actisense -> Analyzer iniciado (supervisado).")
+
+    partial = bytearray()
+
+    def on_data(chunk):
+        t_read = latency.now()
+        partial.extend(chunk)
+        *lines, rest = partial.split(b"\n")
+        partial[:] = rest
+        for line in lines:
+            lectura = viento_de_json(line)
+            if lectura is not None:
+                if supervisor.down:
+                    supervisor.mark_up()
+                t_parse = latency.now()
+                latency.record("read_parse", t_read, t_parse)
+                enviar_viento(salida, *lectura, t_read, t_parse)
+
+    fd = pipeline.stdout_fd
+    try:
+        await watch_fd(fd, fd_reader(fd, on_data))
+    finally:
+        pipeline.stop()
+
+
+async def mwv_timer(salida):
+    """
+    Envía el último viento a ritmo fijo (MWV_RATE_HZ) en lugar de una MWV por
+    trama. Termina si falla la escritura (puerto caído) para que wind_source
+    reabra la salida.
+    """
+    while True:
+        await asyncio.sleep(salida.period)
+        try:
+            salida.send_latest()
+        except Exception as e:
+            salida.stats["errors"] += 1
+            logging.error(f"❌ Error enviando MWV: {e}")
+            return
+
+
+async def mavlink_source():
+    """Pixhawk: mensajes MAVLink -> estado fusionado."""
+    logging.info(f"Intentando conectar con Pixhawk en {PORT_MAVLINK}...")
+    master = open_link()
+    monitor = None
+
+    def on_readable():
+        nonlocal monitor
+        # recv_msg no bloquea: devuelve None cuando se acaban los bytes disponibles
+        while True:
+            msg = master.recv_msg()
+            if msg is None:
+                return
+            if monitor is None and msg.get_type() == "HEARTBEAT":
+                logging.info("¡Pixhawk conectada!")
+                # Pedir solo lo que usamos (también tras cada reconexión)
+                request_streams(master)
+                monitor = StreamMonitor(master)
+            if monitor is not None:
+                monitor.observe(msg)
+            procesar_mensaje(msg)
+
+    logging.info("Esperando Heartbeat...")
+    try:
+        await watch_fd(master.fd, on_readable)
+    finally:
+        master.close()
+
+
+# ============================================================
+#   TEMPORIZADORES
+# ============================================================
+async def fusion_timer(batcher):
+    """Una fila fusionada a FUSION_RATE_HZ, como fusion_loop pero en el bucle."""
+    period = 1.0 / FUSION_RATE_HZ
+    logging.info(f"🧩 Fusión en el bucle de eventos ({FUSION_RATE_HZ} Hz)")
+    next_tick = time.monotonic()
+    while True:
+        next_tick += period
+        emit_row(batcher.insert)
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            next_tick = time.monotonic()
+            await asyncio.sleep(0)
+
+
+async def status_timer():
+    """Contadores de PGN y del escritor de DB en el log cada N2K_STATS_INTERVAL s."""
+    while True:
+        await asyncio.sleep(N2K_STATS_INTERVAL)
+        n2k_dispatch.log_stats()
+        logging.info(f"📊 DB -> {database.stats['written']} filas escritas, {database.stats['commits']} commits")
+
+
+async def latency_timer():
+    """Exporta las latencias por salto cada LATENCY_EXPORT_INTERVAL s."""
+    while True:
+        await asyncio.sleep(LATENCY_EXPORT_INTERVAL)
+        latency.export_metrics()
+
+
+async def archive_timer():
+    """Compactación del archivo frío cada ARCHIVE_INTERVAL s (en un hilo aparte: es lenta)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            moved = await loop.run_in_executor(None, archive.compact)
+            if moved:
+                logging.info(f"Archivo: {moved} muestras movidas a bloques comprimidos.")
+        except Exception as e:
+            logging.error(f"Error compactando muestras: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+
+# ============================================================
+#   ARRANQUE
+# ============================================================
+async def run(stop=None, archive_enabled=True):
+    """
+    Ejecuta todo el sistema en el bucle actual hasta que se active 'stop'
+    (por defecto, con SIGINT/SIGTERM). La base de datos ya debe estar creada.
+    """
+    loop = asyncio.get_running_loop()
+    if stop is None:
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+    if WIND_DECODER == "analyzer":
+        # Restos de un arranque anterior: solo una vez, no en cada reintento
+        limpiar_procesos()
+        await asyncio.sleep(2)
+
+    batcher = DBBatcher()
+    tasks = [
+        asyncio.create_task(_supervise("viento", wind_source)),
+        asyncio.create_task(_supervise("MAVLink", mavlink_source)),
+        asyncio.create_task(fusion_timer(batcher)),
+        asyncio.create_task(status_timer()),
+        asyncio.create_task(latency_timer()),
+    ]
+    if archive_enabled:
+        tasks.append(asyncio.create_task(archive_timer()))
+    logging.info("Bucle de eventos iniciado (modo asyncio).")
+
+    try:
+        await stop.wait()
+        logging.info("Deteniendo bucle de eventos...")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        batcher.flush()
+        database.close_connections()
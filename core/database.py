@@ -1,10 +1,92 @@
 # core/database.py
 import sqlite3
 import logging
-from config import DB_PATH
+import queue
+import threading
+import time
+from collections import deque
+from config import DB_PATH, DB_PRAGMAS, DB_QUEUE_MAXSIZE, DB_BATCH_SIZE, DB_FLUSH_INTERVAL
+from core import latency
 
-def get_connection():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+# Conexiones por hilo (una por ruta), reutilizadas durante toda la vida del proceso
+_local = threading.local()
+# Las mismas, por ruta y de todos los hilos: close_path() las cierra si se borra el fichero
+_open_conns = {}
+_open_lock = threading.Lock()
+
+# Cola acotada entre los hilos de sensores y el hilo escritor
+_write_queue = queue.Queue(maxsize=DB_QUEUE_MAXSIZE)
+_writer_thread = None
+_writer_lock = threading.Lock()
+_stop_event = threading.Event()
+
+# Contadores del escritor (para monitorización)
+stats = {
+    "enqueued": 0,
+    "written": 0,
+    "dropped": 0,
+    "commits": 0,
+}
+# Duración (s) de los últimos commits del escritor, para p50/p99
+commit_latencies = deque(maxlen=10000)
+
+def _open_connection(path):
+    conn = sqlite3.connect(path, timeout=DB_PRAGMAS.get("busy_timeout", 5000) / 1000.0,
+                           check_same_thread=False)
+    for pragma, value in DB_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma}={value};")
+    return conn
+
+def get_connection(path=None):
+    """
+    Devuelve la conexión de este hilo a 'path' (por defecto DB_PATH),
+    creándola con el perfil DB_PRAGMAS la primera vez.
+    """
+    path = str(path or DB_PATH)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    conn = conns.get(path)
+    if conn is not None:
+        try:
+            conn.total_changes  # Falla si alguien la cerró con close()
+            return conn
+        except sqlite3.ProgrammingError:
+            pass
+
+    conn = conns[path] = _open_connection(path)
+    with _open_lock:
+        _open_conns.setdefault(path, []).append(conn)
+    return conn
+
+def _close(conn, path):
+    with _open_lock:
+        if conn in _open_conns.get(path, ()):
+            _open_conns[path].remove(conn)
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+def close_connections():
+    """Cierra las conexiones abiertas por el hilo actual."""
+    conns = getattr(_local, "conns", None) or {}
+    for path, conn in conns.items():
+        _close(conn, path)
+    conns.clear()
+
+def close_path(path):
+    """
+    Cierra las conexiones de todos los hilos a 'path' (p.ej. un shard que se
+    va a borrar): cada hilo abrirá una nueva en su próximo get_connection en
+    lugar de seguir escribiendo en el fichero borrado.
+    """
+    path = str(path)
+    with _open_lock:
+        conns = _open_conns.pop(path, [])
+    for conn in conns:
+        _close(conn, path)
 
 def init_db():
     conn = get_connection()
@@ -18,20 +100,175 @@ def init_db():
             roll REAL, pitch REAL, yaw REAL,   -- Actitud
             wind_angle REAL, wind_speed REAL,  -- Viento
             servo_rudder INTEGER,              -- Timón (PWM)
-            servo_sail INTEGER                 -- Vela (PWM)
+            servo_sail INTEGER,                -- Vela (PWM)
+            age_gps REAL, age_att REAL,        -- Edad (s) de cada grupo en la fila fusionada
+            age_wind REAL, age_servo REAL,
+            heading REAL,                      -- NMEA2000: rumbo (grados)
+            cog REAL, sog REAL, stw REAL,      -- NMEA2000: COG (grados), SOG y STW (nudos)
+            water_temp REAL, air_temp REAL,    -- NMEA2000: ambiente (°C)
+            pressure REAL, humidity REAL,      -- (hPa, %)
+            age_hdg REAL, age_nav REAL, age_env REAL,
+            n2k_lat REAL, n2k_lon REAL,        -- NMEA2000: posición (PGN 129025)
+            boot_ms_gps INTEGER, boot_ms_att INTEGER,  -- time_boot_ms de la Pixhawk
+            rx_time_gps REAL, rx_time_att REAL         -- Recepción (epoch UTC, pymavlink)
         )
     """)
+    # Migración de bases de datos antiguas: añadir columnas si faltan
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(telemetria)")}
+    for column in ("age_gps", "age_att", "age_wind", "age_servo",
+                   "heading", "cog", "sog", "stw", "water_temp", "air_temp", "pressure", "humidity",
+                   "age_hdg", "age_nav", "age_env", "rx_time_gps", "rx_time_att", "n2k_lat", "n2k_lon"):
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE telemetria ADD COLUMN {column} REAL")
+    for column in ("boot_ms_gps", "boot_ms_att"):
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE telemetria ADD COLUMN {column} INTEGER")
     conn.commit()
-    conn.close()
     logging.info("Base de datos inicializada correctamente.")
 
-def insert_data(data_dict):
-    """Inserta un diccionario de datos en la tabla."""
+def _write_batch(conn, batch):
+    """Escribe un lote de diccionarios en una única transacción."""
+    # Agrupamos por conjunto de columnas para usar executemany. '_t_wind' no
+    # es columna: es la marca del viento que trae la fila (parse -> commit).
+    # Las tuplas (tabla, fila) son muestras crudas (insert_sample): van a su
+    # shard con storage.db.write_samples
+    groups = {}
+    samples = []
+    t_wind = []
+    for data_dict in batch:
+        if isinstance(data_dict, tuple):
+            samples.append(data_dict)
+            continue
+        t = data_dict.pop("_t_wind", None)
+        if t is not None:
+            t_wind.append(t)
+        groups.setdefault(tuple(data_dict.keys()), []).append(data_dict)
+
+    # Cada grupo en su propio try: si falla la transacción de 'telemetria'
+    # las muestras crudas del mismo lote se escriben igual (y viceversa)
+    if groups:
+        n_rows = len(batch) - len(samples)
+        try:
+            t0 = time.perf_counter()
+            with conn:
+                for keys, rows in groups.items():
+                    columns = ', '.join(keys)
+                    placeholders = ':' + ', :'.join(keys)
+                    sql = f'INSERT INTO telemetria ({columns}) VALUES ({placeholders})'
+                    conn.executemany(sql, rows)
+            commit_latencies.append(time.perf_counter() - t0)
+            t_commit = latency.now()
+            for t in t_wind:
+                latency.record("parse_commit", t, t_commit)
+            stats["commits"] += 1
+            stats["written"] += n_rows
+        except Exception as e:
+            stats["dropped"] += n_rows
+            logging.error(f"Error escribiendo lote en telemetria ({n_rows} filas): {e}")
+
+    if samples:
+        from storage.db import write_samples
+
+        try:
+            stats["commits"] += write_samples(samples)
+            stats["written"] += len(samples)
+        except Exception as e:
+            stats["dropped"] += len(samples)
+            logging.error(f"Error escribiendo muestras crudas ({len(samples)} filas): {e}")
+
+def write_rows(rows):
+    """
+    Escribe 'rows' en una transacción con la conexión del hilo actual, sin
+    pasar por la cola (lo usa el modo asyncio, que agrupa las filas en su bucle).
+    """
+    stats["enqueued"] += len(rows)
+    _write_batch(get_connection(), rows)
+
+def _writer_loop():
+    """Hilo escritor: agrupa filas y hace commit cada N filas o T segundos."""
     conn = get_connection()
-    cursor = conn.cursor()
-    columns = ', '.join(data_dict.keys())
-    placeholders = ':' + ', :'.join(data_dict.keys())
-    sql = f'INSERT INTO telemetria ({columns}) VALUES ({placeholders})'
-    cursor.execute(sql, data_dict)
-    conn.commit()
-    conn.close()
+    batch = []
+    deadline = None
+
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = _write_queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + DB_FLUSH_INTERVAL
+                batch.append(item)
+
+            stopping = _stop_event.is_set() and _write_queue.empty()
+            if batch and (len(batch) >= DB_BATCH_SIZE or time.monotonic() >= deadline or stopping):
+                try:
+                    _write_batch(conn, batch)
+                except Exception as e:
+                    logging.error(f"Error escribiendo lote en DB ({len(batch)} filas): {e}")
+                batch = []
+                deadline = None
+
+            if stopping:
+                break
+    finally:
+        close_connections()
+
+def start_writer():
+    """Arranca el hilo escritor (idempotente)."""
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is not None and _writer_thread.is_alive():
+            return
+        _stop_event.clear()
+        _writer_thread = threading.Thread(target=_writer_loop, name="DBWriterThread", daemon=True)
+        _writer_thread.start()
+        logging.info(f"Escritor de DB iniciado (lote={DB_BATCH_SIZE}, intervalo={DB_FLUSH_INTERVAL}s).")
+
+def flush_and_stop(timeout=5.0):
+    """Vacía la cola pendiente en disco y detiene el hilo escritor."""
+    global _writer_thread
+    with _writer_lock:
+        thread = _writer_thread
+        if thread is None:
+            return
+        _stop_event.set()
+        # Despertamos al escritor por si está bloqueado esperando en la cola
+        try:
+            _write_queue.put_nowait(None)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        if thread.is_alive():
+            # Se deja el handle: sigue vaciando la cola y start_writer() no debe lanzar otro
+            logging.warning(f"El escritor de DB no terminó a tiempo ({_write_queue.qsize()} filas pendientes).")
+        else:
+            logging.info(f"Escritor de DB detenido. Filas escritas: {stats['written']}, descartadas: {stats['dropped']}.")
+            _writer_thread = None
+
+def _enqueue(item):
+    if _writer_thread is None or not _writer_thread.is_alive():
+        start_writer()
+    try:
+        _write_queue.put_nowait(item)
+        stats["enqueued"] += 1
+        return True
+    except queue.Full:
+        stats["dropped"] += 1
+        if stats["dropped"] % 1000 == 1:
+            logging.warning(f"Cola de DB llena, descartando filas (total descartadas: {stats['dropped']}).")
+        return False
+
+def insert_data(data_dict):
+    """Encola un diccionario de datos para su inserción (no bloqueante)."""
+    return _enqueue(dict(data_dict))
+
+def insert_sample(table, row):
+    """
+    Encola una muestra cruda (fila de 'table', p.ej. nav_samples, hecha con
+    storage.db.sample_row) para escribirla por lotes en su shard (no bloqueante).
+    """
+    return _enqueue((table, row))
@@ -0,0 +1,144 @@
+# core/latency.py
+import os
+import sys
+import json
+import time
+import bisect
+import logging
+import threading
+from collections import deque
+
+from config import LATENCY_BUDGET_MS, LATENCY_WINDOW, LATENCY_METRICS_PATH
+
+# Latencia de cada salto del dato, con marcas time.monotonic() (el mismo
+# reloj para todos los procesos de la Raspberry):
+#
+#   read_parse     lectura del trozo del puerto / línea de analyzer -> trama decodificada
+#   parse_serial   trama decodificada -> último byte de la MWV fuera de la UART (estimado)
+#   read_serial    lectura -> MWV fuera: lo que ve el piloto automático (presupuesto)
+#   parse_commit   viento decodificado -> commit de la primera fila de 'telemetria' que lo lleva
+#   commit_served  fila publicada -> servida por /api/live (lo mide el proceso del dashboard)
+#   publish_pushed fila publicada -> escrita por /api/stream (SSE) al navegador
+HOPS = ("read_parse", "parse_serial", "read_serial", "parse_commit", "commit_served", "publish_pushed")
+
+# Límites superiores (ms) de las cubetas del histograma acumulado
+BUCKETS_MS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histogram:
+    """Histograma acumulado por cubetas + ventana de las últimas muestras para percentiles exactos."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.over_budget = 0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        if ms > LATENCY_BUDGET_MS:
+            self.over_budget += 1
+        self.recent.append(ms)
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def pct(p):
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 2) if recent else None
+
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "p50_ms": pct(0.50),
+            "p90_ms": pct(0.90),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max_ms, 2),
+            "over_budget": self.over_budget,
+            "buckets": {f"<={b:g}" if i < len(BUCKETS_MS) else f">{BUCKETS_MS[-1]:g}": n
+                        for i, (b, n) in enumerate(zip(BUCKETS_MS + (None,), self.counts)) if n},
+        }
+
+
+hops = {hop: Histogram() for hop in HOPS}
+_lock = threading.Lock()
+
+
+def now():
+    """Marca de tiempo del pipeline (monotónica, en segundos)."""
+    return time.monotonic()
+
+
+def to_wall(t_mono):
+    """Epoch UTC correspondiente a una marca monotónica (para guardar en la DB)."""
+    if t_mono is None:
+        return time.time()
+    return time.time() - (time.monotonic() - t_mono)
+
+
+def record(hop, start, end=None):
+    """Añade al histograma de 'hop' el tiempo entre dos marcas monotónicas."""
+    if start is None:
+        return
+    ms = ((time.monotonic() if end is None else end) - start) * 1000.0
+    with _lock:
+        hops[hop].add(ms)
+
+
+def record_since_wall(hop, t_wall):
+    """Como record() con una hora epoch de otro proceso (p.ej. la 't' del buffer en vivo)."""
+    if t_wall is None:
+        return
+    ms = (time.time() - t_wall) * 1000.0
+    with _lock:
+        hops[hop].add(ms)
+
+
+def summary():
+    """Percentiles, máximo, muestras fuera de presupuesto y cubetas por salto."""
+    with _lock:
+        return {hop: h.summary() for hop, h in hops.items() if h.count}
+
+
+def export_metrics(path=None):
+    """Escribe summary() en LATENCY_METRICS_PATH (reemplazo atómico) y resume el presupuesto en el log."""
+    data = summary()
+    e2e = data.get("read_serial")
+    if e2e:
+        logging.info(f"⏱️ Viento -> Pixhawk: p50 {e2e['p50_ms']} ms, p99 {e2e['p99_ms']} ms, "
+                     f"máx {e2e['max_ms']} ms ({e2e['over_budget']} de {e2e['count']} > {LATENCY_BUDGET_MS} ms)")
+    path = path or LATENCY_METRICS_PATH
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump({"updated": time.time(), "budget_ms": LATENCY_BUDGET_MS, "hops": data}, f, indent=2)
+        os.replace(tmp, path)
+    except OSError as e:
+        logging.debug(f"No se pudieron exportar las latencias: {e}")
+    return data
+
+
+def load_metrics(path=None):
+    """Latencias exportadas por main.py (None si aún no hay fichero)."""
+    try:
+        with open(path or LATENCY_METRICS_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == "__main__":
+    # python -m core.latency  -> tabla de lo exportado por main.py
+    data = load_metrics(sys.argv[1] if len(sys.argv) > 1 else None)
+    if data is None:
+        print("[WARN] No hay latencias exportadas todavía")
+        sys.exit(1)
+    print(f"Presupuesto: {data['budget_ms']} ms  (actualizado {time.strftime('%H:%M:%S', time.localtime(data['updated']))})")
+    for hop, s in data["hops"].items():
+        print(f"{hop:14s} n={s['count']:<8d} p50 {s['p50_ms']:>8} ms  p90 {s['p90_ms']:>8} ms  "
+              f"p99 {s['p99_ms']:>8} ms  máx {s['max_ms']:>8} ms  > presupuesto: {s['over_budget']}")
@@ -0,0 +1,223 @@
+# core/live_buffer.py
+import os
+import mmap
+import time
+import struct
+import logging
+
+import numpy as np
+
+from config import LIVE_BUFFER_PATH, LIVE_BUFFER_SECONDS, FUSION_RATE_HZ
+
+# Columnas del anillo (float64). NaN = campo aún sin valor.
+FIELDS = (
+    "t",                                   # epoch UTC de la fila
+    "lat", "lon", "alt",
+    "roll", "pitch", "yaw",
+    "wind_angle", "wind_speed",
+    "servo_rudder", "servo_sail",
+    "heading", "cog", "sog", "stw", "n2k_lat", "n2k_lon",
+    "water_temp", "air_temp", "pressure", "humidity",
+    "age_gps", "age_att", "age_wind", "age_servo",
+    "age_hdg", "age_nav", "age_env",
+    "boot_ms_gps", "boot_ms_att",          # time_boot_ms de la Pixhawk
+    "rx_time_gps", "rx_time_att",          # epoch de recepción (pymavlink)
+)
+
+# Cabecera: magic, versión, capacidad (filas), nº de campos, seq (seqlock), filas escritas
+_HEADER = struct.Struct("<4sIIIqq")
+_MAGIC = b"SBLV"
+_VERSION = 1
+_SEQ_OFFSET = 16
+_NAME_SIZE = 16   # bytes por nombre de campo tras la cabecera
+_ALIGN = 64
+
+
+def _data_offset(n_fields):
+    offset = _HEADER.size + n_fields * _NAME_SIZE
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _layout_size(capacity, n_fields):
+    # Cada fila se escribe dos veces (i e i + capacidad): cualquier ventana
+    # de hasta 'capacidad' filas es contigua y se puede dar como vista.
+    return _data_offset(n_fields) + 2 * capacity * n_fields * 8
+
+
+# ============================================================
+#   ESCRITOR (main.py)
+# ============================================================
+class LiveBufferWriter:
+    """Anillo de filas en un fichero mapeado en memoria, con seqlock."""
+
+    def __init__(self, path=LIVE_BUFFER_PATH, capacity=None, fields=FIELDS):
+        self.path = path
+        self.fields = tuple(fields)
+        self.capacity = capacity or int(LIVE_BUFFER_SECONDS * FUSION_RATE_HZ)
+        n_fields = len(self.fields)
+        size = _layout_size(self.capacity, n_fields)
+
+        # Se recrea siempre: un fichero de un arranque anterior puede tener otro
+        # formato. Se borra en vez de truncarlo para no romper a un lector que
+        # aún lo tenga mapeado (sigue viendo el inodo antiguo).
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        names = b"".join(name.encode().ljust(_NAME_SIZE, b"\0") for name in self.fields)
+        self._mm[_HEADER.size:_HEADER.size + len(names)] = names
+        # seq y filas escritas como int64 para poder leerlos/escribirlos de una vez
+        self._ctl = np.ndarray((2,), dtype=np.int64, buffer=self._mm, offset=_SEQ_OFFSET)
+        self._data = np.ndarray(
+            (2 * self.capacity, n_fields), dtype=np.float64, buffer=self._mm, offset=_data_offset(n_fields)
+        )
+        self._data[:] = np.nan
+        self._row = np.full(n_fields, np.nan)
+        self._index = {name: i for i, name in enumerate(self.fields)}
+        # La cabecera con magic se escribe al final: los lectores no ven un anillo a medias
+        self._mm[:_SEQ_OFFSET] = _HEADER.pack(_MAGIC, _VERSION, self.capacity, n_fields, 0, 0)[:_SEQ_OFFSET]
+
+    def publish(self, row, t=None):
+        """Añade una fila (dict campo -> valor); los campos ausentes quedan a NaN."""
+        values = self._row
+        values[:] = np.nan
+        for name, value in row.items():
+            i = self._index.get(name)
+            if i is not None and value is not None:
+                values[i] = value
+        values[0] = time.time() if t is None else t
+
+        seq, count = self._ctl
+        slot = count % self.capacity
+        self._ctl[0] = seq + 1            # impar: escritura en curso
+        self._data[slot] = values
+        self._data[slot + self.capacity] = values
+        self._ctl[1] = count + 1
+        self._ctl[0] = seq + 2            # par: fila visible
+
+    def close(self, unlink=True):
+        self._ctl = self._data = None
+        self._mm.close()
+        if unlink:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+# ============================================================
+#   LECTOR (dashboards)
+# ============================================================
+class LiveBufferReader:
+    """Acceso de solo lectura al anillo publicado por main.py."""
+
+    def __init__(self, path=LIVE_BUFFER_PATH):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, capacity, n_fields, _, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} no es un buffer en vivo válido")
+
+        self.capacity = capacity
+        names = self._mm[_HEADER.size:_HEADER.size + n_fields * _NAME_SIZE]
+        self.fields = tuple(
+            names[i:i + _NAME_SIZE].rstrip(b"\0").decode() for i in range(0, len(names), _NAME_SIZE)
+        )
+        self._ctl = np.ndarray((2,), dtype=np.int64, buffer=self._mm, offset=_SEQ_OFFSET)
+        self._data = np.ndarray(
+            (2 * capacity, n_fields), dtype=np.float64, buffer=self._mm, offset=_data_offset(n_fields)
+        )
+
+    def latest(self, n=None, seconds=None, copy=False, retries=100):
+        """
+        Últimas filas como vista NumPy (n_filas x n_campos) sin copia.
+
+        Se pide 'n' filas o las de los últimos 'seconds' segundos. La vista
+        es coherente en el momento de la lectura (seqlock); sin copia tiene
+        como mucho capacity - 1 filas, así que la siguiente publicación no la
+        toca, pero la de después ya pisa su fila más antigua. Quien la use
+        más tiempo (p.ej. para serializarla) debe pedir copy=True, que copia
+        dentro del seqlock.
+        """
+        for _ in range(retries):
+            seq = int(self._ctl[0])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            count = int(self._ctl[1])
+            # La próxima fila se escribe en 'start' si la ventana ocupa todo el anillo
+            k = min(count, self.capacity if copy else self.capacity - 1)
+            start = (count - k) % self.capacity
+            window = self._data[start:start + k]
+            if seconds is not None and k:
+                t_min = window[-1, 0] - seconds
+                window = window[np.searchsorted(window[:, 0], t_min, side="left"):]
+            if n is not None:
+                window = window[max(len(window) - n, 0):]
+            if copy:
+                window = window.copy()
+            if int(self._ctl[0]) == seq:
+                return window
+        raise TimeoutError("El escritor del buffer en vivo no deja leer")
+
+    def columns(self, n=None, seconds=None, copy=False):
+        """Como latest(), pero devuelve {campo: vista 1D}."""
+        window = self.latest(n=n, seconds=seconds, copy=copy)
+        return {name: window[:, i] for i, name in enumerate(self.fields)}
+
+    def close(self):
+        self._ctl = self._data = None
+        try:
+            self._mm.close()
+        except BufferError:
+            # Aún hay vistas devueltas por latest(): el mapeo se libera con ellas
+            pass
+
+
+def open_reader(path=LIVE_BUFFER_PATH):
+    """
+    Lector del anillo, o None si main.py no está publicando. Es barato:
+    conviene abrir uno por consulta para seguir al anillo si main.py se
+    reinicia (el fichero se recrea).
+    """
+    try:
+        return LiveBufferReader(path)
+    except (FileNotFoundError, ValueError) as e:
+        logging.debug(f"Buffer en vivo no disponible: {e}")
+        return None
+
+
+# ============================================================
+#   ESCRITOR DEL PROCESO (main.py)
+# ============================================================
+_writer = None
+
+
+def start_publisher():
+    """Crea el anillo compartido (idempotente)."""
+    global _writer
+    if _writer is None:
+        _writer = LiveBufferWriter()
+        logging.info(f"📡 Buffer en vivo en {_writer.path} ({_writer.capacity} filas)")
+    return _writer
+
+
+def publish(row):
+    """Publica una fila fusionada si el anillo está activo."""
+    if _writer is not None:
+        _writer.publish(row)
+
+
+def stop_publisher():
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
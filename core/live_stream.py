@@ -0,0 +1,217 @@
+# core/live_stream.py
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from collections import deque
+
+from config import LIVE_STREAM_PATH, LIVE_STREAM_CLIENT_QUEUE
+from core.supervisor import Backoff
+
+# Canal de empuje de filas fusionadas: main.py escucha en un socket UNIX
+# SOCK_SEQPACKET (cada send() es un mensaje entero o nada, sin troceado) y
+# envía cada fila, codificada una sola vez en JSON, a los suscriptores. El
+# dashboard Flask es el suscriptor: un único hilo lee cada actualización y
+# la reparte a las colas de los navegadores conectados a /api/stream.
+#
+# Contrapresión en los dos saltos, sin bloquear nunca a quien publica:
+#   - main.py -> suscriptor: si su buffer del socket está lleno se descarta
+#     la fila para ese suscriptor (el bucle de fusión no espera a nadie).
+#   - hub -> navegador: cola acotada por cliente; si un navegador va lento
+#     pierde sus filas más antiguas (cada fila es un estado completo) y los
+#     demás ni lo notan.
+
+# Tamaño máximo de un mensaje (una fila en JSON ocupa < 1 KB)
+MAX_MESSAGE = 65536
+
+
+# ============================================================
+#   PUBLICADOR (main.py)
+# ============================================================
+class StreamPublisher:
+    """Socket de escucha no bloqueante; publish() acepta suscriptores nuevos y envía la fila."""
+
+    def __init__(self, path=LIVE_STREAM_PATH):
+        self.path = path
+        # Un socket de un arranque anterior que no se borró impediría el bind()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._sock.bind(path)
+        self._sock.listen(8)
+        self._sock.setblocking(False)
+        self.subscribers = []
+        self.stats = {"published": 0, "sent": 0, "dropped": 0, "subscribers": 0}
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            conn.setblocking(False)
+            self.subscribers.append(conn)
+            self.stats["subscribers"] = len(self.subscribers)
+            logging.info(f"📡 Nuevo suscriptor del canal en vivo ({len(self.subscribers)})")
+
+    def publish(self, row, t=None):
+        """Envía la fila (dict) a todos los suscriptores sin esperar a ninguno."""
+        self._accept()
+        self.stats["published"] += 1
+        if not self.subscribers:
+            return
+        message = dict(row)
+        message["t"] = time.time() if t is None else t
+        data = json.dumps(message, separators=(",", ":")).encode()
+
+        for conn in list(self.subscribers):
+            try:
+                conn.send(data)
+                self.stats["sent"] += 1
+            except (BlockingIOError, InterruptedError):
+                # El suscriptor no lee al ritmo de la fusión: se pierde esta fila para él
+                self.stats["dropped"] += 1
+            except OSError:
+                self.subscribers.remove(conn)
+                self.stats["subscribers"] = len(self.subscribers)
+                conn.close()
+
+    def close(self):
+        for conn in self.subscribers:
+            conn.close()
+        self.subscribers = []
+        self._sock.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+# ============================================================
+#   PUBLICADOR DEL PROCESO (main.py)
+# ============================================================
+_publisher = None
+
+
+def start_stream():
+    """Abre el socket del canal en vivo (idempotente)."""
+    global _publisher
+    if _publisher is None:
+        try:
+            _publisher = StreamPublisher()
+            logging.info(f"📡 Canal en vivo en {_publisher.path}")
+        except OSError as e:
+            logging.warning(f"⚠️ No se pudo abrir el canal en vivo ({e}); los dashboards solo sondearán")
+    return _publisher
+
+
+def publish(row):
+    """Empuja una fila fusionada si el canal está activo."""
+    if _publisher is not None:
+        _publisher.publish(row)
+
+
+def stop_stream():
+    global _publisher
+    if _publisher is not None:
+        _publisher.close()
+        _publisher = None
+
+
+# ============================================================
+#   SUSCRIPTOR Y REPARTO (dashboard)
+# ============================================================
+class StreamClient:
+    """Cola acotada de un navegador: al llenarse se descartan las filas más antiguas."""
+
+    def __init__(self, maxlen=LIVE_STREAM_CLIENT_QUEUE):
+        self.queue = deque(maxlen=maxlen)
+        self.cond = threading.Condition()
+        self.sent = 0
+        self.dropped = 0
+
+    def push(self, item):
+        with self.cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """Siguiente (t, mensaje), o None si no llega nada en 'timeout' s."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.queue, timeout):
+                return None
+            self.sent += 1
+            return self.queue.popleft()
+
+
+class StreamHub:
+    """
+    Un hilo conectado al canal de main.py: una lectura por actualización,
+    repartida a todos los StreamClient. Se reconecta solo si main.py se
+    reinicia.
+    """
+
+    def __init__(self, path=LIVE_STREAM_PATH):
+        self.path = path
+        self.clients = set()
+        self.stats = {"received": 0, "connects": 0, "connected": False}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _read(self, sock):
+        while True:
+            data = sock.recv(MAX_MESSAGE)
+            if not data:
+                return
+            self.stats["received"] += 1
+            try:
+                t = json.loads(data)["t"]
+            except (ValueError, KeyError):
+                continue
+            item = (t, data)
+            with self._lock:
+                for client in self.clients:
+                    client.push(item)
+
+    def _run(self):
+        backoff = Backoff()
+        while True:
+            started = time.monotonic()
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            try:
+                sock.connect(self.path)
+                self.stats["connects"] += 1
+                self.stats["connected"] = True
+                logging.info(f"📡 Conectado al canal en vivo {self.path}")
+                self._read(sock)
+            except OSError as e:
+                logging.debug(f"Canal en vivo no disponible: {e}")
+            finally:
+                self.stats["connected"] = False
+                sock.close()
+            time.sleep(backoff.failed(time.monotonic() - started))
+
+    def subscribe(self):
+        """Cliente nuevo; el hilo lector arranca con el primer suscriptor."""
+        client = StreamClient()
+        with self._lock:
+            self.clients.add(client)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="LiveStreamHub", daemon=True)
+                self._thread.start()
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self.clients.discard(client)
+
+    def stats_summary(self):
+        with self._lock:
+            clients = [{"queued": len(c.queue), "sent": c.sent, "dropped": c.dropped} for c in self.clients]
+        return dict(self.stats, clients=clients)
@@ -2,56 +2,167 @@ from pymavlink import mavutil
 import time
 import logging
 import math
-from config import PORT_MAVLINK, BAUD_MAVLINK
-from core.database import insert_data
+from config import (
+    PORT_MAVLINK, BAUD_MAVLINK, MAVLINK_TLOG,
+    MAVLINK_STREAMS, MAVLINK_STOP_DEFAULT_STREAMS, MAVLINK_RATE_CHECK_INTERVAL, MAVLINK_RATE_TOLERANCE,
+)
+from core import database
+from core.state_manager import update_state
+from storage import db, tlog
+
+# Mensajes esperados: los pedidos más los de control del enlace
+MESSAGE_TYPES = list(MAVLINK_STREAMS) + ['HEARTBEAT', 'COMMAND_ACK']
+
+def open_link():
+    """Conexión con la Pixhawk; con MAVLINK_TLOG sus bytes crudos se copian al tlog."""
+    master = mavutil.mavlink_connection(PORT_MAVLINK, baud=BAUD_MAVLINK)
+    if MAVLINK_TLOG:
+        master.logfile_raw = tlog.start_recorder()
+    return master
+
+def request_streams(master, names=None):
+    """
+    Pide a la Pixhawk los mensajes de MAVLINK_STREAMS (o solo 'names') a su
+    frecuencia con MAV_CMD_SET_MESSAGE_INTERVAL. Sin 'names' se paran antes
+    los flujos por defecto si MAVLINK_STOP_DEFAULT_STREAMS.
+    """
+    if names is None and MAVLINK_STOP_DEFAULT_STREAMS:
+        master.mav.request_data_stream_send(
+            master.target_system, master.target_component,
+            mavutil.mavlink.MAV_DATA_STREAM_ALL, 0, 0)
+
+    for name in names or MAVLINK_STREAMS:
+        hz = MAVLINK_STREAMS[name]
+        master.mav.command_long_send(
+            master.target_system, master.target_component,
+            mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, 0,
+            getattr(mavutil.mavlink, f"MAVLINK_MSG_ID_{name}"),
+            int(1e6 / hz),   # intervalo en microsegundos
+            0, 0, 0, 0, 0)
+    logging.info("📶 Flujos MAVLink pedidos: " + ", ".join(
+        f"{name} {MAVLINK_STREAMS[name]:g} Hz" for name in names or MAVLINK_STREAMS))
+
+class StreamMonitor:
+    """
+    Cuenta los mensajes recibidos por tipo y cada MAVLINK_RATE_CHECK_INTERVAL s
+    compara la frecuencia real con la pedida: la escribe en el log y vuelve a
+    pedir los mensajes que llegan por debajo de MAVLINK_RATE_TOLERANCE.
+    """
+
+    def __init__(self, master):
+        self.master = master
+        self.counts = {}
+        self.since = time.monotonic()
+        # Última medida: tipo -> Hz (para monitorización)
+        self.rates = {}
+
+    def observe(self, msg):
+        """Cuenta 'msg' (puede ser None si no llegó nada) y hace la comprobación si toca."""
+        if msg is not None:
+            msg_type = msg.get_type()
+            self.counts[msg_type] = self.counts.get(msg_type, 0) + 1
+
+            if msg_type == 'COMMAND_ACK' and msg.command == mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL:
+                if msg.result != mavutil.mavlink.MAV_RESULT_ACCEPTED:
+                    result = mavutil.mavlink.enums['MAV_RESULT'].get(msg.result)
+                    logging.warning(f"⚠️ SET_MESSAGE_INTERVAL rechazado: {result.name if result else msg.result}")
+
+        now = time.monotonic()
+        if now - self.since >= MAVLINK_RATE_CHECK_INTERVAL:
+            self.check(now)
+
+    def check(self, now=None):
+        now = now or time.monotonic()
+        elapsed = now - self.since
+        self.rates = {name: n / elapsed for name, n in self.counts.items()}
+        self.counts = {}
+        self.since = now
+
+        partes = []
+        lentos = []
+        for name, hz in MAVLINK_STREAMS.items():
+            real = self.rates.get(name, 0.0)
+            partes.append(f"{name} {real:.1f}/{hz:g}")
+            if real < hz * MAVLINK_RATE_TOLERANCE:
+                lentos.append(name)
+        extra = sum(r for name, r in self.rates.items() if name not in MESSAGE_TYPES)
+        logging.info(f"📶 MAVLink Hz (real/pedido) -> {' | '.join(partes)}"
+                     + (f" | otros {extra:.1f}" if extra else ""))
+
+        if lentos:
+            logging.warning(f"⚠️ Frecuencia por debajo de lo pedido en {', '.join(lentos)}: se vuelve a pedir")
+            request_streams(self.master, lentos)
+
+def procesar_mensaje(msg):
+    """Pasa al estado fusionado los campos de un mensaje MAVLink de interés."""
+    data_update = {}
+    msg_type = msg.get_type()
+
+    if msg_type == 'GLOBAL_POSITION_INT':
+        data_update['lat'] = msg.lat / 1e7
+        data_update['lon'] = msg.lon / 1e7
+        data_update['alt'] = msg.relative_alt / 1000.0
+        # Reloj de la Pixhawk y hora de recepción (pymavlink): para alinear con otras fuentes
+        data_update['boot_ms_gps'] = msg.time_boot_ms
+        data_update['rx_time_gps'] = getattr(msg, '_timestamp', None)
+
+    elif msg_type == 'ATTITUDE':
+        # Convertimos radianes a grados
+        data_update['roll'] = round(math.degrees(msg.roll), 1)
+        data_update['pitch'] = round(math.degrees(msg.pitch), 1)
+        data_update['yaw'] = round(math.degrees(msg.yaw), 1)
+        data_update['boot_ms_att'] = msg.time_boot_ms
+        data_update['rx_time_att'] = getattr(msg, '_timestamp', None)
+
+    elif msg_type == 'SERVO_OUTPUT_RAW':
+        # Canal 1 suele ser Timón, Canal 3 suele ser Vela (ajustar según config ArduPilot)
+        data_update['servo_rudder'] = msg.servo1_raw
+        data_update['servo_sail'] = msg.servo3_raw
+
+    elif msg_type == 'RAW_IMU' and not MAVLINK_TLOG:
+        # Sin campos en el estado fusionado: solo la muestra cruda (ya está en el tlog si se graba),
+        # a la cola del escritor de DB, que la guarda por lotes
+        database.insert_sample("imu_samples", db.imu_row(msg))
+
+    if data_update:
+        update_state(data_update)
 
 def mavlink_loop():
     logging.info(f"Intentando conectar con Pixhawk en {PORT_MAVLINK}...")
-    
+
     while True:
+        master = None
         try:
             # Crear conexión MAVLink
-            master = mavutil.mavlink_connection(PORT_MAVLINK, baud=BAUD_MAVLINK)
-            
+            master = open_link()
+
             # Esperar el primer latido (Heartbeat)
             logging.info("Esperando Heartbeat...")
             master.wait_heartbeat()
             logging.info("¡Pixhawk conectada!")
 
+            # Pedir solo lo que usamos (también tras cada reconexión)
+            request_streams(master)
+            monitor = StreamMonitor(master)
+
             while True:
-                # Recibimos cualquier mensaje de interés
-                msg = master.recv_match(
-                    type=['GLOBAL_POSITION_INT', 'ATTITUDE', 'SERVO_OUTPUT_RAW'], 
-                    blocking=True, 
-                    timeout=1.0
-                )
-                
+                # Sin filtro por tipo: pymavlink decodifica todo igualmente y así
+                # el monitor ve también lo que llega sin haberlo pedido
+                msg = master.recv_match(blocking=True, timeout=1.0)
+
+                monitor.observe(msg)
                 if not msg:
                     continue
 
-                data_update = {}
-                msg_type = msg.get_type()
-
-                if msg_type == 'GLOBAL_POSITION_INT':
-                    data_update['lat'] = msg.lat / 1e7
-                    data_update['lon'] = msg.lon / 1e7
-                    data_update['alt'] = msg.relative_alt / 1000.0
-                
-                elif msg_type == 'ATTITUDE':
-                    # Convertimos radianes a grados
-                    data_update['roll'] = round(math.degrees(msg.roll), 1)
-                    data_update['pitch'] = round(math.degrees(msg.pitch), 1)
-                    data_update['yaw'] = round(math.degrees(msg.yaw), 1)
-
-                elif msg_type == 'SERVO_OUTPUT_RAW':
-                    # Canal 1 suele ser Timón, Canal 3 suele ser Vela (ajustar según config ArduPilot)
-                    data_update['servo_rudder'] = msg.servo1_raw
-                    data_update['servo_sail'] = msg.servo3_raw
-
-                if data_update:
-                    insert_data(data_update)
+                procesar_mensaje(msg)
 
         except Exception as e:
             logging.error(f"Error en enlace MAVLink: {e}")
-            logging.info("Reintentando conexión en 5 segundos...")
-            time.sleep(5)
+        finally:
+            # Sin cerrar, cada reconexión dejaría abierto el descriptor del puerto
+            # (el grabador del tlog es del proceso y se conserva)
+            if master is not None:
+                master.close()
+
+        logging.info("Reintentando conexión en 5 segundos...")
+        time.sleep(5)
@@ -0,0 +1,156 @@
+# core/mwv_output.py
+import time
+import logging
+import threading
+
+from config import MWV_RATE_HZ, MWV_MAX_QUEUE_BYTES
+from core import latency
+
+# A 8N1 cada byte son 10 bits; dejamos un 20 % del enlace libre
+_BAUD_MARGIN = 0.8
+# Longitud típica de una MWV ($WIMWV,123.4,R,12.3,N,A*7C\r\n)
+_MWV_BYTES = 30
+# Cada cuántos segundos se escribe la última frase y los contadores en el log
+MONITOR_INTERVAL = 3.0
+
+
+class MwvOutput:
+    """
+    Etapa de salida MWV hacia la Pixhawk.
+
+    submit() nunca bloquea: guarda el último viento y descarta el anterior si
+    aún no se había enviado (coalescido). El envío va a ritmo fijo
+    (MWV_RATE_HZ, limitado al presupuesto de baudios) desde su propio hilo,
+    o desde el bucle de eventos llamando a send_latest() en modo asyncio.
+
+    'build(ángulo, velocidad)' devuelve la frase en bytes (nmea0183.mwv);
+    'write(bytes)' debe ser no bloqueante y devolver los bytes escritos
+    (serial.Serial con write_timeout=0); 'queue_depth()' devuelve los bytes
+    aún sin salir por el puerto (out_waiting).
+    """
+
+    def __init__(self, write, build, queue_depth=None, rate_hz=MWV_RATE_HZ, baud=None):
+        self._write = write
+        self._build = build
+        self._queue_depth = queue_depth
+        self.baud = baud
+        if baud:
+            max_hz = baud / 10 * _BAUD_MARGIN / _MWV_BYTES
+            if rate_hz > max_hz:
+                logging.warning(f"⚠️ MWV a {rate_hz:g} Hz no cabe en {baud} baudios: se limita a {max_hz:.1f} Hz")
+                rate_hz = max_hz
+        self.period = 1.0 / rate_hz
+        self._latest = None
+        self._partial = b""
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_monitor = 0.0
+        self.last_sentence = None
+        self.stats = {
+            "received": 0,      # vientos recibidos
+            "coalesced": 0,     # sustituidos por uno más nuevo antes de enviarse
+            "dropped": 0,       # descartados porque el puerto iba atrasado
+            "sent": 0,
+            "bytes": 0,
+            "partial_writes": 0,
+            "errors": 0,        # escrituras fallidas (puerto caído)
+            "queue_bytes": 0,   # bytes pendientes en el puerto en el último envío
+            "queue_max": 0,
+        }
+
+    def submit(self, angle_deg, speed_kn, t_read=None, t_parse=None):
+        """Guarda el último viento (no bloquea). t_read/t_parse: marcas monotónicas para latencias."""
+        with self._cond:
+            if self._latest is not None:
+                self.stats["coalesced"] += 1
+            self._latest = (angle_deg, speed_kn, t_read, t_parse)
+            self.stats["received"] += 1
+            self._cond.notify()
+
+    def send_latest(self):
+        """Envía el último viento pendiente, si lo hay y el puerto no va atrasado."""
+        with self._cond:
+            latest, self._latest = self._latest, None
+
+        # Primero el resto de una frase que no cupo entera
+        if self._partial:
+            n = self._write(self._partial) or 0
+            self._partial = self._partial[n:]
+            if self._partial:
+                if latest is not None:
+                    self._requeue(latest)
+                return False
+
+        if latest is None:
+            return False
+
+        depth = self._queue_depth() if self._queue_depth else 0
+        self.stats["queue_bytes"] = depth
+        self.stats["queue_max"] = max(self.stats["queue_max"], depth)
+        if depth > MWV_MAX_QUEUE_BYTES:
+            self.stats["dropped"] += 1
+            return False
+
+        angle_deg, speed_kn, t_read, t_parse = latest
+        data = self._build(angle_deg, speed_kn)
+        n = self._write(data) or 0
+        if n < len(data):
+            self._partial = data[n:]
+            self.stats["partial_writes"] += 1
+
+        # El último byte sale de la UART cuando se vacía lo que había delante
+        t_out = latency.now()
+        if self.baud:
+            t_out += (depth + len(data)) * 10 / self.baud
+        latency.record("parse_serial", t_parse, t_out)
+        latency.record("read_serial", t_read, t_out)
+        self.stats["sent"] += 1
+        self.stats["bytes"] += len(data)
+        self.last_sentence = data
+
+        now = time.monotonic()
+        if now - self._last_monitor >= MONITOR_INTERVAL:
+            s = self.stats
+            logging.info(f"📡 MONITORIZACIÓN -> {data.decode('ascii').strip()} | enviadas {s['sent']}, "
+                         f"coalescidas {s['coalesced']}, descartadas {s['dropped']}, cola {s['queue_bytes']} B")
+            self._last_monitor = now
+        return True
+
+    def _requeue(self, latest):
+        with self._cond:
+            if self._latest is None:
+                self._latest = latest
+
+    def _run(self):
+        next_send = time.monotonic()
+        while not self._stop.is_set():
+            with self._cond:
+                while self._latest is None and not self._partial and not self._stop.is_set():
+                    self._cond.wait()
+            delay = next_send - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            try:
+                self.send_latest()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logging.error(f"❌ Error enviando MWV: {e}")
+                self._stop.wait(1.0)
+            next_send = max(next_send + self.period, time.monotonic())
+
+    def start(self):
+        """Arranca el hilo de envío (modo threads)."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="MwvOutputThread", daemon=True)
+        self._thread.start()
+        logging.info(f"MWV hacia la Pixhawk a {1 / self.period:.1f} Hz (último valor, sin bloquear)")
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,185 @@
+# core/n2k_dispatch.py
+import time
+import logging
+
+from config import N2K_STORE_SAMPLES
+from core import actisense, database, latency
+from core.state_manager import update_state
+from storage import db
+
+MS_TO_KN = 1.94384
+KELVIN = 273.15
+
+# pgn -> (extractor precompilado, manejador)
+_registry = {}
+
+# Contadores por PGN: mensajes, errores y tiempo total (extracción + manejador)
+stats = {}
+
+# Epoch de lectura de la trama que se está repartiendo (hora de las muestras guardadas)
+_ts_utc = None
+
+
+def register(pgn):
+    """Decorador: registra 'handler(fields)' para un PGN de actisense.PGN_TABLE."""
+    def wrap(handler):
+        _registry[pgn] = (actisense.EXTRACTORS[pgn], handler)
+        stats[pgn] = {"count": 0, "errors": 0, "time_s": 0.0}
+        return handler
+    return wrap
+
+
+def registered_pgns():
+    """PGN con manejador: úsalo como filtro del FrameParser para no tocar el resto."""
+    return frozenset(_registry)
+
+
+def dispatch(msg, t_read=None):
+    """
+    Extrae los campos de 'msg' y llama a su manejador. Devuelve los campos (o None).
+    't_read' (monotónico) es cuándo se leyó la trama: las muestras se guardan con esa hora.
+    """
+    global _ts_utc
+    entry = _registry.get(msg.pgn)
+    if entry is None:
+        return None
+    _ts_utc = None if t_read is None else latency.to_wall(t_read)
+    extract, handler = entry
+    st = stats[msg.pgn]
+    t0 = time.perf_counter()
+    try:
+        fields = extract(msg.data)
+        handler(fields)
+        return fields
+    except Exception as e:
+        st["errors"] += 1
+        if st["errors"] % 100 == 1:
+            logging.warning(f"Error procesando PGN {msg.pgn}: {e}")
+        return None
+    finally:
+        st["count"] += 1
+        st["time_s"] += time.perf_counter() - t0
+
+
+def stats_summary():
+    """Contadores y coste medio (µs) por PGN."""
+    return {
+        pgn: {
+            "name": actisense.PGN_TABLE[pgn][0],
+            "count": st["count"],
+            "errors": st["errors"],
+            "mean_us": round(st["time_s"] / st["count"] * 1e6, 1) if st["count"] else None,
+        }
+        for pgn, st in stats.items()
+    }
+
+
+def log_stats():
+    partes = [
+        f"{pgn}: {s['count']} ({s['mean_us']} µs)"
+        for pgn, s in stats_summary().items() if s["count"]
+    ]
+    if partes:
+        logging.info("📊 PGN NMEA2000 -> " + " | ".join(partes))
+
+
+def _store(table, row, **values):
+    """
+    Encola la muestra en el escritor de DB (core.database): el lector no hace
+    ningún commit, ni antes de la MWV ni en el bucle de eventos.
+    """
+    if N2K_STORE_SAMPLES:
+        database.insert_sample(table, row(ts_utc=_ts_utc, **values))
+
+
+def _present(**values):
+    return {k: v for k, v in values.items() if v is not None}
+
+
+# ============================================================
+#   MANEJADORES
+# ============================================================
+@register(130306)
+def on_wind(f):
+    # El estado fusionado y la salida MWV los gestiona wind_manager
+    if f["wind_speed_ms"] is not None:
+        _store("wind_samples", db.wind_nmea_row, wind_speed_ms=f["wind_speed_ms"], wind_dir_deg=f["wind_angle_deg"])
+
+
+@register(127250)
+def on_heading(f):
+    if f["heading_deg"] is None:
+        return
+    update_state({"heading": round(f["heading_deg"], 1)})
+    _store("nav_samples", db.nav_row, **_present(
+        heading_deg=f["heading_deg"], deviation_deg=f["deviation_deg"], variation_deg=f["variation_deg"],
+    ))
+
+
+@register(128259)
+def on_speed(f):
+    if f["stw_ms"] is None:
+        return
+    update_state({"stw": round(f["stw_ms"] * MS_TO_KN, 2)})
+    _store("nav_samples", db.nav_row, stw_ms=f["stw_ms"])
+
+
+@register(129025)
+def on_position(f):
+    if f["lat_deg"] is None or f["lon_deg"] is None:
+        return
+    # Claves propias: lat/lon son de la Pixhawk (grupo gps, con su alt y sus tiempos)
+    update_state({"n2k_lat": f["lat_deg"], "n2k_lon": f["lon_deg"]})
+    _store("nav_samples", db.nav_row, lat_deg=f["lat_deg"], lon_deg=f["lon_deg"])
+
+
+@register(129026)
+def on_cog_sog(f):
+    values = _present(cog_deg=f["cog_deg"], sog_ms=f["sog_ms"])
+    if not values:
+        return
+    state = {}
+    if "cog_deg" in values:
+        state["cog"] = round(values["cog_deg"], 1)
+    if "sog_ms" in values:
+        state["sog"] = round(values["sog_ms"] * MS_TO_KN, 2)
+    update_state(state)
+    _store("nav_samples", db.nav_row, **values)
+
+
+@register(130310)
+def on_environment_old(f):
+    values = _present(
+        water_temp_c=None if f["water_temp_k"] is None else f["water_temp_k"] - KELVIN,
+        air_temp_c=None if f["air_temp_k"] is None else f["air_temp_k"] - KELVIN,
+        pressure_hpa=f["pressure_hpa"],
+    )
+    if not values:
+        return
+    update_state({
+        {"water_temp_c": "water_temp", "air_temp_c": "air_temp", "pressure_hpa": "pressure"}[k]: round(v, 2)
+        for k, v in values.items()
+    })
+    _store("environment_samples", db.environment_row, **values)
+
+
+# Fuente de temperatura en 130311 (0 = agua, 1 = aire exterior)
+_TEMP_SOURCE = {0: ("water_temp_c", "water_temp"), 1: ("air_temp_c", "air_temp")}
+
+
+@register(130311)
+def on_environment(f):
+    values = _present(humidity_pct=f["humidity_pct"], pressure_hpa=f["pressure_hpa"])
+    state = {}
+    if "humidity_pct" in values:
+        state["humidity"] = round(values["humidity_pct"], 1)
+    if "pressure_hpa" in values:
+        state["pressure"] = values["pressure_hpa"]
+    source = _TEMP_SOURCE.get(f["temp_source"])
+    if source and f["temp_k"] is not None:
+        values[source[0]] = f["temp_k"] - KELVIN
+        state[source[1]] = round(values[source[0]], 2)
+    if not values:
+        return
+    update_state(state)
+    _store("environment_samples", db.environment_row, **values)
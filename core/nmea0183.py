@@ -0,0 +1,175 @@
+# core/nmea0183.py
+import time
+
+# Codificador NMEA 0183 sobre bytes. Una frase es
+#   $<talker+tipo>,<campos>*<checksum>\r\n
+# con el checksum = XOR de todos los bytes entre '$' y '*' (sin incluirlos).
+#
+# Camino rápido: las partes fijas de cada frase (talker, letras de unidad y
+# referencia) tienen su XOR precalculado, y los números con una décima
+# (ángulos y velocidades) salen de una tabla (texto, XOR) indexada por
+# décimas, así que no se formatea ni se recorre el texto de cada frase.
+
+_HEX = [b"%02X" % i for i in range(256)]
+
+# Décimas precalculadas: 0.0 .. 360.0 (ángulos y cualquier velocidad real)
+_TENTHS_PRECOMPUTED = 3600
+# Fuera de ese rango se guardan en la tabla hasta este valor absoluto
+_TENTHS_CACHE_LIMIT = 100000
+
+
+def checksum(data):
+    """XOR de los bytes de 'data' (el cuerpo entre '$' y '*')."""
+    c = 0
+    for b in data:
+        c ^= b
+    return c
+
+
+def sentence(body):
+    """Frase completa a partir del cuerpo (bytes, sin '$' ni checksum)."""
+    return b"$" + body + b"*" + _HEX[checksum(body)] + b"\r\n"
+
+
+def sentence_str(body):
+    """Igual que sentence() con cuerpo str; devuelve str (scripts y logs)."""
+    return sentence(body.encode("ascii")).decode("ascii")
+
+
+# ============================================================
+#   CAMPOS NUMÉRICOS CON UNA DÉCIMA
+# ============================================================
+def _entry(tenths):
+    text = b"%.1f" % (tenths / 10)
+    return text, checksum(text)
+
+
+_TENTHS = {k: _entry(k) for k in range(_TENTHS_PRECOMPUTED + 1)}
+_EMPTY = (b"", 0)
+
+
+def _f1(value):
+    """(texto con una décima, su XOR); campo vacío si no hay valor."""
+    if value is None or value != value:
+        return _EMPTY
+    k = round(value * 10)
+    e = _TENTHS.get(k)
+    if e is None:
+        e = _entry(k)
+        if abs(k) <= _TENTHS_CACHE_LIMIT:
+            _TENTHS[k] = e
+    return e
+
+
+def _fixed(*parts):
+    return checksum(b"".join(parts))
+
+
+# ============================================================
+#   FRASES
+# ============================================================
+_MWV_XOR = {(ref, unit): _fixed(b"WIMWV,,", ref, b",,", unit, b",A")
+            for ref in (b"R", b"T") for unit in (b"N", b"M", b"K")}
+
+
+def mwv(angle, speed, reference=b"R", unit=b"N"):
+    """$WIMWV: ángulo del viento (grados, R relativo / T verdadero) y velocidad."""
+    a, xa = _f1(angle)
+    s, xs = _f1(speed)
+    c = _MWV_XOR[(reference, unit)] ^ xa ^ xs
+    return b"$WIMWV," + a + b"," + reference + b"," + s + b"," + unit + b",A*" + _HEX[c] + b"\r\n"
+
+
+_MWD_XOR = _fixed(b"WIMWD,", b",T,", b",M,", b",N,", b",M")
+
+
+def mwd(direction_true, direction_mag, speed_kn, speed_ms=None):
+    """$WIMWD: dirección de procedencia del viento (verdadera y magnética) y velocidad."""
+    if speed_ms is None and speed_kn is not None:
+        speed_ms = speed_kn / 1.94384
+    t, xt = _f1(direction_true)
+    m, xm = _f1(direction_mag)
+    k, xk = _f1(speed_kn)
+    s, xs = _f1(speed_ms)
+    c = _MWD_XOR ^ xt ^ xm ^ xk ^ xs
+    return (b"$WIMWD," + t + b",T," + m + b",M," + k + b",N," + s + b",M*"
+            + _HEX[c] + b"\r\n")
+
+
+def _signed(value, positive, negative):
+    """Desvío/variación NMEA: valor absoluto y letra E/W."""
+    if value is None:
+        return b"", b""
+    return b"%.1f" % abs(value), positive if value >= 0 else negative
+
+
+_HDG_XOR = _fixed(b"HCHDG,")
+
+
+def hdg(heading, deviation=None, variation=None):
+    """$HCHDG: rumbo magnético con desvío y variación (E positivo)."""
+    h, xh = _f1(heading)
+    dev, dev_ew = _signed(deviation, b"E", b"W")
+    var, var_ew = _signed(variation, b"E", b"W")
+    tail = b"," + dev + b"," + dev_ew + b"," + var + b"," + var_ew
+    c = _HDG_XOR ^ xh ^ checksum(tail)
+    return b"$HCHDG," + h + tail + b"*" + _HEX[c] + b"\r\n"
+
+
+_VHW_XOR = _fixed(b"IIVHW,", b",T,", b",M,", b",N,", b",K")
+
+
+def vhw(heading_true, heading_mag, speed_kn):
+    """$IIVHW: rumbo (verdadero y magnético) y velocidad en el agua."""
+    t, xt = _f1(heading_true)
+    m, xm = _f1(heading_mag)
+    k, xk = _f1(speed_kn)
+    h, xkm = _f1(None if speed_kn is None else speed_kn * 1.852)
+    c = _VHW_XOR ^ xt ^ xm ^ xk ^ xkm
+    return (b"$IIVHW," + t + b",T," + m + b",M," + k + b",N," + h + b",K*"
+            + _HEX[c] + b"\r\n")
+
+
+def _latlon(value, degree_digits, positive, negative):
+    if value is None:
+        return b"", b""
+    a = abs(value)
+    degrees = int(a)
+    minutes = (a - degrees) * 60
+    return b"%0*d%07.4f" % (degree_digits, degrees, minutes), positive if value >= 0 else negative
+
+
+def rmc(timestamp, lat, lon, sog_kn, cog, variation=None, valid=True):
+    """$GPRMC: posición, SOG/COG y hora UTC ('timestamp' en epoch)."""
+    t = time.gmtime(timestamp)
+    hundredths = int((timestamp % 1) * 100)
+    la, ns = _latlon(lat, 2, b"N", b"S")
+    lo, ew = _latlon(lon, 3, b"E", b"W")
+    var, var_ew = _signed(variation, b"E", b"W")
+    body = b"GPRMC,%02d%02d%02d.%02d,%s,%s,%s,%s,%s,%s,%s,%02d%02d%02d,%s,%s,%s" % (
+        t.tm_hour, t.tm_min, t.tm_sec, hundredths, b"A" if valid else b"V",
+        la, ns, lo, ew, _f1(sog_kn)[0], _f1(cog)[0],
+        t.tm_mday, t.tm_mon, t.tm_year % 100, var, var_ew, b"A" if valid else b"N")
+    return sentence(body)
+
+
+# ============================================================
+#   LOTES
+# ============================================================
+def encode_batch(encoder, samples):
+    """Codifica muchas muestras (tuplas de argumentos) en un único buffer."""
+    return b"".join([encoder(*s) for s in samples])
+
+
+def mwv_batch(samples, reference=b"R", unit=b"N"):
+    """Lote de MWV a partir de (ángulo, velocidad), sin llamadas por frase."""
+    base = _MWV_XOR[(reference, unit)]
+    mid = b"," + reference + b","
+    tail = b"," + unit + b",A*"
+    f1, hexa = _f1, _HEX
+    out = []
+    for angle, speed in samples:
+        a, xa = f1(angle)
+        s, xs = f1(speed)
+        out += (b"$WIMWV,", a, mid, s, tail, hexa[base ^ xa ^ xs], b"\r\n")
+    return b"".join(out)
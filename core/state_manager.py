@@ -0,0 +1,94 @@
+# core/state_manager.py
+import threading
+import time
+import logging
+from config import FUSION_RATE_HZ, LATENCY_EXPORT_INTERVAL
+from core import latency, live_stream
+from core.database import insert_data
+from core.live_buffer import publish
+
+# Grupos de campos que llegan juntos en un mismo mensaje.
+# La edad se guarda por grupo en la columna age_<grupo> (segundos).
+# boot_ms_* (time_boot_ms de la Pixhawk) y rx_time_* (epoch de recepción)
+# dicen a qué instante corresponde el valor, no cuándo se fusionó.
+FIELD_GROUPS = {
+    "gps": ("lat", "lon", "alt", "boot_ms_gps", "rx_time_gps"),
+    "att": ("roll", "pitch", "yaw", "boot_ms_att", "rx_time_att"),
+    "wind": ("wind_angle", "wind_speed"),
+    "servo": ("servo_rudder", "servo_sail"),
+    # NMEA2000 (core/n2k_dispatch.py)
+    "hdg": ("heading",),
+    "nav": ("cog", "sog", "stw", "n2k_lat", "n2k_lon"),
+    "env": ("water_temp", "air_temp", "pressure", "humidity"),
+}
+_FIELD_TO_GROUP = {field: group for group, fields in FIELD_GROUPS.items() for field in fields}
+
+# Último valor conocido de cada campo y momento (monotónico) de su última actualización
+_state = {}
+_updated_at = {}
+_state_lock = threading.Lock()
+
+def update_state(data_update):
+    """Actualiza el estado con los campos recibidos (sample-and-hold)."""
+    now = time.monotonic()
+    with _state_lock:
+        _state.update(data_update)
+        for field in data_update:
+            group = _FIELD_TO_GROUP.get(field)
+            if group:
+                _updated_at[group] = now
+
+def snapshot():
+    """Devuelve una fila completa con el último valor de cada campo y su edad."""
+    now = time.monotonic()
+    with _state_lock:
+        if not _state:
+            return None
+        row = dict(_state)
+        for group, t in _updated_at.items():
+            row[f"age_{group}"] = round(now - t, 3)
+
+    wall = time.time()
+    # Mismo formato que CURRENT_TIMESTAMP (UTC) pero con milisegundos
+    row["timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(wall)) + f".{int(wall * 1000) % 1000:03d}"
+    return row
+
+# Marca del último viento que ya viajó en una fila (para medir parse -> commit una sola vez)
+_last_wind_t = None
+
+def emit_row(insert=insert_data):
+    """Publica la fila fusionada actual (buffer en vivo y canal de empuje) y la pasa a 'insert'."""
+    global _last_wind_t
+    row = snapshot()
+    if row:
+        publish(row)
+        live_stream.publish(row)
+        # Primera fila con un viento nuevo: el escritor mide cuándo llega al commit
+        t_wind = _updated_at.get("wind")
+        if t_wind is not None and t_wind != _last_wind_t:
+            _last_wind_t = t_wind
+            row["_t_wind"] = t_wind
+        insert(row)
+    return row
+
+def fusion_loop():
+    """Emite una fila densa a 'telemetria' (y al buffer en vivo) a FUSION_RATE_HZ."""
+    period = 1.0 / FUSION_RATE_HZ
+    logging.info(f"🧩 Hilo de fusión iniciado ({FUSION_RATE_HZ} Hz)")
+
+    next_tick = time.monotonic()
+    next_export = next_tick + LATENCY_EXPORT_INTERVAL
+    while True:
+        next_tick += period
+        emit_row()
+
+        if next_tick >= next_export:
+            latency.export_metrics()
+            next_export = next_tick + LATENCY_EXPORT_INTERVAL
+
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            # Vamos tarde: reajustamos en lugar de acumular ticks atrasados
+            next_tick = time.monotonic()
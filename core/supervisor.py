@@ -0,0 +1,246 @@
+# core/supervisor.py
+import os
+import json
+import time
+import logging
+import threading
+import subprocess
+from collections import deque
+
+from config import SUPERVISOR_BACKOFF_MIN, SUPERVISOR_BACKOFF_MAX, SUPERVISOR_STABLE_S
+from config import SUPERVISOR_METRICS_PATH
+
+# Supervisión de las etapas de la entrada de viento (actisense-serial,
+# analyzer o el lector nativo del NGT-1): cada etapa caída se relanza sola,
+# con espera exponencial, y se mide cuánto tarda en volver a llegar viento.
+
+# Líneas de stderr que se guardan por etapa (se muestran al caer)
+STDERR_TAIL = 5
+
+stats = {}    # etapa -> contadores (ver _stage)
+down = {}     # etapa -> instante (monotonic) en que cayó, hasta que vuelve el viento
+_lock = threading.Lock()
+
+
+# ============================================================
+#   ESPERA EXPONENCIAL
+# ============================================================
+class Backoff:
+    """Espera antes de relanzar: se duplica en cada fallo seguido y vuelve al mínimo tras una racha estable."""
+
+    def __init__(self, minimum=SUPERVISOR_BACKOFF_MIN, maximum=SUPERVISOR_BACKOFF_MAX, stable=SUPERVISOR_STABLE_S):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.stable = stable
+        self.delay = minimum
+
+    def failed(self, uptime=0.0):
+        """Espera para el próximo intento tras un fallo después de 'uptime' s en marcha."""
+        if uptime >= self.stable:
+            self.delay = self.minimum
+        delay = self.delay
+        self.delay = min(self.delay * 2, self.maximum)
+        return delay
+
+
+# ============================================================
+#   MÉTRICAS DE RECUPERACIÓN
+# ============================================================
+def _stage(name):
+    st = stats.get(name)
+    if st is None:
+        st = stats[name] = {
+            "starts": 0,
+            "failures": 0,
+            "last_failure": None,
+            "recoveries": 0,
+            "recovery_last_s": None,
+            "recovery_max_s": 0.0,
+            "recovery_total_s": 0.0,
+            "stderr_lines": 0,
+            "stderr_tail": deque(maxlen=STDERR_TAIL),
+        }
+    return st
+
+
+def mark_down(name, reason=None):
+    """Registra la caída de una etapa (el tiempo de recuperación cuenta desde aquí)."""
+    with _lock:
+        st = _stage(name)
+        st["failures"] += 1
+        st["last_failure"] = reason
+        down.setdefault(name, time.monotonic())
+    export_metrics()
+
+
+def mark_up():
+    """Ha llegado viento: todas las etapas caídas se dan por recuperadas."""
+    now = time.monotonic()
+    with _lock:
+        recovered = list(down.items())
+        down.clear()
+        for name, since in recovered:
+            st = _stage(name)
+            dt = now - since
+            st["recoveries"] += 1
+            st["recovery_last_s"] = dt
+            st["recovery_max_s"] = max(st["recovery_max_s"], dt)
+            st["recovery_total_s"] += dt
+            logging.info(f"♻️ {name} recuperado: viento de nuevo en {dt * 1000:.0f} ms "
+                         f"(caída nº {st['failures']})")
+    if recovered:
+        export_metrics()
+
+
+def stats_summary():
+    """Reinicios y tiempos de recuperación por etapa."""
+    with _lock:
+        return {
+            name: {
+                "starts": st["starts"],
+                "failures": st["failures"],
+                "last_failure": st["last_failure"],
+                "down": name in down,
+                "recoveries": st["recoveries"],
+                "recovery_last_ms": round(st["recovery_last_s"] * 1000) if st["recovery_last_s"] is not None else None,
+                "recovery_mean_ms": round(st["recovery_total_s"] / st["recoveries"] * 1000) if st["recoveries"] else None,
+                "recovery_max_ms": round(st["recovery_max_s"] * 1000),
+                "stderr_lines": st["stderr_lines"],
+                "stderr_tail": list(st["stderr_tail"]),
+            }
+            for name, st in stats.items()
+        }
+
+
+def export_metrics(path=None):
+    """Escribe stats_summary() en SUPERVISOR_METRICS_PATH (reemplazo atómico)."""
+    path = path or SUPERVISOR_METRICS_PATH
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump({"updated": time.time(), "stages": stats_summary()}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        logging.debug(f"No se pudieron exportar las métricas del supervisor: {e}")
+
+
+# ============================================================
+#   PROCESOS HIJOS
+# ============================================================
+def _drain_stderr(name, pipe):
+    """Vacía el stderr de un hijo (si nadie lo lee, el hijo se bloquea al llenarse la tubería)."""
+    st = stats[name]
+    with pipe:
+        for raw in pipe:
+            line = raw.decode("utf-8", errors="replace").rstrip()
+            if not line:
+                continue
+            st["stderr_lines"] += 1
+            st["stderr_tail"].append(line)
+            logging.debug(f"[{name}] {line}")
+
+
+class ChildProcess:
+    """
+    Un proceso hijo que se relanza al morir. Un hilo espera a que termine
+    (sin sondeo) y lo vuelve a lanzar con los mismos stdin/stdout tras la
+    espera del Backoff.
+    """
+
+    def __init__(self, name, argv, stdin=None, stdout=None):
+        self.name = name
+        self.argv = argv
+        self.stdin = stdin
+        self.stdout = stdout
+        self.proc = None
+        self.backoff = Backoff()
+        self._stop = threading.Event()
+        self._thread = None
+        with _lock:
+            _stage(name)
+
+    def _spawn(self):
+        self.proc = subprocess.Popen(self.argv, stdin=self.stdin, stdout=self.stdout, stderr=subprocess.PIPE)
+        stats[self.name]["starts"] += 1
+        stats[self.name]["stderr_tail"].clear()
+        threading.Thread(target=_drain_stderr, args=(self.name, self.proc.stderr),
+                         name=f"{self.name}-stderr", daemon=True).start()
+
+    def _watch(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self._spawn()
+                code = self.proc.wait()
+                reason = f"código {code}"
+            except OSError as e:
+                reason = str(e)
+            if self._stop.is_set():
+                break
+
+            mark_down(self.name, reason)
+            delay = self.backoff.failed(time.monotonic() - started)
+            tail = " | ".join(stats[self.name]["stderr_tail"])
+            logging.warning(f"⚠️ {self.name} terminó ({reason}); se relanza en {delay * 1000:.0f} ms"
+                            + (f". stderr: {tail}" if tail else ""))
+            self._stop.wait(delay)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name=f"Supervisor-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+class Pipeline:
+    """
+    Procesos encadenados (stdout de uno -> stdin del siguiente) por tuberías
+    que crea y conserva este proceso: si muere una etapa se relanza solo esa,
+    conectada a las mismas tuberías, y las demás ni se enteran. La salida de
+    la última etapa se lee de 'stdout_fd' (no llega a EOF hasta stop()).
+    """
+
+    def __init__(self, stages):
+        self.children = []
+        self._fds = []
+        stdin = subprocess.PIPE   # actisense-serial termina si ve EOF en stdin
+        for name, argv in stages:
+            r, w = os.pipe()
+            self._fds += [w, r]
+            self.children.append(ChildProcess(name, argv, stdin=stdin, stdout=w))
+            stdin = r
+        self.stdout_fd = stdin
+
+    def start(self):
+        for child in self.children:
+            child.start()
+        return self
+
+    def lines(self):
+        """Líneas de la última etapa, sin cortes al relanzar cualquiera de ellas."""
+        with os.fdopen(self.stdout_fd, "rb", closefd=False) as f:
+            yield from f
+
+    def stop(self):
+        for child in self.children:
+            child.stop()
+        for fd in self._fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds = []
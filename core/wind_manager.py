@@ -1,125 +1,185 @@
-import subprocess
 import json
-import math
 import time
 import logging
 import serial
 import os
-import sys
-from config import PORT_WIND_IN, PORT_WIND_OUT, BAUD_WIND_OUT, WIND_SAVE_INTERVAL
-from core.database import insert_data
-
-def calcular_checksum(sentencia):
-    """Calcula el checksum NMEA (XOR de todos los caracteres entre $ y *)"""
-    checksum = 0
-    for char in sentencia[1:]:
-        checksum ^= ord(char)
-    return f"{checksum:02X}"
-
-def generar_mwv(angulo, velocidad, unidad_velocidad='N', referencia_angulo='R'):
-    """Genera la sentencia NMEA 0183 MWV ($WIMWV)"""
-    # Formato: $WIMWV,AAA.A,R,VVV.V,N,A
-    data = f"WIMWV,{angulo:.1f},{referencia_angulo},{velocidad:.1f},{unidad_velocidad},A"
-    checksum = calcular_checksum('$' + data)
-    return f"${data}*{checksum}\r\n"
+from config import PORT_WIND_IN, BAUD_WIND_IN, PORT_WIND_OUT, BAUD_WIND_OUT, WIND_DECODER
+from config import N2K_STATS_INTERVAL
+from core import actisense, n2k_dispatch, nmea0183, supervisor, latency
+from core.state_manager import update_state
+from core.mwv_output import MwvOutput
+
+WIND_PGN = 130306
+
+def lecturas_actisense():
+    """
+    (ángulo en grados, velocidad en m/s, t lectura, t decodificado) decodificando
+    el NGT-1 en este proceso. El resto de PGN registrados (rumbo, velocidad,
+    posición, ambiente) se reparten a su manejador en core/n2k_dispatch.py.
+    """
+    ser_in = actisense.open_port(PORT_WIND_IN, BAUD_WIND_IN)
+    try:
+        logging.info(f"🚀 Lectura directa Actisense iniciada (PGN {sorted(n2k_dispatch.registered_pgns())}).")
+        last_stats = time.monotonic()
+        parser = actisense.FrameParser(n2k_dispatch.registered_pgns())
+        for msg in actisense.read_messages(ser_in, parser=parser):
+            t_read = parser.last_read
+            fields = n2k_dispatch.dispatch(msg, t_read)
+
+            now = time.monotonic()
+            if now - last_stats >= N2K_STATS_INTERVAL:
+                n2k_dispatch.log_stats()
+                last_stats = now
+
+            if msg.pgn != WIND_PGN or fields is None:
+                continue
+            if fields["wind_speed_ms"] is None or fields["wind_angle_deg"] is None:
+                continue
+            t_parse = latency.now()
+            latency.record("read_parse", t_read, t_parse)
+            yield fields["wind_angle_deg"], fields["wind_speed_ms"], t_read, t_parse
+    finally:
+        ser_in.close()
+
+def viento_de_json(raw):
+    """(ángulo, velocidad m/s) de una línea de analyzer -json, o None si no es viento."""
+    try:
+        line = raw.decode("utf-8").strip()
+        if not line:
+            return None
+
+        obj = json.loads(line)
+        if obj.get("pgn") != WIND_PGN:
+            return None
+
+        fields = obj.get("fields", {})
+        return float(fields.get("Wind Angle", 0)), float(fields.get("Wind Speed", 0))
+    except Exception:
+        # Si falla una línea JSON, simplemente seguimos
+        return None
+
+# Etapas del pipeline externo (decodificador "analyzer")
+ANALYZER_STAGES = [
+    ("actisense-serial", ["actisense-serial", PORT_WIND_IN]),
+    ("analyzer", ["analyzer", "-json"]),
+]
+# Nombre de la entrada de viento en las métricas del supervisor
+NGT1_STAGE = "ngt1"
+
+def lecturas_analyzer():
+    """(ángulo en grados, velocidad en m/s, t lectura, t decodificado) a través de actisense-serial | analyzer -json."""
+    pipeline = supervisor.Pipeline(ANALYZER_STAGES).start()
+    logging.info("🚀 Pipeline Actisense -> Analyzer iniciado (supervisado).")
+    try:
+        for raw in pipeline.lines():
+            t_read = latency.now()
+            lectura = viento_de_json(raw)
+            if lectura is not None:
+                t_parse = latency.now()
+                latency.record("read_parse", t_read, t_parse)
+                yield (*lectura, t_read, t_parse)
+    finally:
+        pipeline.stop()
+
+def limpiar_procesos():
+    """Mata actisense-serial/analyzer que hayan quedado de un arranque anterior."""
+    logging.info("Limpiando procesos antiguos y esperando al puerto...")
+    os.system("pkill -9 -f actisense-serial")
+    os.system("pkill -9 -f analyzer")
+
+def enviar_viento(salida, wind_angle_deg, wind_speed_ms, t_read=None, t_parse=None):
+    """
+    Pasa el viento a la etapa de salida MWV y actualiza el estado fusionado.
+    t_read / t_parse: marcas monotónicas de lectura y decodificación (latencias).
+    """
+    wind_speed_knots = wind_speed_ms * 1.94384
+
+    # A. Enviar a Pixhawk (la etapa de salida envía solo el último a MWV_RATE_HZ)
+    salida.submit(wind_angle_deg, wind_speed_knots, t_read, t_parse)
+
+    # B. Actualizar estado fusionado (lo guarda el hilo de fusión)
+    update_state({
+        "wind_angle": round(wind_angle_deg, 1),
+        "wind_speed": round(wind_speed_knots, 1)
+    })
+
+def abrir_salida(port=None, baud=None):
+    """Puerto hacia la Pixhawk sin bloqueo en escritura y su etapa MWV (sin arrancar)."""
+    port = port or PORT_WIND_OUT
+    baud = baud or BAUD_WIND_OUT
+    ser_out = serial.Serial(port, baud, timeout=1, write_timeout=0)
+    salida = MwvOutput(ser_out.write, nmea0183.mwv, queue_depth=lambda: ser_out.out_waiting, baud=baud)
+    return ser_out, salida
+
+def leer_viento(salida):
+    """
+    Lee el NGT-1 y pasa el viento a 'salida'. Si la entrada falla se relanza
+    solo ella (la salida a la Pixhawk sigue abierta) tras la espera del
+    supervisor. Sale con una excepción si es la salida la que falla.
+    """
+    backoff = supervisor.Backoff()
+    while True:
+        started = time.monotonic()
+        lecturas = lecturas_analyzer() if WIND_DECODER == "analyzer" else lecturas_actisense()
+        try:
+            for wind_angle_deg, wind_speed_ms, t_read, t_parse in lecturas:
+                if supervisor.down:
+                    supervisor.mark_up()
+                enviar_viento(salida, wind_angle_deg, wind_speed_ms, t_read, t_parse)
+                if salida.stats["errors"]:
+                    raise serial.SerialException(f"la salida MWV hacia {PORT_WIND_OUT} falla")
+            motivo = "fin del flujo"
+            logging.warning("⚠️ El flujo de datos se ha detenido inesperadamente.")
+        except serial.SerialException as e:
+            if salida.stats["errors"]:
+                raise
+            motivo = str(e)
+            logging.error(f"❌ Error leyendo el NGT-1: {e}")
+        except Exception as e:
+            motivo = str(e)
+            logging.error(f"❌ Error en la entrada de viento: {e}")
+        finally:
+            lecturas.close()
+
+        supervisor.mark_down(NGT1_STAGE, motivo)
+        delay = backoff.failed(time.monotonic() - started)
+        logging.info(f"🔄 Relanzando la entrada de viento en {delay * 1000:.0f} ms...")
+        time.sleep(delay)
 
 def wind_loop():
-    logging.info(f"🌀 Hilo de Viento iniciado (Modo Resiliente STDIN)")
-    
+    logging.info(f"🌀 Hilo de Viento iniciado (decodificador: {WIND_DECODER})")
+
+    if WIND_DECODER == "analyzer":
+        # Restos de un arranque anterior: solo una vez, no en cada reintento
+        limpiar_procesos()
+        time.sleep(2)
+
+    backoff = supervisor.Backoff()
     while True:
         ser_out = None
-        p1 = None
-        p2 = None
-        
-        try:
-            # 0. Limpieza profunda y espera de liberación de puerto
-            logging.info("Limpiando procesos antiguos y esperando al puerto...")
-            os.system("pkill -9 -f actisense-serial")
-            os.system("pkill -9 -f analyzer")
-            time.sleep(2) 
+        salida = None
+        started = time.monotonic()
 
+        try:
             # 1. Abrir puerto serial hacia la Pixhawk
-            ser_out = serial.Serial(PORT_WIND_OUT, BAUD_WIND_OUT, timeout=1)
+            ser_out, salida = abrir_salida(PORT_WIND_OUT, BAUD_WIND_OUT)
+            salida.start()
             logging.info(f"✅ Puerto serial {PORT_WIND_OUT} listo.")
 
-            # 2. Iniciar Pipeline (Estructura idéntica a tu script funcional)
-            # Añadimos stdin=subprocess.PIPE para evitar el error de EOF
-            p1 = subprocess.Popen(
-                ["actisense-serial", PORT_WIND_IN],
-                stdout=subprocess.PIPE,
-                stdin=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                text=False
-            )
-            
-            p2 = subprocess.Popen(
-                ["analyzer", "-json"],
-                stdin=p1.stdout,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=False
-            )
-
-            logging.info("🚀 Pipeline Actisense -> Analyzer iniciado.")
-
-            last_save = 0
-            last_debug_print = 0
-
-            # 3. Lectura de datos
-            for raw in p2.stdout:
-                try:
-                    line = raw.decode("utf-8").strip()
-                    if not line:
-                        continue
-                    
-                    obj = json.loads(line)
-                    if obj.get("pgn") != 130306:
-                        continue
-
-                    fields = obj.get("fields", {})
-                    wind_speed_ms = float(fields.get("Wind Speed", 0))
-                    wind_angle_deg = float(fields.get("Wind Angle", 0))
-                    wind_speed_knots = wind_speed_ms * 1.94384
-
-                    # A. Enviar a Pixhawk
-                    mwv_sentence = generar_mwv(wind_angle_deg, wind_speed_knots)
-                    ser_out.write(mwv_sentence.encode('ascii'))
-
-                    now = time.time()
-                    
-                    # B. Monitorización por consola cada 3s
-                    if now - last_debug_print >= 3.0:
-                        logging.info(f"📡 MONITORIZACIÓN -> {mwv_sentence.strip()}")
-                        last_debug_print = now
-
-                    # C. Guardar en DB para el Dashboard
-                    if now - last_save >= WIND_SAVE_INTERVAL:
-                        insert_data({
-                            "wind_angle": round(wind_angle_deg, 1),
-                            "wind_speed": round(wind_speed_knots, 1)
-                        })
-                        last_save = now
-
-                except Exception as e:
-                    # Si falla una línea JSON, simplemente seguimos
-                    continue
-
-            logging.warning("⚠️ El flujo de datos se ha detenido inesperadamente.")
+            # 2. Fuente de datos NMEA2000 (se relanza sola, sin cerrar la salida)
+            leer_viento(salida)
 
         except Exception as e:
             logging.error(f"❌ Error crítico en WindThread: {e}")
-        
+
         finally:
             # Limpieza exhaustiva
             logging.info("Cerrando recursos de viento...")
+            if salida is not None:
+                salida.stop()
             if ser_out and ser_out.is_open:
                 ser_out.close()
-            if p2: 
-                p2.terminate()
-                p2.wait()
-            if p1: 
-                p1.terminate()
-                p1.wait()
-            
-            logging.info("🔄 Reintentando conexión de viento en 5 segundos...")
-            time.sleep(5)
+
+        delay = backoff.failed(time.monotonic() - started)
+        logging.info(f"🔄 Reintentando conexión de viento en {delay * 1000:.0f} ms...")
+        time.sleep(delay)
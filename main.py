@@ -3,6 +3,9 @@ import time
 import logging
 import os
 import sys
+import signal
+import asyncio
+import argparse
 
 # Configuración de logs para que se vean en consola y se guarden bien
 logging.basicConfig(
@@ -13,16 +16,57 @@ logging.basicConfig(
 
 # Importamos la configuración y los gestores
 try:
-    from config import WIND_SAVE_INTERVAL, DB_PATH
-    from core.database import init_db
+    from config import WIND_SAVE_INTERVAL, DB_PATH, RUNTIME_MODE
+    from core.database import init_db, start_writer, flush_and_stop
     from core.wind_manager import wind_loop
     from core.mavlink_manager import mavlink_loop
+    from core.state_manager import fusion_loop
+    from core.live_buffer import start_publisher, stop_publisher
+    from core.live_stream import start_stream, stop_stream
+    from storage.archive import compactor_loop
+    from storage.tlog import stop_recorder
+    from core import async_runtime
 except ImportError as e:
     logging.error(f"Error importando módulos: {e}")
     sys.exit(1)
 
+def start_threads(archive=True):
+    """Modo "threads": un hilo por sensor más la fusión y el archivo."""
+    start_writer()
+
+    # 3. Lanzar Hilo de Viento (Lectura de NMEA2000 y envío de NMEA0183)
+    # Este hilo usa la lógica que ya te ha funcionado en el laboratorio
+    wind_thread = threading.Thread(target=wind_loop, name="WindThread", daemon=True)
+    
+    # 4. Lanzar Hilo de MAVLink (Lectura de telemetría de la Pixhawk para el Dashboard)
+    mavlink_thread = threading.Thread(target=mavlink_loop, name="MavlinkThread", daemon=True)
+
+    # 5. Lanzar Hilo de Fusión (una fila completa en 'telemetria' a FUSION_RATE_HZ)
+    fusion_thread = threading.Thread(target=fusion_loop, name="FusionThread", daemon=True)
+
+    threads = [wind_thread, mavlink_thread, fusion_thread]
+
+    # 6. Lanzar Hilo de Archivo (compacta las muestras antiguas en bloques)
+    if archive:
+        threads.append(threading.Thread(target=compactor_loop, name="ArchiveThread", daemon=True))
+
+    # Iniciar hilos
+    for thread in threads:
+        thread.start()
+
+    logging.info("Hilos de ejecución iniciados correctamente.")
+    return threads
+
 def main():
-    logging.info("--- Iniciando SailBridge OS ---")
+    parser = argparse.ArgumentParser(description="SailBridge OS")
+    parser.add_argument("--runtime", choices=("threads", "asyncio"), default=RUNTIME_MODE,
+                        help=f"modelo de ejecución (por defecto {RUNTIME_MODE}, ver config.RUNTIME_MODE)")
+    args = parser.parse_args()
+
+    logging.info(f"--- Iniciando SailBridge OS (modo {args.runtime}) ---")
+
+    # run_system.sh nos para con SIGTERM: lo convertimos en salida limpia
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
     # 1. Asegurar que existe la carpeta storage para la base de datos
     storage_dir = os.path.dirname(DB_PATH)
@@ -34,25 +78,28 @@ def main():
     init_db()
     logging.info("Base de datos lista.")
 
-    # 3. Lanzar Hilo de Viento (Lectura de NMEA2000 y envío de NMEA0183)
-    # Este hilo usa la lógica que ya te ha funcionado en el laboratorio
-    wind_thread = threading.Thread(target=wind_loop, name="WindThread", daemon=True)
-    
-    # 4. Lanzar Hilo de MAVLink (Lectura de telemetría de la Pixhawk para el Dashboard)
-    mavlink_thread = threading.Thread(target=mavlink_loop, name="MavlinkThread", daemon=True)
-
-    # Iniciar hilos
-    wind_thread.start()
-    mavlink_thread.start()
-
-    logging.info("Hilos de ejecución iniciados correctamente.")
+    # Anillo en memoria compartida para los dashboards en vivo
+    start_publisher()
+    # Canal de empuje (socket UNIX) hacia el SSE del dashboard Flask
+    start_stream()
 
-    # Mantener el programa principal vivo para que no se cierren los hilos
     try:
-        while True:
-            time.sleep(1)
+        if args.runtime == "asyncio":
+            # Un único bucle de eventos (core/async_runtime.py); atiende él SIGINT/SIGTERM
+            asyncio.run(async_runtime.run())
+        else:
+            start_threads()
+            # Mantener el programa principal vivo para que no se cierren los hilos
+            while True:
+                time.sleep(1)
     except KeyboardInterrupt:
         logging.info("Deteniendo sistema por el usuario...")
+    finally:
+        # Volcar a disco las filas pendientes antes de salir
+        flush_and_stop()
+        stop_publisher()
+        stop_stream()
+        stop_recorder()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+bench_actisense.py
+
+Comprueba y mide el decodificador binario del Actisense NGT-1
+(core/actisense.py) frente al camino anterior (analyzer -json + json.loads
+por línea en wind_manager).
+
+Modos:
+  - por defecto: genera un flujo de bus NMEA2000 con el viento de
+    outputs/wind_samples_last50.csv (PGN 130306) mezclado con el resto de
+    tráfico típico (rumbo, posición, COG/SOG, actitud...)
+  - --input FICHERO: usa un flujo grabado del NGT-1 (ver --record)
+  - --record PUERTO: graba --seconds segundos del NGT-1 en --output para
+    usarlos después como fixture (ver tests/fixtures/ngt1_capture.bin)
+
+También se mide el despacho de todos los PGN registrados en
+core/n2k_dispatch.py (extractor + manejador, sin escribir en la BD).
+
+Con el flujo sintético se verifica además que los valores decodificados
+(partiendo el flujo en trozos de tamaño aleatorio) son los esperados.
+
+Uso (desde la raíz del proyecto):
+
+    python scripts/bench_actisense.py --seconds 600
+    python scripts/bench_actisense.py --record /dev/ttyUSB0 --seconds 60 --output viento.bin
+    python scripts/bench_actisense.py --input viento.bin
+"""
+
+import os
+import sys
+import csv
+import json
+import math
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import actisense
+
+OUTPUTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "outputs")
+WIND_PGN = 130306
+
+# Tráfico típico del bus además del viento: pgn -> (Hz, descripción, longitud)
+OTROS_PGN = {
+    127250: (10, "Vessel Heading", 8),
+    127257: (10, "Attitude", 8),
+    129025: (10, "Position, Rapid Update", 8),
+    129026: (4, "COG & SOG, Rapid Update", 8),
+    128259: (1, "Speed", 8),
+    128267: (1, "Water Depth", 8),
+    130311: (0.5, "Environmental Parameters", 8),
+    129029: (1, "GNSS Position Data", 43),
+    60928: (0.2, "ISO Address Claim", 8),
+}
+
+
+# ----------------------------------------------------------
+# FLUJO SINTÉTICO
+# ----------------------------------------------------------
+
+def viento_csv():
+    """(velocidad m/s, ángulo grados) de outputs/wind_samples_last50.csv."""
+    path = os.path.join(OUTPUTS_DIR, "wind_samples_last50.csv")
+    with open(path, newline="") as f:
+        return [(float(r["wind_speed_ms"]), float(r["wind_dir_deg"])) for r in csv.DictReader(f)]
+
+
+def generar_flujo(segundos, wind_hz):
+    """
+    Devuelve (bytes del NGT-1, líneas JSON equivalentes de analyzer, viento esperado).
+    Los valores de viento se cuantizan a la resolución del PGN.
+    """
+    rng = random.Random(1)
+    viento = viento_csv()
+    eventos = []
+    for i in range(int(segundos * wind_hz)):
+        eventos.append((i / wind_hz, WIND_PGN, i))
+    for pgn, (hz, _, _) in OTROS_PGN.items():
+        for i in range(int(segundos * hz)):
+            eventos.append((i / hz + rng.random() * 0.01, pgn, i))
+    eventos.sort()
+
+    tramas = []
+    lineas = []
+    esperado = []
+    for t, pgn, i in eventos:
+        ts = time.strftime("%Y-%m-%d-%H:%M:%S", time.gmtime(1763551556 + t)) + f".{int(t * 1000) % 1000:03d}"
+        if pgn == WIND_PGN:
+            speed_ms, angle_deg = viento[i % len(viento)]
+            raw_speed = round(speed_ms / 0.01)
+            raw_angle = round(math.radians(angle_deg) / 0.0001)
+            data = bytes([i & 0xFF]) + raw_speed.to_bytes(2, "little") + raw_angle.to_bytes(2, "little") + b"\xfa\xff\xff"
+            esperado.append((raw_speed * 0.01, raw_angle * math.degrees(0.0001)))
+            campos = {"SID": i & 0xFF, "Wind Speed": round(raw_speed * 0.01, 2),
+                      "Wind Angle": round(raw_angle * math.degrees(0.0001), 1), "Reference": "Apparent"}
+            descripcion = "Wind Data"
+        else:
+            _, descripcion, longitud = OTROS_PGN[pgn]
+            data = bytes(rng.randrange(256) for _ in range(longitud))
+            campos = {f"Campo {k}": data[k] for k in range(min(longitud, 6))}
+        tramas.append(actisense.encode_n2k(pgn, data, src=35, timestamp_ms=int(t * 1000)))
+        lineas.append((json.dumps({
+            "timestamp": ts, "prio": 2, "src": 35, "dst": 255, "pgn": pgn,
+            "description": descripcion, "fields": campos,
+        }) + "\n").encode())
+    return b"".join(tramas), lineas, esperado
+
+
+def verificar(flujo, esperado):
+    """Decodifica el flujo en trozos aleatorios y compara con el viento esperado."""
+    rng = random.Random(2)
+    parser = actisense.FrameParser(pgns=(WIND_PGN,))
+    obtenido = []
+    i = 0
+    while i < len(flujo):
+        n = rng.randint(1, 512)
+        for msg in parser.feed(flujo[i:i + n]):
+            f = actisense.decode_fields(msg)
+            obtenido.append((f["wind_speed_ms"], f["wind_angle_deg"]))
+        i += n
+    return len(obtenido) == len(esperado) and all(
+        abs(a - c) < 1e-9 and abs(b - d) < 1e-9 for (a, b), (c, d) in zip(obtenido, esperado)
+    )
+
+
+# ----------------------------------------------------------
+# MEDIDAS
+# ----------------------------------------------------------
+
+def medir_nativo(flujo, trozo=4096):
+    """Parser binario con filtro por PGN, leyendo como del puerto en trozos de 'trozo' bytes."""
+    parser = actisense.FrameParser(pgns=(WIND_PGN,))
+    n_viento = 0
+    t0 = time.perf_counter()
+    for i in range(0, len(flujo), trozo):
+        for msg in parser.feed(flujo[i:i + trozo]):
+            f = actisense.decode_fields(msg)
+            if f["wind_speed_ms"] is not None:
+                n_viento += 1
+    return time.perf_counter() - t0, parser.stats["frames"], n_viento
+
+
+def medir_analyzer(lineas):
+    """Réplica del bucle anterior de wind_manager sobre la salida de analyzer -json."""
+    n_viento = 0
+    t0 = time.perf_counter()
+    for raw in lineas:
+        try:
+            line = raw.decode("utf-8").strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            if obj.get("pgn") != WIND_PGN:
+                continue
+            fields = obj.get("fields", {})
+            float(fields.get("Wind Speed", 0))
+            float(fields.get("Wind Angle", 0))
+            n_viento += 1
+        except Exception:
+            continue
+    return time.perf_counter() - t0, len(lineas), n_viento
+
+
+def medir_dispatch(flujo, trozo=4096):
+    """Parser filtrado por los PGN registrados + extractor + manejador (sin escribir en la BD)."""
+    from core import n2k_dispatch
+
+    n2k_dispatch.N2K_STORE_SAMPLES = False
+    parser = actisense.FrameParser(pgns=n2k_dispatch.registered_pgns())
+    t0 = time.perf_counter()
+    for i in range(0, len(flujo), trozo):
+        for msg in parser.feed(flujo[i:i + trozo]):
+            n2k_dispatch.dispatch(msg)
+    return time.perf_counter() - t0, parser.stats, n2k_dispatch.stats_summary()
+
+
+def grabar(puerto, segundos, salida):
+    ser = actisense.open_port(puerto)
+    fin = time.time() + segundos
+    total = 0
+    with open(salida, "wb") as f:
+        while time.time() < fin:
+            chunk = ser.read(ser.in_waiting or 1)
+            f.write(chunk)
+            total += len(chunk)
+    ser.close()
+    print(f"[OK] {total:,} bytes grabados en {salida}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del decodificador Actisense NGT-1.")
+    parser.add_argument("--seconds", type=float, default=600, help="segundos de bus sintético (o de grabación)")
+    parser.add_argument("--wind-hz", type=float, default=10, help="frecuencia del PGN 130306 sintético")
+    parser.add_argument("--input", help="flujo binario grabado del NGT-1")
+    parser.add_argument("--record", metavar="PUERTO", help="grabar el NGT-1 de PUERTO en --output")
+    parser.add_argument("--output", default="actisense.bin", help="fichero de salida de --record")
+    args = parser.parse_args()
+
+    if args.record:
+        grabar(args.record, args.seconds, args.output)
+        return
+
+    lineas = None
+    if args.input:
+        with open(args.input, "rb") as f:
+            flujo = f.read()
+        print(f"[INFO] Flujo grabado: {len(flujo):,} bytes")
+    else:
+        flujo, lineas, esperado = generar_flujo(args.seconds, args.wind_hz)
+        print(f"[INFO] Bus sintético de {args.seconds:g} s: {len(flujo):,} bytes, {len(lineas):,} mensajes")
+        print("[OK] Valores decodificados correctos" if verificar(flujo, esperado)
+              else "[WARN] Los valores decodificados no coinciden")
+
+    dt, tramas, n_viento = medir_nativo(flujo)
+    print(f"[nativo]   {tramas:,} tramas ({n_viento:,} de viento) en {dt * 1e3:.1f} ms -> "
+          f"{tramas / dt:,.0f} tramas/s, {len(flujo) / dt / 1e6:.1f} MB/s")
+
+    dt_disp, st, resumen = medir_dispatch(flujo)
+    print(f"[dispatch] {st['frames']:,} tramas, {st['matched']:,} despachadas en {dt_disp * 1e3:.1f} ms "
+          f"-> {st['frames'] / dt_disp:,.0f} tramas/s")
+    for pgn, r in resumen.items():
+        print(f"           {pgn:6d} {r['name']:38s} {r['count']:7,} msgs  {r['mean_us']} µs/msg")
+
+    if lineas is not None:
+        dt_old, n_lineas, n_viento_old = medir_analyzer(lineas)
+        print(f"[analyzer] {n_lineas:,} líneas JSON ({n_viento_old:,} de viento) en {dt_old * 1e3:.1f} ms -> "
+              f"{n_lineas / dt_old:,.0f} líneas/s (solo la parte Python; sin contar los dos procesos)")
+        print(f"[OK] Nativo x{dt_old / dt:.1f} más rápido en el lado Python")
+
+
+if __name__ == "__main__":
+    main()
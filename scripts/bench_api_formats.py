@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+bench_api_formats.py
+
+Tamaño de respuesta y CPU del servidor por petición de /api/telemetry en
+sus tres formatos (rows, columnar, f32), con N filas crudas de
+telemetry_samples servidas enteras (max_points >= N):
+
+  - bytes sin comprimir y con gzip (lo que viaja por el enlace 4G)
+  - CPU del proceso por petición (time.process_time, sin caché) y el
+    reparto sql / downsample / encode que da Server-Timing
+
+Comprueba además que columnar y f32 llevan los mismos valores que rows.
+Todo se hace en un directorio temporal.
+
+Uso (desde la raíz del proyecto):
+
+    python scripts/bench_api_formats.py
+    python scripts/bench_api_formats.py --rows 100000 --repeat 5
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from storage import shards
+# El mismo módulo que usa flask_dashboard: así DB_PATH apunta al temporal
+from scripts import build_telemetry_table as builder
+from scripts import flask_dashboard
+
+
+# ----------------------------------------------------------
+# DATOS SINTÉTICOS
+# ----------------------------------------------------------
+
+def crear_muestras(n, hz=5.0):
+    """n filas de telemetry_samples acabando ahora, a 'hz' filas/s."""
+    now = time.time()
+    ts = now - n / hz + np.arange(n) / hz
+    i = np.arange(n)
+    filas = list(zip(
+        ts.tolist(), [""] * n,
+        (40.4167 + i * 1e-7).tolist(), (-3.7033 - i * 1e-7).tolist(), [1.5] * n,
+        (5 + np.sin(i / 300)).tolist(), ((i / 50) % 360).tolist(),
+        (4 + np.sin(i / 700) / 2).tolist(), (8 + np.sin(i / 700)).tolist(), ((350 + i / 20) % 360).tolist(), [0.0] * n,
+        [None if k % 9 == 0 else v for k, v in enumerate((5 * np.sin(i / 40)).tolist())],
+        (np.cos(i / 30)).tolist(), ((i / 50) % 360).tolist(),
+    ))
+    for start, grupo in group_by_shard(filas):
+        conn = builder.shard_connection(start)
+        conn.executemany(
+            "INSERT OR REPLACE INTO telemetry_samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);", grupo
+        )
+        conn.commit()
+
+
+def group_by_shard(filas):
+    grupos = {}
+    for fila in filas:
+        grupos.setdefault(shards.shard_start(fila[0]), []).append(fila)
+    return grupos.items()
+
+
+# ----------------------------------------------------------
+# MEDIDAS
+# ----------------------------------------------------------
+
+def medir(client, url, repeat):
+    """(respuesta, CPU media en ms, Server-Timing de la última) sin pasar por la caché."""
+    cpu = []
+    for _ in range(repeat):
+        flask_dashboard.cache.entries.clear()
+        flask_dashboard.cache.size = 0
+        t0 = time.process_time()
+        resp = client.get(url)
+        cpu.append(time.process_time() - t0)
+    return resp, sum(cpu) / len(cpu) * 1000, resp.headers.get("Server-Timing", "")
+
+
+def decode_f32(data):
+    header_len = int.from_bytes(data[:4], "little")
+    header = json.loads(data[4:4 + header_len])
+    n = header["n"]
+    values = np.frombuffer(data, dtype="<f4", offset=4 + header_len).reshape(len(header["fields"]), n)
+    cols = {name: values[i].astype(float) for i, name in enumerate(header["fields"])}
+    cols["timestamp_utc"] = cols["timestamp_utc"] + header["t0"]
+    return cols
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tamaño y CPU de /api/telemetry por formato.")
+    parser.add_argument("--rows", type=int, default=100000, help="filas de telemetry_samples")
+    parser.add_argument("--repeat", type=int, default=3, help="peticiones por formato")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shards.SHARD_DIR = os.path.join(tmp, "shards")
+        os.makedirs(shards.SHARD_DIR)
+        builder.DB_PATH = os.path.join(tmp, "telemetria.db")
+
+        print(f"[INFO] Creando {args.rows:,} filas en telemetry_samples...")
+        crear_muestras(args.rows)
+
+        client = flask_dashboard.app.test_client()
+        url = f"/api/telemetry?max_points={args.rows * 2}"
+        resultados = {}
+        for fmt in ("rows", "columnar", "f32"):
+            resp, cpu_ms, timing = medir(client, f"{url}&format={fmt}", args.repeat)
+            data = resp.data
+            gz = len(gzip.compress(data, flask_dashboard.GZIP_LEVEL))
+            resultados[fmt] = data
+            print(f"[{fmt:8s}] {len(data) / 1e6:7.2f} MB  gzip {gz / 1e6:6.2f} MB  "
+                  f"CPU {cpu_ms:7.1f} ms/petición  ({timing})")
+
+        # Mismos valores en los tres formatos
+        rows = json.loads(resultados["rows"])
+        columnar = json.loads(resultados["columnar"])["columns"]
+        f32 = decode_f32(resultados["f32"])
+        ok = len(rows) == args.rows
+        for campo in ("timestamp_utc", "wind_speed_kn", "roll_deg", "lat_deg"):
+            ref = np.array([r[campo] for r in rows], dtype=float)
+            ok = ok and np.array_equal(ref, np.array(columnar[campo], dtype=float), equal_nan=True)
+            tol = 1e-3 if campo == "timestamp_utc" else 1e-5 * max(1.0, np.nanmax(np.abs(ref)))
+            ok = ok and bool(np.all((np.abs(f32[campo] - ref) <= tol) | (np.isnan(ref) & np.isnan(f32[campo]))))
+        print("[OK] Los tres formatos llevan los mismos valores" if ok
+              else "[WARN] Los formatos no coinciden")
+
+
+if __name__ == "__main__":
+    main()
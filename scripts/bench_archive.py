@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+bench_archive.py
+
+Mide el archivo frío de storage/archive.py con las muestras reales de
+outputs/*_samples_last50.csv:
+
+  - ratio de compresión: tamaño del shard (tras VACUUM) con las filas
+    calientes frente al mismo shard con las muestras compactadas en bloques
+  - velocidad de lectura de rango (filas/s) con read_samples antes y después
+  - que la lectura de los bloques devuelve exactamente las mismas filas
+
+50 filas por tabla son muy pocas para un bloque de un minuto, así que con
+--hours > 0 se genera además una serie más larga repitiendo en bucle los
+valores del CSV con su intervalo mediano de muestreo.
+
+Uso (desde la raíz del proyecto):
+
+    python scripts/bench_archive.py --hours 6
+"""
+
+import os
+import sys
+import csv
+import time
+import argparse
+import tempfile
+import statistics
+from itertools import groupby
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import shards, archive
+
+OUTPUTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "outputs")
+
+
+def leer_csv(table):
+    """Filas del CSV de 'table' como (columnas, filas) sin la columna id."""
+    path = os.path.join(OUTPUTS_DIR, f"{table}_last50.csv")
+    if not os.path.exists(path):
+        return None, []
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        filas = []
+        for fila in reader:
+            valores = []
+            for col, v in zip(header, fila):
+                if col == "timestamp_text":
+                    valores.append(v)
+                else:
+                    valores.append(float(v) if v != "" else None)
+            filas.append(valores)
+    cols = header[1:]
+    filas = sorted((f[1:] for f in filas), key=lambda f: f[0])
+    return cols, filas
+
+
+def serie_larga(filas, horas):
+    """Repite en bucle los valores del CSV con su intervalo mediano, durante 'horas'."""
+    ts = [f[0] for f in filas]
+    paso = statistics.median(b - a for a, b in zip(ts, ts[1:]) if b > a)
+    n = int(horas * 3600 / paso)
+    t0 = ts[0] - horas * 3600
+    salida = []
+    for i in range(n):
+        fila = list(filas[i % len(filas)])
+        fila[0] = t0 + i * paso
+        fila[1] = time.strftime("%a %Y-%m-%d %H:%M:%S", time.localtime(fila[0]))
+        salida.append(fila)
+    return salida
+
+
+def insertar(table, cols, filas):
+    sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)});"
+    for inicio, grupo in groupby(filas, key=lambda fila: shards.shard_start(fila[0])):
+        conn = shards.get_shard_connection(inicio)
+        conn.executemany(sql, grupo)
+        conn.commit()
+
+
+def tamano_total():
+    """Bytes de todos los shards tras VACUUM."""
+    total = 0
+    for _, _, path in shards.list_shards():
+        conn = shards.get_connection(path)
+        conn.execute("VACUUM;")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+        total += os.path.getsize(path)
+    return total
+
+
+def mismas_filas(a, b):
+    """
+    Compara una fila caliente con la archivada: id no se conserva, el
+    timestamp se guarda con resolución de 1 µs y timestamp_text se regenera
+    (puede cambiar de segundo por ese redondeo).
+    """
+    return abs(a[1] - b[1]) < 1e-6 and a[3:] == b[3:]
+
+
+def leer_todo(table):
+    t0 = time.perf_counter()
+    filas = list(archive.read_samples(table))
+    return filas, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del archivo comprimido de muestras.")
+    parser.add_argument("--hours", type=float, default=6.0,
+                        help="horas de serie sintética a partir de los CSV (0 = solo los CSV)")
+    args = parser.parse_args()
+
+    datos = {}
+    for table in shards.SAMPLE_TABLES:
+        cols, filas = leer_csv(table)
+        if not filas:
+            print(f"[WARN] Sin CSV para {table}")
+            continue
+        datos[table] = (cols, filas)
+
+    escenarios = [("CSV (50 filas/tabla)", 0)]
+    if args.hours > 0:
+        escenarios.append((f"serie de {args.hours:g} h", args.hours))
+
+    for nombre, horas in escenarios:
+        with tempfile.TemporaryDirectory() as tmp:
+            shards.SHARD_DIR = os.path.join(tmp, "shards")
+            shards.LEGACY_DB_PATH = os.path.join(tmp, "legacy.db")
+            shards.SHARD_RETENTION_DAYS = None  # los CSV son "antiguos"
+            shards._initialized.clear()
+
+            n_filas = 0
+            for table, (cols, filas) in datos.items():
+                serie = serie_larga(filas, horas) if horas else filas
+                insertar(table, cols, serie)
+                n_filas += len(serie)
+
+            print(f"\n=== {nombre}: {n_filas:,} muestras ===")
+            antes_bytes = tamano_total()
+            antes = {}
+            for table in datos:
+                filas, dt = leer_todo(table)
+                antes[table] = filas
+                print(f"[antes]   {table:18s} {len(filas):8,} filas en {dt * 1e3:8.1f} ms "
+                      f"({len(filas) / dt:,.0f} filas/s)")
+
+            t0 = time.perf_counter()
+            movidas = archive.compact(older_than_hours=0)
+            dt_compact = time.perf_counter() - t0
+            despues_bytes = tamano_total()
+            print(f"[INFO] Compactadas {movidas:,} muestras en {dt_compact:.2f} s")
+
+            for table in datos:
+                filas, dt = leer_todo(table)
+                iguales = len(filas) == len(antes[table]) and all(
+                    mismas_filas(a, b) for a, b in zip(antes[table], filas)
+                )
+                print(f"[después] {table:18s} {len(filas):8,} filas en {dt * 1e3:8.1f} ms "
+                      f"({len(filas) / dt:,.0f} filas/s) {'[OK]' if iguales else '[WARN] difieren'}")
+
+            print(f"[OK] Tamaño: {antes_bytes / 1e3:,.1f} kB -> {despues_bytes / 1e3:,.1f} kB "
+                  f"(x{antes_bytes / despues_bytes:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+bench_build_telemetry.py
+
+Mide build_telemetry_table con datos sintéticos: GPS a 10 Hz, actitud a
+RATIO veces esa frecuencia y viento a 10 Hz.
+
+Compara:
+  - "antes": dos consultas ABS() por fila GPS (full scan, O(N·M)), solo
+    sobre las primeras --old-rows filas GPS porque no escala
+  - "después": as-of join con searchsorted por bloques + executemany
+
+Los datos se reparten en shards por día en un directorio temporal.
+
+Uso (desde la raíz del proyecto):
+
+    python scripts/bench_build_telemetry.py --gps 1000000 --ratio 5
+"""
+
+import os
+import sys
+import math
+import time
+import argparse
+import tempfile
+from itertools import groupby
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import build_telemetry_table as builder
+from storage import shards
+
+GPS_HZ = 10.0
+T0 = 1763044000.0
+
+
+def insertar(sql, filas):
+    """Inserta 'filas' (ordenadas por tiempo) en el shard de cada una."""
+    for inicio, grupo in groupby(filas, key=lambda fila: shards.shard_start(fila[0])):
+        conn = shards.get_shard_connection(inicio)
+        conn.executemany(sql, grupo)
+        conn.commit()
+
+
+def poblar(n_gps, ratio):
+    """Inserta n_gps filas GPS, n_gps*ratio de actitud y n_gps de viento."""
+    insertar(
+        "INSERT INTO gps_samples (timestamp_utc, lat_deg, lon_deg, alt_msl_m, vel_m_s, hdg_deg) "
+        "VALUES (?, 37.6, -0.98, 20.0, ?, ?);",
+        ((T0 + i / GPS_HZ + 0.003, (i % 50) / 10, i % 360) for i in range(n_gps)),
+    )
+    att_hz = GPS_HZ * ratio
+    insertar(
+        "INSERT INTO attitude_samples (timestamp_utc, roll_rad, pitch_rad, yaw_rad) VALUES (?, ?, ?, ?);",
+        ((T0 + i / att_hz, math.sin(i / 100), 0.01, -0.89) for i in range(n_gps * ratio)),
+    )
+    insertar(
+        "INSERT INTO wind_samples (timestamp_utc, wind_speed_ms, wind_dir_deg, wind_vertical) VALUES (?, ?, ?, 0.0);",
+        ((T0 + i / GPS_HZ + 0.041, 5 + (i % 7), (i * 3) % 360) for i in range(n_gps)),
+    )
+
+
+def fetch_nearest_antiguo(cur, table, columns, ts):
+    """Réplica de fetch_nearest_attitude/fetch_nearest_wind originales."""
+    cur.execute(
+        f"""
+        SELECT {columns}
+        FROM {table}
+        WHERE ABS(timestamp_utc - ?) <= ?
+        ORDER BY ABS(timestamp_utc - ?) ASC
+        LIMIT 1;
+        """,
+        (ts, builder.MATCH_TOLERANCE, ts),
+    )
+    return cur.fetchone()
+
+
+def medir_antiguo(n_rows):
+    cur = shards.get_shard_connection(T0).cursor()
+    gps = cur.execute(
+        "SELECT timestamp_utc FROM gps_samples ORDER BY timestamp_utc LIMIT ?;", (n_rows,)
+    ).fetchall()
+    t0 = time.perf_counter()
+    for (ts,) in gps:
+        fetch_nearest_antiguo(cur, "attitude_samples", "roll_rad, pitch_rad, yaw_rad", ts)
+        fetch_nearest_antiguo(cur, "wind_samples", "wind_speed_ms, wind_dir_deg, wind_vertical", ts)
+    return (time.perf_counter() - t0) / len(gps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del as-of join de build_telemetry_table.")
+    parser.add_argument("--gps", type=int, default=1_000_000, help="filas GPS")
+    parser.add_argument("--ratio", type=int, default=5, help="filas de actitud por fila GPS")
+    parser.add_argument("--old-rows", type=int, default=20, help="filas GPS a medir con el método antiguo")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        builder.DB_PATH = os.path.join(tmp, "bench.db")
+        shards.SHARD_DIR = os.path.join(tmp, "shards")
+        shards.LEGACY_DB_PATH = builder.DB_PATH
+        shards.SHARD_RETENTION_DAYS = None  # los datos sintéticos son "antiguos"
+
+        t0 = time.perf_counter()
+        poblar(args.gps, args.ratio)
+        print(f"[INFO] {args.gps:,} GPS / {args.gps * args.ratio:,} actitud / {args.gps:,} viento "
+              f"generados en {time.perf_counter() - t0:.1f} s")
+
+        por_fila = medir_antiguo(args.old_rows)
+        print(f"[antes]   {por_fila * 1e3:.1f} ms por fila GPS -> estimado {por_fila * args.gps / 3600:.1f} h "
+              f"para {args.gps:,} filas")
+
+        t0 = time.perf_counter()
+        inserted = builder.rebuild_telemetry_table(full=True)
+        total = time.perf_counter() - t0
+        print(f"[después] {inserted:,} filas en {total:.1f} s -> {inserted / total:,.0f} filas/s")
+
+        sin_actitud, sin_viento = next(shards.query(
+            "SELECT SUM(roll_deg IS NULL), SUM(wind_speed_ms IS NULL) FROM telemetry_samples;",
+            tables=("telemetry_samples",),
+        ))
+        print(f"[OK] Filas sin actitud: {sin_actitud}, sin viento: {sin_viento} "
+              f"({len(shards.list_shards())} shards)")
+
+
+if __name__ == "__main__":
+    main()
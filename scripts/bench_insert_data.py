@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+bench_insert_data.py
+
+Mide el rendimiento de core.database.insert_data con la carga típica de
+la Pixhawk: ATTITUDE a 50 Hz + GLOBAL_POSITION_INT a 10 Hz.
+
+Compara:
+  - "antes": una conexión + INSERT + commit + close por mensaje
+  - "después": encolado no bloqueante + hilo escritor con commits por lotes
+
+Uso (desde la raíz del proyecto):
+
+    python scripts/bench_insert_data.py [segundos_simulados]
+"""
+
+import os
+import sys
+import time
+import math
+import sqlite3
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import core.database as database
+
+ATTITUDE_HZ = 50
+GPS_HZ = 10
+
+
+def generar_mensajes(segundos):
+    """Genera los diccionarios que produciría mavlink_loop en 'segundos'."""
+    mensajes = []
+    for i in range(segundos * ATTITUDE_HZ):
+        t = i / ATTITUDE_HZ
+        mensajes.append({
+            "roll": round(10 * math.sin(t), 1),
+            "pitch": round(2 * math.cos(t), 1),
+            "yaw": round((t * 3) % 360, 1),
+        })
+        if i % (ATTITUDE_HZ // GPS_HZ) == 0:
+            mensajes.append({
+                "lat": 37.6042 + t * 1e-6,
+                "lon": -0.9824 - t * 1e-6,
+                "alt": 20.4,
+            })
+    return mensajes
+
+
+def insert_data_antiguo(data_dict):
+    """Réplica del insert_data original: conexión y commit por mensaje."""
+    conn = sqlite3.connect(database.DB_PATH, check_same_thread=False)
+    cursor = conn.cursor()
+    columns = ', '.join(data_dict.keys())
+    placeholders = ':' + ', :'.join(data_dict.keys())
+    sql = f'INSERT INTO telemetria ({columns}) VALUES ({placeholders})'
+    cursor.execute(sql, data_dict)
+    conn.commit()
+    conn.close()
+
+
+def contar_filas():
+    conn = sqlite3.connect(database.DB_PATH)
+    n = conn.execute("SELECT COUNT(*) FROM telemetria").fetchone()[0]
+    conn.close()
+    return n
+
+
+def medir(nombre, funcion, mensajes, al_final=None):
+    t0 = time.perf_counter()
+    peor = 0.0
+    for m in mensajes:
+        t_llamada = time.perf_counter()
+        funcion(m)
+        peor = max(peor, time.perf_counter() - t_llamada)
+    t_llamadas = time.perf_counter() - t0
+    if al_final:
+        al_final()
+    t_total = time.perf_counter() - t0
+
+    n = len(mensajes)
+    print(f"[{nombre}] {n} filas en {t_total:.3f} s -> {n / t_total:,.0f} filas/s "
+          f"(llamada media {t_llamadas / n * 1e6:.1f} us, peor {peor * 1e3:.2f} ms)")
+
+
+def main():
+    segundos = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    mensajes = generar_mensajes(segundos)
+    print(f"[INFO] {segundos} s simulados a {ATTITUDE_HZ} Hz ATTITUDE + {GPS_HZ} Hz GPS "
+          f"= {len(mensajes)} mensajes")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "antes.db")
+        database.init_db()
+        medir("antes", insert_data_antiguo, mensajes)
+        print(f"[OK] Filas en DB: {contar_filas()}")
+
+        database.DB_PATH = os.path.join(tmp, "despues.db")
+        database.init_db()
+        database.start_writer()
+        medir("después", database.insert_data, mensajes, al_final=database.flush_and_stop)
+        print(f"[OK] Filas en DB: {contar_filas()} (commits: {database.stats['commits']})")
+
+
+if __name__ == "__main__":
+    main()
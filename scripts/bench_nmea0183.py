@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+bench_nmea0183.py
+
+Microbenchmark del codificador NMEA 0183 (core/nmea0183.py) frente al
+constructor MWV que estaba copiado en wind_manager y los scripts (checksum
+con ord() por carácter sobre str, f-string por frase y encode()):
+
+  1. MWV frase a frase: antiguo (str -> bytes) frente a nmea0183.mwv()
+  2. MWV en lote: nmea0183.mwv_batch() y encode_batch(mwv, ...)
+  3. MWD, HDG, VHW y RMC frase a frase
+
+Comprueba además que las MWV salen byte a byte iguales que con el
+constructor antiguo y que todos los checksums son correctos.
+
+Uso (desde la raíz del proyecto):
+
+    python scripts/bench_nmea0183.py
+    python scripts/bench_nmea0183.py --samples 200000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import nmea0183
+
+
+# ----------------------------------------------------------
+# CONSTRUCTOR ANTIGUO (referencia)
+# ----------------------------------------------------------
+
+def nmea_checksum_antiguo(sentence):
+    c = 0
+    for ch in sentence:
+        c ^= ord(ch)
+    return "{:02X}".format(c)
+
+
+def mwv_antiguo(wind_dir_deg, wind_speed_knots):
+    body = f"WIMWV,{wind_dir_deg:.1f},R,{wind_speed_knots:.1f},N,A"
+    return f"${body}*{nmea_checksum_antiguo(body)}\r\n".encode("ascii")
+
+
+# ----------------------------------------------------------
+# MEDIDAS
+# ----------------------------------------------------------
+
+def medir(nombre, fn, n, base=None):
+    t0 = time.perf_counter()
+    fn()
+    us = (time.perf_counter() - t0) / n * 1e6
+    extra = f" (x{base / us:.1f})" if base else ""
+    print(f"[{nombre:28s}] {us:6.2f} µs/frase{extra}")
+    return us
+
+
+def checksum_ok(buffer):
+    for linea in buffer.split(b"\r\n")[:-1]:
+        cuerpo, cs = linea[1:].split(b"*")
+        if int(cs, 16) != nmea0183.checksum(cuerpo):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark del codificador NMEA 0183.")
+    parser.add_argument("--samples", type=int, default=100000, help="frases por prueba")
+    args = parser.parse_args()
+    n = args.samples
+
+    rng = random.Random(1)
+    viento = [(rng.uniform(0, 360), rng.uniform(0, 40)) for _ in range(n)]
+    print(f"[INFO] {n:,} muestras por prueba")
+
+    # 1. MWV frase a frase
+    antiguo = []
+    nuevo = []
+    base = medir("MWV antiguo (str)", lambda: [antiguo.append(mwv_antiguo(a, v)) for a, v in viento], n)
+    medir("MWV nmea0183.mwv", lambda: [nuevo.append(nmea0183.mwv(a, v)) for a, v in viento], n, base)
+
+    # 2. Lotes
+    lote = [b""]
+    medir("MWV mwv_batch", lambda: lote.__setitem__(0, nmea0183.mwv_batch(viento)), n, base)
+    medir("MWV encode_batch(mwv)", lambda: nmea0183.encode_batch(nmea0183.mwv, viento), n, base)
+
+    iguales = b"".join(antiguo) == b"".join(nuevo) == lote[0]
+    print("[OK] MWV idénticas byte a byte al constructor antiguo" if iguales
+          else "[WARN] Las MWV difieren del constructor antiguo")
+
+    # 3. Resto de frases
+    rumbo = [(rng.uniform(0, 360), rng.uniform(-3, 3), rng.uniform(-5, 5)) for _ in range(n)]
+    buffers = {
+        "MWD": lambda: nmea0183.encode_batch(nmea0183.mwd, [(a, a - 2.0, v) for a, v in viento]),
+        "HDG": lambda: nmea0183.encode_batch(nmea0183.hdg, rumbo),
+        "VHW": lambda: nmea0183.encode_batch(nmea0183.vhw, [(h, h - 1.5, v / 5) for h, _, v in rumbo]),
+        "RMC": lambda: nmea0183.encode_batch(nmea0183.rmc, [
+            (1763550000 + i * 0.2, 40.4 + a / 1e4, -3.7 - v / 1e4, v / 4, a) for i, (a, v) in enumerate(viento)]),
+    }
+    ok = checksum_ok(lote[0])
+    for nombre, fn in buffers.items():
+        medir(f"{nombre} encode_batch", fn, n)
+        ok = ok and checksum_ok(fn())
+    print("[OK] Checksums correctos en todas las frases" if ok else "[WARN] Hay checksums incorrectos")
+
+
+if __name__ == "__main__":
+    main()
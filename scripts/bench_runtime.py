@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+bench_runtime.py
+
+Compara el modo "threads" (un hilo por sensor, main.start_threads) con el
+modo "asyncio" (core/async_runtime.py) bajo la misma carga simulada:
+
+  - NGT-1 por un pseudoterminal: tramas NMEA2000 a --hz mensajes/s
+    (viento, rumbo, posición, COG/SOG, velocidad, ambiente y PGN sin manejador)
+  - Pixhawk por UDP: MAVLink a --hz mensajes/s (ATTITUDE, GLOBAL_POSITION_INT,
+    SERVO_OUTPUT_RAW) más un HEARTBEAT por segundo
+  - la salida MWV va a otro pseudoterminal, donde se cuentan las sentencias
+
+Cada modo corre en un proceso hijo (base de datos y shards en un directorio
+temporal, sin buffer en vivo ni archivo). Tras --warmup segundos se mide
+durante --seconds: CPU (usuario + sistema) y cambios de contexto
+voluntarios por segundo, que es lo que cuesta cada despertar del proceso.
+
+Uso (desde la raíz del proyecto):
+
+    python scripts/bench_runtime.py
+    python scripts/bench_runtime.py --hz 100 --seconds 30 --json runtime.json
+"""
+
+import os
+import sys
+import tty
+import json
+import time
+import socket
+import random
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+MODOS = ("threads", "asyncio")
+
+# Ciclo de PGN del bus simulado (se repite a --hz mensajes/s)
+CICLO_N2K = (130306, 127250, 129025, 127257, 130306, 127250, 129025, 129026, 128259, 130311)
+# Ciclo de mensajes MAVLink
+CICLO_MAVLINK = ("ATTITUDE", "ATTITUDE", "GLOBAL_POSITION_INT", "SERVO_OUTPUT_RAW")
+
+
+# ----------------------------------------------------------
+# PROCESO HIJO (el sistema bajo prueba)
+# ----------------------------------------------------------
+
+def uso():
+    r = resource.getrusage(resource.RUSAGE_SELF)
+    return time.monotonic(), r.ru_utime + r.ru_stime, r.ru_nvcsw, r.ru_nivcsw
+
+
+def resultado(inicio, fin, n2k_inicio, n2k_fin, filas_inicio, filas_fin, hilos):
+    t0, cpu0, vol0, invol0 = inicio
+    t1, cpu1, vol1, invol1 = fin
+    wall = t1 - t0
+    return {
+        "wall_s": round(wall, 2),
+        "cpu_pct": round((cpu1 - cpu0) / wall * 100, 2),
+        "wakeups_per_s": round((vol1 - vol0) / wall, 1),
+        "involuntary_per_s": round((invol1 - invol0) / wall, 1),
+        "n2k_per_s": round((n2k_fin - n2k_inicio) / wall, 1),
+        "db_rows_per_s": round((filas_fin - filas_inicio) / wall, 1),
+        "threads": hilos,
+    }
+
+
+def hijo(args):
+    import logging
+    import asyncio
+    import main as sailbridge
+    from core import database, wind_manager, mavlink_manager, async_runtime, n2k_dispatch, latency, supervisor
+    from storage import db as storage_db, shards
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    for modulo in (wind_manager, async_runtime):
+        modulo.PORT_WIND_IN = args.n2k_port
+        modulo.PORT_WIND_OUT = args.out_port
+        # No matar procesos del sistema real si lo hay
+        modulo.limpiar_procesos = lambda: None
+    mavlink_manager.PORT_MAVLINK = async_runtime.PORT_MAVLINK = args.mavlink
+
+    database.DB_PATH = os.path.join(args.tmp, "telemetria_core.db")
+    storage_db.DB_PATH = shards.LEGACY_DB_PATH = os.path.join(args.tmp, "telemetria.db")
+    shards.SHARD_DIR = os.path.join(args.tmp, "shards")
+    latency.LATENCY_METRICS_PATH = os.path.join(args.tmp, "latency.json")
+    supervisor.SUPERVISOR_METRICS_PATH = os.path.join(args.tmp, "supervisor.json")
+    database.init_db()
+
+    def n2k():
+        return sum(s["count"] for s in n2k_dispatch.stats.values())
+
+    if args.child == "threads":
+        sailbridge.start_threads(archive=False)
+        time.sleep(args.warmup)
+        inicio, n0, f0 = uso(), n2k(), database.stats["written"]
+        time.sleep(args.seconds)
+        fin, n1, f1 = uso(), n2k(), database.stats["written"]
+        r = resultado(inicio, fin, n0, n1, f0, f1, threading.active_count())
+    else:
+        async def medir():
+            stop = asyncio.Event()
+            tarea = asyncio.create_task(async_runtime.run(stop, archive_enabled=False))
+            await asyncio.sleep(args.warmup)
+            inicio, n0, f0 = uso(), n2k(), database.stats["written"]
+            await asyncio.sleep(args.seconds)
+            fin, n1, f1 = uso(), n2k(), database.stats["written"]
+            stop.set()
+            await tarea
+            return resultado(inicio, fin, n0, n1, f0, f1, threading.active_count())
+        r = asyncio.run(medir())
+
+    print("RESULT " + json.dumps(r), flush=True)
+    os._exit(0)
+
+
+# ----------------------------------------------------------
+# CARGA SIMULADA (proceso padre)
+# ----------------------------------------------------------
+
+def trama_n2k(pgn, i, rng):
+    from core import actisense
+
+    if pgn == 130306:
+        speed = round(rng.uniform(3, 12) / 0.01)
+        angle = round(rng.uniform(0, 6.28) / 0.0001)
+        data = bytes([i & 0xFF]) + speed.to_bytes(2, "little") + angle.to_bytes(2, "little") + b"\xfa\xff\xff"
+    else:
+        data = bytes(rng.randrange(255) for _ in range(8))
+    return actisense.encode_n2k(pgn, data, src=35, timestamp_ms=i * 10)
+
+
+def enviar_mavlink(conn, tipo, i):
+    t_ms = i * 10
+    if tipo == "ATTITUDE":
+        conn.mav.attitude_send(t_ms, 0.1, -0.05, 1.2, 0.0, 0.0, 0.0)
+    elif tipo == "GLOBAL_POSITION_INT":
+        conn.mav.global_position_int_send(t_ms, 404167000, -37033000, 5000, 1000, 0, 0, 0, 9000)
+    else:
+        conn.mav.servo_output_raw_send(t_ms * 1000, 0, 1500, 1500, 1400, 1500, 0, 0, 0, 0)
+
+
+def cargar(hz, parar, n2k_fd, mav_puerto):
+    """Hilo del padre: envía una trama NMEA2000 y un mensaje MAVLink cada 1/hz s."""
+    from pymavlink import mavutil
+
+    rng = random.Random(1)
+    mav = mavutil.mavlink_connection(f"udpout:127.0.0.1:{mav_puerto}", source_system=1)
+    periodo = 1.0 / hz
+    siguiente = time.monotonic()
+    i = 0
+    while not parar.is_set():
+        os.write(n2k_fd, trama_n2k(CICLO_N2K[i % len(CICLO_N2K)], i, rng))
+        enviar_mavlink(mav, CICLO_MAVLINK[i % len(CICLO_MAVLINK)], i)
+        if i % int(hz) == 0:
+            mav.mav.heartbeat_send(1, 3, 0, 0, 4)
+        i += 1
+        siguiente += periodo
+        espera = siguiente - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+    mav.close()
+
+
+def contar_mwv(fd, contador, parar):
+    """Hilo del padre: vacía la salida MWV del hijo y cuenta las sentencias."""
+    while not parar.is_set():
+        try:
+            contador[0] += os.read(fd, 4096).count(b"$WIMWV")
+        except OSError:
+            break
+
+
+def pty():
+    maestro, esclavo = os.openpty()
+    tty.setraw(esclavo)
+    return maestro, esclavo, os.ttyname(esclavo)
+
+
+def puerto_libre():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def medir_modo(modo, args):
+    n2k_maestro, n2k_esclavo, n2k_nombre = pty()
+    out_maestro, out_esclavo, out_nombre = pty()
+    mav_puerto = puerto_libre()
+    parar = threading.Event()
+    mwv = [0]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        hijo_p = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--child", modo,
+             "--n2k-port", n2k_nombre, "--out-port", out_nombre,
+             "--mavlink", f"udpin:127.0.0.1:{mav_puerto}", "--tmp", tmp,
+             "--warmup", str(args.warmup), "--seconds", str(args.seconds)],
+            stdout=subprocess.PIPE, text=True,
+        )
+        hilos = [
+            threading.Thread(target=cargar, args=(args.hz, parar, n2k_maestro, mav_puerto), daemon=True),
+            threading.Thread(target=contar_mwv, args=(out_maestro, mwv, parar), daemon=True),
+        ]
+        for h in hilos:
+            h.start()
+
+        salida, _ = hijo_p.communicate(timeout=args.warmup + args.seconds + 60)
+        parar.set()
+        for fd in (n2k_maestro, n2k_esclavo, out_maestro, out_esclavo):
+            os.close(fd)
+
+    lineas = [l for l in salida.splitlines() if l.startswith("RESULT ")]
+    if not lineas:
+        print(f"[WARN] El modo {modo} no devolvió resultados (código {hijo_p.returncode})")
+        return None
+    r = json.loads(lineas[-1][len("RESULT "):])
+    r["mwv_sent"] = mwv[0]
+    return r
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Modo threads frente a modo asyncio con carga simulada.")
+    parser.add_argument("--hz", type=float, default=100, help="mensajes/s de cada fuente (NMEA2000 y MAVLink)")
+    parser.add_argument("--warmup", type=float, default=4, help="segundos antes de medir (arranque y conexión)")
+    parser.add_argument("--seconds", type=float, default=20, help="segundos medidos")
+    parser.add_argument("--json", help="guardar los resultados en este fichero")
+    parser.add_argument("--child", choices=MODOS, help=argparse.SUPPRESS)
+    parser.add_argument("--n2k-port", help=argparse.SUPPRESS)
+    parser.add_argument("--out-port", help=argparse.SUPPRESS)
+    parser.add_argument("--mavlink", help=argparse.SUPPRESS)
+    parser.add_argument("--tmp", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        hijo(args)
+        return
+
+    print(f"[INFO] Carga: {args.hz:g} tramas NMEA2000/s + {args.hz:g} mensajes MAVLink/s, "
+          f"{args.seconds:g} s medidos tras {args.warmup:g} s")
+    resultados = {}
+    for modo in MODOS:
+        r = medir_modo(modo, args)
+        if r is None:
+            continue
+        resultados[modo] = r
+        print(f"[{modo:7s}] CPU {r['cpu_pct']:5.1f}%  despertares {r['wakeups_per_s']:7.1f}/s  "
+              f"(involuntarios {r['involuntary_per_s']:.1f}/s)  hilos {r['threads']}  "
+              f"N2K {r['n2k_per_s']:.0f}/s  filas DB {r['db_rows_per_s']:.1f}/s  MWV {r['mwv_sent']}")
+
+    if len(resultados) == 2:
+        t, a = resultados["threads"], resultados["asyncio"]
+        print(f"[OK] asyncio: CPU x{a['cpu_pct'] / t['cpu_pct']:.2f}, "
+              f"despertares x{a['wakeups_per_s'] / t['wakeups_per_s']:.2f} respecto a threads")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": resultados}, f, indent=2)
+        print(f"[OK] Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
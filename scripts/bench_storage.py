@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+bench_storage.py
+
+Banco de pruebas de todas las rutas de escritura y lectura de la base de
+datos, con telemetría sintética a frecuencias y horas de historia
+configurables (de 1 h a 30 días).
+
+Fases:
+  1. core.database.insert_data (cola + hilo escritor): filas/s y
+     latencia de commit p50/p99
+  2. storage/db.insert_* (gps/actitud/imu/viento, commit por llamada):
+     llamadas/s y latencia p50/p99
+  3. historia sintética en los shards y en 'telemetria': tamaño de BD por hora
+  4. build_telemetry_table --full: filas/s
+  5. consultas de los dashboards ("últimas 50", "última 1 h", "últimas
+     24 h" de ui/dashboard.py, scripts/dashboard.py y flask_dashboard.py):
+     latencia p50/p99
+
+Todo se hace en un directorio temporal y el resultado se guarda en JSON
+para comparar ejecuciones.
+
+Uso (desde la raíz del proyecto):
+
+    python scripts/bench_storage.py --hours 24
+    python scripts/bench_storage.py --hours 720 --att-hz 5 --wind-hz 1 --json resultados.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import types
+import sqlite3
+import platform
+import argparse
+import tempfile
+import subprocess
+from itertools import groupby
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import core.database as database
+import storage.db as storage_db
+from core.live_buffer import LiveBufferWriter, LiveBufferReader
+from storage import shards, archive
+import build_telemetry_table as builder
+import flask_dashboard
+
+
+# ----------------------------------------------------------
+# UTILIDADES
+# ----------------------------------------------------------
+
+def percentiles(valores_s):
+    """p50/p99/máx en milisegundos de una lista de duraciones en segundos."""
+    if not valores_s:
+        return {"n": 0}
+    v = np.asarray(valores_s) * 1e3
+    return {
+        "n": int(v.size),
+        "p50_ms": round(float(np.percentile(v, 50)), 3),
+        "p99_ms": round(float(np.percentile(v, 99)), 3),
+        "max_ms": round(float(v.max()), 3),
+    }
+
+
+def tamano_ficheros(rutas):
+    """Bytes de las BD (tras checkpoint del WAL)."""
+    total = 0
+    for ruta in rutas:
+        if not os.path.exists(ruta):
+            continue
+        database.get_connection(ruta).execute("PRAGMA wal_checkpoint(TRUNCATE);")
+        total += os.path.getsize(ruta)
+    return total
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def insertar_por_shard(sql, filas):
+    """Inserta 'filas' (ordenadas por tiempo) en el shard de cada una."""
+    n = 0
+    for inicio, grupo in groupby(filas, key=lambda fila: shards.shard_start(fila[0])):
+        grupo = list(grupo)
+        conn = shards.get_shard_connection(inicio)
+        with conn:
+            conn.executemany(sql, grupo)
+        n += len(grupo)
+    return n
+
+
+def texto(ts):
+    return time.strftime("%a %Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+def marca_telemetria(ts):
+    # Mismo formato que state_manager.snapshot()
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts)) + f".{int(ts * 1000) % 1000:03d}"
+
+
+def medir(funcion, repeticiones):
+    """Ejecuta 'funcion' varias veces; devuelve percentiles y filas de la última."""
+    tiempos = []
+    filas = 0
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        filas = funcion()
+        tiempos.append(time.perf_counter() - t0)
+    res = percentiles(tiempos)
+    res["rows"] = filas
+    return res
+
+
+# ----------------------------------------------------------
+# FASE 1: core.database.insert_data
+# ----------------------------------------------------------
+
+def fase_insert_data(n_filas):
+    database.commit_latencies.clear()
+    for k in database.stats:
+        database.stats[k] = 0
+    fila = {
+        "lat": 37.6042, "lon": -0.9824, "alt": 20.4,
+        "roll": 1.5, "pitch": 0.2, "yaw": 310.0,
+        "wind_angle": 45.0, "wind_speed": 9.5,
+        "servo_rudder": 1500, "servo_sail": 1400,
+        "age_gps": 0.1, "age_att": 0.02, "age_wind": 0.05, "age_servo": 0.2,
+        "timestamp": marca_telemetria(time.time()),
+    }
+
+    database.start_writer()
+    t0 = time.perf_counter()
+    for _ in range(n_filas):
+        while not database.insert_data(fila):
+            time.sleep(0.001)  # cola llena: esperamos al escritor
+    t_encolado = time.perf_counter() - t0
+    database.flush_and_stop(timeout=60)
+    total = time.perf_counter() - t0
+
+    res = {
+        "rows": n_filas,
+        "enqueue_us_per_row": round(t_encolado / n_filas * 1e6, 2),
+        "rows_per_s": round(database.stats["written"] / total),
+        "commits": database.stats["commits"],
+        "commit_latency": percentiles(list(database.commit_latencies)),
+    }
+    print(f"[insert_data] {res['rows_per_s']:,} filas/s, commit p50 {res['commit_latency'].get('p50_ms')} ms "
+          f"p99 {res['commit_latency'].get('p99_ms')} ms")
+    return res
+
+
+# ----------------------------------------------------------
+# FASE 2: storage/db.insert_*
+# ----------------------------------------------------------
+
+def mensajes_mavlink(i):
+    """Objetos con los atributos que leen las funciones insert_* de storage/db.py."""
+    gps = types.SimpleNamespace(
+        time_boot_ms=i * 100, lat=376042000 + i, lon=-9824000 - i, alt=20400,
+        relative_alt=20400, vx=150, vy=-80, hdg=30544,
+    )
+    att = types.SimpleNamespace(
+        time_boot_ms=i * 100, roll=0.02, pitch=-0.01, yaw=-0.89,
+        rollspeed=0.0, pitchspeed=0.0, yawspeed=0.0,
+    )
+    imu = types.SimpleNamespace(
+        time_usec=i * 100000, xacc=8, yacc=4, zacc=-1000, xgyro=0, ygyro=0, zgyro=0,
+    )
+    return gps, att, imu
+
+
+def fase_storage_db(n_llamadas):
+    conn = storage_db.get_db_connection()
+    storage_db.init_db(conn)
+    tiempos = {"insert_gps": [], "insert_attitude": [], "insert_imu": [], "insert_wind_NMEA": []}
+    for i in range(n_llamadas):
+        gps, att, imu = mensajes_mavlink(i)
+        for nombre, llamada in (
+            ("insert_gps", lambda: storage_db.insert_gps(conn, gps)),
+            ("insert_attitude", lambda: storage_db.insert_attitude(conn, att)),
+            ("insert_imu", lambda: storage_db.insert_imu(conn, imu)),
+            ("insert_wind_NMEA", lambda: storage_db.insert_wind_NMEA(conn, 4.9, 45.0)),
+        ):
+            t0 = time.perf_counter()
+            llamada()
+            tiempos[nombre].append(time.perf_counter() - t0)
+
+    res = {}
+    for nombre, t in tiempos.items():
+        res[nombre] = percentiles(t)
+        res[nombre]["calls_per_s"] = round(len(t) / sum(t))
+        print(f"[{nombre}] {res[nombre]['calls_per_s']:,} llamadas/s, p50 {res[nombre]['p50_ms']} ms "
+              f"p99 {res[nombre]['p99_ms']} ms")
+    return res
+
+
+# ----------------------------------------------------------
+# FASE 3: historia sintética
+# ----------------------------------------------------------
+
+def fase_historia(horas, tasas, t_fin):
+    t_ini = t_fin - horas * 3600
+    segundos = horas * 3600
+
+    def serie(hz, fila):
+        n = int(segundos * hz)
+        return (fila(t_ini + i / hz, i) for i in range(n))
+
+    t0 = time.perf_counter()
+    filas = {}
+    filas["gps_samples"] = insertar_por_shard(
+        "INSERT INTO gps_samples (timestamp_utc, timestamp_text, time_boot_s, lat_deg, lon_deg, alt_msl_m, "
+        "relative_alt_m, vel_m_s, hdg_deg) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);",
+        serie(tasas["gps"], lambda t, i: (
+            t, texto(t), i / tasas["gps"], 37.6 + math.sin(i / 5000) * 0.01, -0.98 + math.cos(i / 5000) * 0.01,
+            20.0, 20.0, 2.5 + math.sin(i / 300), (i * 0.1) % 360,
+        )),
+    )
+    filas["attitude_samples"] = insertar_por_shard(
+        "INSERT INTO attitude_samples (timestamp_utc, timestamp_text, time_boot_s, roll_rad, pitch_rad, yaw_rad, "
+        "rollspeed, pitchspeed, yawspeed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);",
+        serie(tasas["att"], lambda t, i: (
+            t, texto(t), i / tasas["att"], 0.2 * math.sin(i / 40), 0.02 * math.cos(i / 30), -0.89,
+            0.0, 0.0, 0.0,
+        )),
+    )
+    filas["imu_samples"] = insertar_por_shard(
+        "INSERT INTO imu_samples (timestamp_utc, timestamp_text, ax_mg, ay_mg, az_mg, gx_mrad_s, gy_mrad_s, "
+        "gz_mrad_s) VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+        serie(tasas["imu"], lambda t, i: (t, texto(t), 8.0, 4.0, -1000.0 + (i % 3), 0.0, 0.0, 0.0)),
+    )
+    filas["wind_samples"] = insertar_por_shard(
+        "INSERT INTO wind_samples (timestamp_utc, timestamp_text, wind_speed_ms, wind_dir_deg, wind_vertical) "
+        "VALUES (?, ?, ?, ?, 0.0);",
+        serie(tasas["wind"], lambda t, i: (t, texto(t), 5 + 2 * math.sin(i / 700), (45 + i * 0.01) % 360)),
+    )
+
+    conn = database.get_connection()
+    database.init_db()
+    with conn:
+        n = int(segundos * tasas["fused"])
+        conn.executemany(
+            "INSERT INTO telemetria (timestamp, lat, lon, alt, roll, pitch, yaw, wind_angle, wind_speed, "
+            "servo_rudder, servo_sail, age_gps, age_att, age_wind, age_servo) "
+            "VALUES (?, 37.6, -0.98, 20.0, ?, 0.5, 310.0, ?, 9.5, 1500, 1400, 0.1, 0.02, 0.05, 0.2);",
+            ((marca_telemetria(t_ini + i / tasas["fused"]), 10 * math.sin(i / 50), (i * 0.1) % 360)
+             for i in range(n)),
+        )
+    filas["telemetria"] = n
+    t_carga = time.perf_counter() - t0
+
+    rutas_shards = [p for _, _, p in shards.list_shards()]
+    bytes_shards = tamano_ficheros(rutas_shards)
+    bytes_telemetria = tamano_ficheros([database.DB_PATH])
+    res = {
+        "rows": filas,
+        "load_s": round(t_carga, 2),
+        "load_rows_per_s": round(sum(filas.values()) / t_carga),
+        "shards": len(rutas_shards),
+        "samples_bytes": bytes_shards,
+        "samples_mb_per_hour": round(bytes_shards / 1e6 / horas, 3),
+        "telemetria_bytes": bytes_telemetria,
+        "telemetria_mb_per_hour": round(bytes_telemetria / 1e6 / horas, 3),
+    }
+    print(f"[historia] {sum(filas.values()):,} filas en {t_carga:.1f} s; "
+          f"*_samples {res['samples_mb_per_hour']} MB/h, telemetria {res['telemetria_mb_per_hour']} MB/h")
+    return res
+
+
+# ----------------------------------------------------------
+# FASE 4: build_telemetry_table
+# ----------------------------------------------------------
+
+def fase_build():
+    t0 = time.perf_counter()
+    filas = builder.rebuild_telemetry_table(full=True)
+    total = time.perf_counter() - t0
+    rutas = [p for _, _, p in shards.list_shards()]
+    res = {
+        "rows": filas,
+        "seconds": round(total, 2),
+        "rows_per_s": round(filas / total) if total else None,
+        "bytes_after": tamano_ficheros(rutas),
+    }
+    print(f"[build_telemetry] {filas:,} filas en {total:.1f} s ({res['rows_per_s']:,} filas/s)")
+    return res
+
+
+# ----------------------------------------------------------
+# FASE 5: consultas de los dashboards
+# ----------------------------------------------------------
+
+def consultas(t_fin):
+    """Patrones de lectura tal y como los lanzan los dashboards."""
+    def ui_last50():
+        conn = database.get_connection()
+        return len(conn.execute("SELECT * FROM telemetria ORDER BY timestamp DESC LIMIT 50").fetchall())
+
+    def ui_live_last50():
+        lector = LiveBufferReader(ruta_live)
+        n = len(lector.columns(n=50)["t"])
+        lector.close()
+        return n
+
+    def streamlit_gps(horas):
+        sql = """
+            SELECT timestamp_utc, lat_deg, lon_deg, alt_msl_m, vel_m_s, hdg_deg
+            FROM gps_samples
+            ORDER BY timestamp_utc ASC;
+        """
+        return lambda: len(list(shards.query(sql, t_min=t_fin - horas * 3600, tables=("gps_samples",))))
+
+    def streamlit_viento(horas):
+        sql = """
+            SELECT timestamp_utc, wind_speed_ms, wind_dir_deg
+            FROM wind_samples
+            ORDER BY timestamp_utc ASC;
+        """
+        return lambda: len(list(shards.query(sql, t_min=t_fin - horas * 3600, tables=("wind_samples",))))
+
+    def flask_raw(horas):
+        return lambda: len(flask_dashboard.fetch_telemetry_samples(hours=horas))
+
+    def flask_rollups(horas):
+        return lambda: len(flask_dashboard.fetch_telemetry_rollups(hours=horas, points=500) or [])
+
+    def archive_1h():
+        return sum(1 for _ in archive.read_samples("wind_samples", t_min=t_fin - 3600, t_max=t_fin))
+
+    # Anillo en vivo con la capacidad por defecto lleno (lo que lee ui/dashboard.py)
+    ruta_live = os.path.join(os.path.dirname(database.DB_PATH), "live")
+    escritor = LiveBufferWriter(ruta_live)
+    for i in range(escritor.capacity):
+        escritor.publish({"lat": 37.6, "lon": -0.98, "roll": i % 30, "wind_angle": i % 360}, t=t_fin + i)
+
+    patrones = {
+        "ui_dashboard_last50_sql": ui_last50,
+        "ui_dashboard_last50_live": ui_live_last50,
+        "streamlit_gps_1h": streamlit_gps(1),
+        "streamlit_gps_24h": streamlit_gps(24),
+        "streamlit_wind_1h": streamlit_viento(1),
+        "streamlit_wind_24h": streamlit_viento(24),
+        "flask_telemetry_1h": flask_raw(1),
+        "flask_telemetry_24h": flask_raw(24),
+        "flask_telemetry_24h_points500": flask_rollups(24),
+        "archive_read_wind_1h": archive_1h,
+    }
+    return patrones, escritor
+
+
+def fase_consultas(t_fin, repeticiones):
+    patrones, escritor = consultas(t_fin)
+    res = {}
+    try:
+        for nombre, funcion in patrones.items():
+            res[nombre] = medir(funcion, repeticiones)
+            print(f"[consulta] {nombre:32s} {res[nombre]['rows']:8,} filas  "
+                  f"p50 {res[nombre]['p50_ms']:9.3f} ms  p99 {res[nombre]['p99_ms']:9.3f} ms")
+    finally:
+        escritor.close()
+    return res
+
+
+# ----------------------------------------------------------
+# PROGRAMA PRINCIPAL
+# ----------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escritura y lectura de la BD de telemetría.")
+    parser.add_argument("--hours", type=float, default=24.0, help="horas de historia sintética (1 a 720)")
+    parser.add_argument("--gps-hz", type=float, default=1.0, help="frecuencia de gps_samples")
+    parser.add_argument("--att-hz", type=float, default=10.0, help="frecuencia de attitude_samples")
+    parser.add_argument("--imu-hz", type=float, default=10.0, help="frecuencia de imu_samples")
+    parser.add_argument("--wind-hz", type=float, default=10.0, help="frecuencia de wind_samples")
+    parser.add_argument("--fused-hz", type=float, default=5.0, help="frecuencia de la tabla telemetria")
+    parser.add_argument("--insert-rows", type=int, default=50000, help="filas para la fase insert_data")
+    parser.add_argument("--insert-calls", type=int, default=500, help="llamadas por función insert_* de storage/db")
+    parser.add_argument("--repeat", type=int, default=20, help="repeticiones de cada consulta")
+    parser.add_argument("--json", help="fichero de resultados (por defecto outputs/bench_storage_<fecha>.json)")
+    args = parser.parse_args()
+
+    tasas = {"gps": args.gps_hz, "att": args.att_hz, "imu": args.imu_hz,
+             "wind": args.wind_hz, "fused": args.fused_hz}
+    resultados = {
+        "meta": {
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "telemetria_core.db")
+        storage_db.DB_PATH = builder.DB_PATH = os.path.join(tmp, "telemetria.db")
+        shards.LEGACY_DB_PATH = storage_db.DB_PATH
+        shards.SHARD_DIR = os.path.join(tmp, "shards")
+        shards.SHARD_RETENTION_DAYS = None  # la historia sintética es "antigua"
+        database.init_db()
+
+        print(f"[INFO] Directorio temporal: {tmp}")
+        resultados["insert_data"] = fase_insert_data(args.insert_rows)
+        resultados["storage_db_insert"] = fase_storage_db(args.insert_calls)
+
+        # La historia termina justo antes de las filas de la fase 2
+        t_fin = time.time() - 60
+        resultados["history"] = fase_historia(args.hours, tasas, t_fin)
+        resultados["build_telemetry"] = fase_build()
+        resultados["queries"] = fase_consultas(t_fin, args.repeat)
+        database.close_connections()
+
+    ruta = args.json or os.path.join(BASE_DIR, "outputs", f"bench_storage_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    with open(ruta, "w") as f:
+        json.dump(resultados, f, indent=2)
+    print(f"[OK] Resultados guardados en {ruta}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+bench_tlog.py
+
+Mide la grabación cruda MAVLink (storage/tlog.py) frente a guardar RAW_IMU
+en SQLite (imu_samples), con un flujo sintético como el de
+la Pixhawk: RAW_IMU a --imu-hz, ATTITUDE 10 Hz, GLOBAL_POSITION_INT 5 Hz y
+SERVO_OUTPUT_RAW 2 Hz, leído en trozos como los de pymavlink (cabecera y
+cuerpo por separado).
+
+  1. camino caliente: coste por mensaje de
+       - parse + imu_samples por la cola del escritor de DB, como sin tlog
+       - parse + copia al tlog
+       - solo la copia al tlog
+  2. --hours de historia en tlog: MB/h
+  3. decodificación bajo demanda: "ATTITUDE durante 1 minuto" en mitad de
+     la historia (usa el índice) y decodificación completa (mensajes/s),
+     comprobando que salen todos los mensajes con sus valores
+
+Todo se hace en un directorio temporal.
+
+Uso (desde la raíz del proyecto):
+
+    python scripts/bench_tlog.py
+    python scripts/bench_tlog.py --hours 4 --imu-hz 100
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pymavlink import mavutil
+
+from core import database
+from storage import db as storage_db, shards, tlog
+
+T0 = 1763550000.0
+
+
+# ----------------------------------------------------------
+# FLUJO SINTÉTICO
+# ----------------------------------------------------------
+
+def mensajes(segundos, imu_hz):
+    """(t, tipo, bytes del paquete) ordenados por tiempo de llegada."""
+    mav = mavutil.mavlink.MAVLink(None, srcSystem=1, srcComponent=1)
+    tasas = {"RAW_IMU": imu_hz, "ATTITUDE": 10, "GLOBAL_POSITION_INT": 5, "SERVO_OUTPUT_RAW": 2}
+    eventos = []
+    for tipo, hz in tasas.items():
+        eventos += [(i / hz, tipo, i) for i in range(int(segundos * hz))]
+    eventos.sort()
+
+    salida = []
+    for t, tipo, i in eventos:
+        ms = int(t * 1000)
+        if tipo == "RAW_IMU":
+            msg = mav.raw_imu_encode(ms * 1000, i % 1000, -i % 500, 1000, 1, 2, 3, 4, 5, 6)
+        elif tipo == "ATTITUDE":
+            msg = mav.attitude_encode(ms, 0.001 * (i % 100), -0.05, 1.2, 0.0, 0.0, 0.0)
+        elif tipo == "GLOBAL_POSITION_INT":
+            msg = mav.global_position_int_encode(ms, 404167000 + i, -37033000, 5000, 1000, 10, 0, 0, 9000)
+        else:
+            msg = mav.servo_output_raw_encode(ms * 1000, 0, 1500, 1500, 1400, 1500, 0, 0, 0, 0)
+        salida.append((T0 + t, tipo, msg.pack(mav)))
+    return salida
+
+
+def trozos(paquete):
+    """Como mavserial.recv(bytes_needed): primero la cabecera y después el resto."""
+    return paquete[:10], paquete[10:]
+
+
+# ----------------------------------------------------------
+# CAMINO CALIENTE
+# ----------------------------------------------------------
+
+def medir_sqlite(flujo):
+    """Coste en el bucle de lectura (encolar); el escritor hace los commits por lotes en su hilo."""
+    parser = mavutil.mavlink.MAVLink(None)
+    database.start_writer()
+    t0 = time.perf_counter()
+    for _, _, paquete in flujo:
+        for chunk in trozos(paquete):
+            for msg in parser.parse_buffer(chunk) or ():
+                if msg.get_type() == "RAW_IMU":
+                    database.insert_sample("imu_samples", storage_db.imu_row(msg))
+    us = (time.perf_counter() - t0) / len(flujo) * 1e6
+    database.flush_and_stop(timeout=60)
+    return us
+
+
+def medir_tlog(flujo, directorio, parsear=True):
+    parser = mavutil.mavlink.MAVLink(None)
+    rec = tlog.TlogRecorder(directorio)
+    t0 = time.perf_counter()
+    for t, _, paquete in flujo:
+        for chunk in trozos(paquete):
+            rec.write(chunk, t)
+            if parsear:
+                parser.parse_buffer(chunk)
+    rec.close()
+    return (time.perf_counter() - t0) / len(flujo) * 1e6, rec
+
+
+def tamano(directorio):
+    return sum(os.path.getsize(os.path.join(directorio, f)) for f in os.listdir(directorio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la grabación cruda MAVLink (tlog).")
+    parser.add_argument("--hours", type=float, default=1, help="horas de historia en tlog")
+    parser.add_argument("--imu-hz", type=float, default=100, help="frecuencia de RAW_IMU")
+    parser.add_argument("--sqlite-seconds", type=float, default=30, help="segundos de flujo para el camino con SQLite")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "telemetria_core.db")
+        storage_db.DB_PATH = shards.LEGACY_DB_PATH = os.path.join(tmp, "telemetria.db")
+        shards.SHARD_DIR = os.path.join(tmp, "shards")
+
+        # 1. Camino caliente
+        corto = mensajes(args.sqlite_seconds, args.imu_hz)
+        us_sqlite = medir_sqlite(corto)
+        us_tlog, _ = medir_tlog(corto, os.path.join(tmp, "tlog_corto"))
+        us_copia, _ = medir_tlog(corto, os.path.join(tmp, "tlog_copia"), parsear=False)
+        print(f"[INFO] Flujo: {len(corto) / args.sqlite_seconds:.0f} mensajes/s")
+        print(f"[caliente] parse + cola IMU:   {us_sqlite:6.1f} µs/mensaje")
+        print(f"[caliente] parse + copia tlog:  {us_tlog:6.1f} µs/mensaje (x{us_sqlite / us_tlog:.1f})")
+        print(f"[caliente] solo copia tlog:     {us_copia:6.2f} µs/mensaje")
+
+        # 2. Historia
+        segundos = args.hours * 3600
+        flujo = mensajes(segundos, args.imu_hz)
+        directorio = os.path.join(tmp, "tlog")
+        _, rec = medir_tlog(flujo, directorio, parsear=False)
+        mb = tamano(directorio) / 1e6
+        print(f"[historia] {len(flujo):,} mensajes en {args.hours:g} h -> {mb:.1f} MB "
+              f"({mb / args.hours:.1f} MB/h, {rec.stats['records']:,} registros)")
+
+        # 3. Decodificación bajo demanda
+        t1 = T0 + segundos / 2
+        t0 = time.perf_counter()
+        tabla = tlog.decode_table("ATTITUDE", t1, t1 + 60, directory=directorio)
+        dt_rango = time.perf_counter() - t0
+        esperados = sum(1 for t, tipo, _ in flujo if tipo == "ATTITUDE" and t1 <= t <= t1 + 60)
+        print(f"[rango]    ATTITUDE 1 min en mitad de la historia: {len(tabla['timestamp_utc'])} mensajes "
+              f"(esperados {esperados}) en {dt_rango * 1e3:.1f} ms")
+
+        t0 = time.perf_counter()
+        conteo = {}
+        ok = True
+        it = iter(flujo)
+        for t, msg in tlog.decode(directory=directorio):
+            tipo = msg.get_type()
+            conteo[tipo] = conteo.get(tipo, 0) + 1
+            t_esp, tipo_esp, paquete = next(it)
+            if tipo != tipo_esp or msg.get_msgbuf() != paquete or abs(t - t_esp) > tlog.RECORD_WINDOW:
+                ok = False
+        dt_todo = time.perf_counter() - t0
+        total = sum(conteo.values())
+        print(f"[completo] {total:,} mensajes decodificados en {dt_todo:.1f} s -> {total / dt_todo:,.0f} mensajes/s")
+        print("[OK] Todos los mensajes recuperados byte a byte" if ok and total == len(flujo)
+              else f"[WARN] Diferencias al decodificar ({total} de {len(flujo)})")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
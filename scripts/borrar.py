@@ -5,6 +5,11 @@ import math
 import time
 import logging
 import serial
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import nmea0183
 
 # ----------------------------------------------------------
 # CONFIGURACIÓN
@@ -33,21 +38,6 @@ PRINT_INTERVAL = 1.0       # segundos
 # FUNCIONES AUXILIARES
 # ----------------------------------------------------------
 
-def nmea_checksum(sentence):
-    """Calcula checksum NMEA (parte después del '$')."""
-    c = 0
-    for ch in sentence:
-        c ^= ord(ch)
-    return "{:02X}".format(c)
-
-
-def build_mwv_sentence(wind_dir_deg, wind_speed_knots):
-    """Construye frase MWV completa con *checksum*."""
-    body = f"WIMWV,{wind_dir_deg:.1f},R,{wind_speed_knots:.1f},N,A"
-    checksum = nmea_checksum(body)
-    return f"${body}*{checksum}"
-
-
 def print_wind_status():
     """Muestra estado cada 5 segundos."""
     if last_wind_dir is None or last_wind_speed is None:
@@ -128,8 +118,7 @@ def main():
                 last_wind_speed = wind_speed_knots
 
                 # Enviar MWV a Pixhawk
-                mwv = build_mwv_sentence(wind_dir_deg, wind_speed_knots)
-                ser.write(mwv.encode("ascii") + b"\r\n")
+                ser.write(nmea0183.mwv(wind_dir_deg, wind_speed_knots))
 
                 # Imprimir cada 5 s
                 now = time.time()
@@ -11,45 +11,79 @@ Cada fila de telemetry_samples corresponde a un timestamp de GPS, y se
 completa con los datos de actitud y viento más cercanos en el tiempo
 (dentro de una tolerancia).
 
+Junto a cada bloque se actualizan los agregados multi-resolución de
+telemetry_rollups (ver storage/rollups.py).
+
+Por defecto funciona en modo incremental: recuerda el último
+gps_samples.timestamp_utc procesado (marca de agua en telemetry_build_state)
+y solo une las filas GPS nuevas, volviendo a unir la ventana de tolerancia
+anterior a la marca por si llegaron actitud/viento tardíos.
+
 Uso (desde la raíz del proyecto velero_autonomo):
 
     source venv/bin/activate
-    python scripts/build_telemetry_table.py
+    python scripts/build_telemetry_table.py                # incremental
+    python scripts/build_telemetry_table.py --full         # desde cero
+    python scripts/build_telemetry_table.py --daemon -i 5  # cada 5 s
 """
 
+import sys
+import time
+import argparse
 import sqlite3
-import math
 from pathlib import Path
 from datetime import datetime
+from itertools import islice
+
+import numpy as np
+
+# Añadimos la carpeta raíz al path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from core.database import get_connection as get_shared_connection
+from storage import shards, rollups, archive
 
 # --------------------------------------------------------------------
 # CONFIGURACIÓN
 # --------------------------------------------------------------------
 
 # Ruta a la base de datos: /home/pi/velero_autonomo/storage/telemetria.db
+# (guarda la marca de agua; las muestras se leen/escriben en los shards)
 BASE_DIR = Path(__file__).resolve().parent.parent
 DB_PATH = BASE_DIR / "storage" / "telemetria.db"
 
 # Tolerancia máxima para asociar muestras en segundos
 MATCH_TOLERANCE = 0.5  # p.ej. actitud/viento a ±0.5 s del GPS
 
+# Filas GPS por bloque: acota la memoria al cargar actitud/viento del rango
+CHUNK_SIZE = 50000
+
+# Intervalo por defecto entre pasadas en modo --daemon (segundos)
+DAEMON_INTERVAL = 5.0
+
+# Clave de la marca de agua en telemetry_build_state
+WATERMARK_KEY = "gps_last_timestamp_utc"
+# Contador que sube con cada bloque escrito o vaciado: versión de los datos
+# (la usa la caché de respuestas del dashboard para invalidar)
+GENERATION_KEY = "generation"
+
+# Columnas de gps_samples que entran en el join
+GPS_COLUMNS = ["timestamp_utc", "lat_deg", "lon_deg", "alt_msl_m", "vel_m_s", "hdg_deg"]
+
+# Conexiones a shards en las que ya existe telemetry_samples
+_ready_shards = set()
+
 
 # --------------------------------------------------------------------
 # FUNCIONES AUXILIARES
 # --------------------------------------------------------------------
 
 def get_connection():
-    """Devuelve una conexión SQLite a la BD de telemetría."""
-    conn = sqlite3.connect(DB_PATH)
-    return conn
+    """Devuelve la conexión SQLite (perfil compartido) a la BD de telemetría."""
+    return get_shared_connection(DB_PATH)
 
 
 def create_telemetry_table(conn: sqlite3.Connection):
-    """
-    Crea la tabla ancha telemetry_samples si no existe.
-
-    NOTA: No se hace DROP TABLE, solo se vacía (DELETE) antes de rellenar.
-    """
+    """Crea la tabla ancha telemetry_samples si no existe."""
     cur = conn.cursor()
 
     cur.execute(
@@ -83,111 +117,158 @@ def create_telemetry_table(conn: sqlite3.Connection):
     cur.execute(
         "CREATE INDEX IF NOT EXISTS idx_telemetry_time ON telemetry_samples(timestamp_utc);"
     )
-
-    # Vaciar tabla (reconstruimos desde cero)
-    cur.execute("DELETE FROM telemetry_samples;")
     conn.commit()
 
 
-def fetch_nearest_attitude(cur: sqlite3.Cursor, ts: float):
-    """
-    Devuelve la muestra de actitud más cercana a ts, dentro de MATCH_TOLERANCE.
-    Si no hay ninguna en ese rango, devuelve (None, None, None).
-    """
+def create_state_table(conn: sqlite3.Connection):
+    """Crea la tabla de estado del constructor incremental (marca de agua)."""
+    cur = conn.cursor()
     cur.execute(
         """
-        SELECT timestamp_utc, roll_rad, pitch_rad, yaw_rad
-        FROM attitude_samples
-        WHERE ABS(timestamp_utc - ?) <= ?
-        ORDER BY ABS(timestamp_utc - ?) ASC
-        LIMIT 1;
-        """,
-        (ts, MATCH_TOLERANCE, ts),
+        CREATE TABLE IF NOT EXISTS telemetry_build_state (
+            key    TEXT PRIMARY KEY,
+            value  REAL
+        );
+        """
     )
-    row = cur.fetchone()
-    if row is None:
-        return None, None, None
+    conn.commit()
 
-    _, roll_rad, pitch_rad, yaw_rad = row
 
-    if roll_rad is None or pitch_rad is None or yaw_rad is None:
-        return None, None, None
+def clear_telemetry_table(conn: sqlite3.Connection):
+    """Vacía telemetry_samples en todos los shards y olvida la marca de agua."""
+    for _, _, path in shards.list_shards():
+        if not Path(path).exists():
+            continue
+        shard_conn = get_shared_connection(path)
+        create_telemetry_table(shard_conn)
+        shard_conn.execute("DELETE FROM telemetry_samples;")
+        shard_conn.commit()
+        rollups.clear_rollups(shard_conn)
+    conn.execute("DELETE FROM telemetry_build_state WHERE key = ?;", (WATERMARK_KEY,))
+    bump_generation(conn)
+    conn.commit()
 
-    roll_deg = math.degrees(roll_rad)
-    pitch_deg = math.degrees(pitch_rad)
-    yaw_deg = math.degrees(yaw_rad)
 
-    return roll_deg, pitch_deg, yaw_deg
+def shard_connection(ts: float):
+    """Conexión al shard de ts, con telemetry_samples y telemetry_rollups creadas."""
+    conn = shards.get_shard_connection(ts)
+    if conn not in _ready_shards:
+        create_telemetry_table(conn)
+        rollups.create_rollup_table(conn)
+        _ready_shards.add(conn)
+    return conn
 
 
-def fetch_nearest_wind(cur: sqlite3.Cursor, ts: float):
-    """
-    Devuelve la muestra de viento más cercana a ts, dentro de MATCH_TOLERANCE.
-    Si no hay ninguna en ese rango, devuelve (None, None, None, None).
-    """
-    cur.execute(
+def get_watermark(conn: sqlite3.Connection):
+    """Devuelve el último timestamp GPS procesado, o None si no hay."""
+    row = conn.execute(
+        "SELECT value FROM telemetry_build_state WHERE key = ?;", (WATERMARK_KEY,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def set_watermark(conn: sqlite3.Connection, ts: float):
+    """Guarda la marca de agua (dentro de la transacción en curso)."""
+    conn.execute(
+        "INSERT OR REPLACE INTO telemetry_build_state (key, value) VALUES (?, ?);",
+        (WATERMARK_KEY, ts),
+    )
+
+
+def bump_generation(conn: sqlite3.Connection):
+    """Sube la generación de los datos (dentro de la transacción en curso)."""
+    conn.execute(
         """
-        SELECT timestamp_utc, wind_speed_ms, wind_dir_deg, wind_vertical
-        FROM wind_samples
-        WHERE ABS(timestamp_utc - ?) <= ?
-        ORDER BY ABS(timestamp_utc - ?) ASC
-        LIMIT 1;
+        INSERT OR REPLACE INTO telemetry_build_state (key, value)
+        VALUES (?, COALESCE((SELECT value FROM telemetry_build_state WHERE key = ?), 0) + 1);
         """,
-        (ts, MATCH_TOLERANCE, ts),
+        (GENERATION_KEY, GENERATION_KEY),
     )
-    row = cur.fetchone()
-    if row is None:
-        return None, None, None, None
 
-    _, wind_speed_ms, wind_dir_deg, wind_vertical = row
 
-    if wind_speed_ms is None:
-        wind_speed_kn = None
-    else:
-        wind_speed_kn = wind_speed_ms * 1.94384
+def get_generation(conn: sqlite3.Connection):
+    """Generación actual de telemetry_samples/rollups (0 si nunca se construyó)."""
+    try:
+        row = conn.execute(
+            "SELECT value FROM telemetry_build_state WHERE key = ?;", (GENERATION_KEY,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # La tabla de estado aún no existe
+        return 0
+    return int(row[0]) if row else 0
 
-    return wind_speed_ms, wind_speed_kn, wind_dir_deg, wind_vertical
 
+def load_stream(table: str, columns: str, t_min: float, t_max: float):
+    """
+    Carga una vez las muestras de 'table' con timestamp en [t_min, t_max]
+    (shards del rango, tanto filas calientes como bloques archivados).
 
-# --------------------------------------------------------------------
-# PROCESO PRINCIPAL
-# --------------------------------------------------------------------
+    Devuelve (timestamps, valores) como arrays NumPy ordenados por tiempo;
+    los NULL se convierten en NaN.
+    """
+    cols = ["timestamp_utc"] + [c.strip() for c in columns.split(",")]
+    rows = archive.read_samples(table, t_min, t_max, columns=cols)
+    data = np.array(list(rows), dtype=float)
+    if data.size == 0:
+        return np.empty(0), np.empty((0, len(columns.split(","))))
+    return data[:, 0], data[:, 1:]
 
-def rebuild_telemetry_table():
+
+def nearest_indices(ts_ref: np.ndarray, ts_stream: np.ndarray, tolerance: float):
     """
-    Reconstruye la tabla telemetry_samples a partir de gps_samples,
-    attitude_samples y wind_samples.
+    As-of join al vecino más cercano: para cada ts_ref devuelve el índice de
+    la muestra de ts_stream más próxima, o -1 si está a más de 'tolerance'.
+    En caso de empate se elige la anterior.
     """
-    print(f"[INFO] Usando base de datos: {DB_PATH}")
+    if ts_stream.size == 0:
+        return np.full(ts_ref.shape, -1)
 
-    conn = get_connection()
-    cur = conn.cursor()
+    right = np.searchsorted(ts_stream, ts_ref, side="left")
+    left = np.clip(right - 1, 0, ts_stream.size - 1)
+    right = np.clip(right, 0, ts_stream.size - 1)
 
-    # Crear (si no existe) y vaciar la tabla ancha
-    print("[INFO] Creando/vaciando tabla telemetry_samples...")
-    create_telemetry_table(conn)
+    d_left = np.abs(ts_ref - ts_stream[left])
+    d_right = np.abs(ts_stream[right] - ts_ref)
+    idx = np.where(d_right < d_left, right, left)
+    best = np.minimum(d_left, d_right)
 
-    # Leer todas las muestras GPS (serán la base temporal)
-    print("[INFO] Leyendo muestras GPS...")
-    cur.execute(
-        """
-        SELECT timestamp_utc, lat_deg, lon_deg, alt_msl_m, vel_m_s, hdg_deg
-        FROM gps_samples
-        ORDER BY timestamp_utc ASC;
-        """
-    )
-    gps_rows = cur.fetchall()
-    total_gps = len(gps_rows)
-    print(f"[INFO] Muestras GPS encontradas: {total_gps}")
+    idx[best > tolerance] = -1
+    return idx
 
-    if total_gps == 0:
-        print("[WARN] No hay datos en gps_samples. Nada que hacer.")
-        conn.close()
-        return
 
-    inserted = 0
+def take(values: np.ndarray, idx: np.ndarray):
+    """Selecciona filas de 'values' por índice; -1 -> fila de NaN."""
+    out = np.full((idx.size, values.shape[1]), np.nan)
+    ok = idx >= 0
+    out[ok] = values[idx[ok]]
+    return out
+
 
-    for idx, (ts_utc, lat, lon, alt_msl_m, vel_ms, hdg_deg) in enumerate(gps_rows, start=1):
+def join_chunk(gps_rows):
+    """
+    Une un bloque de filas GPS (ordenadas) con la actitud y el viento más
+    cercanos dentro de MATCH_TOLERANCE. Devuelve las filas para executemany.
+    """
+    ts_gps = np.array([row[0] for row in gps_rows], dtype=float)
+    t_min = ts_gps[0] - MATCH_TOLERANCE
+    t_max = ts_gps[-1] + MATCH_TOLERANCE
+
+    # Actitud: si falta cualquiera de los tres ángulos, se descarta entera
+    ts_att, att = load_stream("attitude_samples", "roll_rad, pitch_rad, yaw_rad", t_min, t_max)
+    att = np.degrees(take(att, nearest_indices(ts_gps, ts_att, MATCH_TOLERANCE)))
+    att[np.isnan(att).any(axis=1)] = np.nan
+
+    ts_wind, wind = load_stream("wind_samples", "wind_speed_ms, wind_dir_deg, wind_vertical", t_min, t_max)
+    wind = take(wind, nearest_indices(ts_gps, ts_wind, MATCH_TOLERANCE))
+    wind_kn = wind[:, 0] * 1.94384
+
+    # NaN se guarda como NULL en SQLite
+    att = att.tolist()
+    wind = wind.tolist()
+    wind_kn = wind_kn.tolist()
+
+    rows = []
+    for i, (ts_utc, lat, lon, alt_msl_m, vel_ms, hdg_deg) in enumerate(gps_rows):
         # Conversión velocidad suelo a nudos
         sog_kn = vel_ms * 1.94384 if vel_ms is not None else None
 
@@ -197,43 +278,128 @@ def rebuild_telemetry_table():
         except Exception:
             timestamp_text = None
 
-        # Buscar actitud más cercana
-        roll_deg, pitch_deg, yaw_deg = fetch_nearest_attitude(cur, ts_utc)
-
-        # Buscar viento más cercano
-        wind_speed_ms, wind_speed_kn, wind_dir_deg, wind_vertical = fetch_nearest_wind(cur, ts_utc)
-
-        # Insertar fila en telemetry_samples
-        conn.execute(
-            """
-            INSERT OR REPLACE INTO telemetry_samples (
-                timestamp_utc, timestamp_text,
-                lat_deg, lon_deg, alt_msl_m, sog_kn, hdg_deg,
-                wind_speed_ms, wind_speed_kn, wind_dir_deg, wind_vertical,
-                roll_deg, pitch_deg, yaw_deg
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-            """,
-            (
-                ts_utc, timestamp_text,
-                lat, lon, alt_msl_m, sog_kn, hdg_deg,
-                wind_speed_ms, wind_speed_kn, wind_dir_deg, wind_vertical,
-                roll_deg, pitch_deg, yaw_deg,
+        wind_speed_ms, wind_dir_deg, wind_vertical = wind[i]
+        roll_deg, pitch_deg, yaw_deg = att[i]
+
+        rows.append((
+            ts_utc, timestamp_text,
+            lat, lon, alt_msl_m, sog_kn, hdg_deg,
+            wind_speed_ms, wind_kn[i], wind_dir_deg, wind_vertical,
+            roll_deg, pitch_deg, yaw_deg,
+        ))
+
+    return rows
+
+
+def rebuild_telemetry_table(full: bool = False):
+    """
+    Actualiza la tabla telemetry_samples a partir de gps_samples,
+    attitude_samples y wind_samples.
+
+    Con full=True se vacía y se reconstruye desde cero; si no, solo se
+    procesan las filas GPS posteriores a (marca de agua - MATCH_TOLERANCE).
+    Es idempotente (INSERT OR REPLACE por timestamp_utc), así que se puede
+    lanzar cada pocos segundos sin riesgo.
+
+    Las muestras se leen con storage.archive.read_samples (filas calientes
+    y bloques archivados) de CHUNK_SIZE en CHUNK_SIZE filas GPS, sin cargar
+    el rango entero, y cada fila se escribe en el shard de su timestamp.
+
+    La marca de agua (en DB_PATH) se guarda después del commit de los
+    shards de cada bloque, no en la misma transacción: si se corta entre
+    ambos, la siguiente pasada repite ese bloque (INSERT OR REPLACE).
+    """
+    conn = get_connection()
+
+    create_state_table(conn)
+    if full:
+        print("[INFO] Vaciando tabla telemetry_samples (reconstrucción completa)...")
+        clear_telemetry_table(conn)
+
+    watermark = get_watermark(conn)
+
+    if watermark is None:
+        since = None
+    else:
+        # Re-unimos la ventana de tolerancia anterior a la marca: puede que
+        # entonces aún no hubiese llegado la actitud/viento más cercana.
+        since = watermark - MATCH_TOLERANCE
+    gps_rows = archive.read_samples("gps_samples", t_min=since, columns=GPS_COLUMNS)
+    inserted = 0
+
+    while True:
+        chunk = list(islice(gps_rows, CHUNK_SIZE))
+        if not chunk:
+            break
+        # Si solo está la ventana de frontera no hay nada nuevo que hacer
+        if inserted == 0 and len(chunk) < CHUNK_SIZE and watermark is not None and chunk[-1][0] <= watermark:
+            break
+
+        # Agrupar las filas por shard de destino
+        by_shard = {}
+        for row in join_chunk(chunk):
+            by_shard.setdefault(shard_connection(row[0]), []).append(row)
+
+        # Insertar bloque en telemetry_samples
+        for shard_conn, rows in by_shard.items():
+            shard_conn.executemany(
+                """
+                INSERT OR REPLACE INTO telemetry_samples (
+                    timestamp_utc, timestamp_text,
+                    lat_deg, lon_deg, alt_msl_m, sog_kn, hdg_deg,
+                    wind_speed_ms, wind_speed_kn, wind_dir_deg, wind_vertical,
+                    roll_deg, pitch_deg, yaw_deg
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+                """,
+                rows,
             )
-        )
+            shard_conn.commit()
 
-        inserted += 1
+            # Recalcular solo los buckets (1 s ... 10 min) que tocan este bloque
+            rollups.update_rollups(shard_conn, rows[0][0], rows[-1][0])
 
-        # Mensaje de progreso cada 500 filas
-        if inserted % 500 == 0:
-            conn.commit()
-            print(f"[INFO] Procesadas {inserted}/{total_gps} filas GPS...")
+        inserted += len(chunk)
+
+        # Marca de agua tras el commit de los shards: si se corta a medias,
+        # la siguiente pasada continúa desde aquí (las filas repetidas se
+        # sustituyen por INSERT OR REPLACE).
+        set_watermark(conn, chunk[-1][0])
+        bump_generation(conn)
+        conn.commit()
+        if len(chunk) == CHUNK_SIZE:
+            print(f"[INFO] Procesadas {inserted} filas GPS...")
+
+    return inserted
 
-    conn.commit()
-    conn.close()
 
-    print(f"[OK] Tabla telemetry_samples reconstruida.")
+def main():
+    parser = argparse.ArgumentParser(description="Construye la tabla ancha telemetry_samples.")
+    parser.add_argument("--full", action="store_true",
+                        help="vaciar y reconstruir desde cero")
+    parser.add_argument("--daemon", action="store_true",
+                        help="repetir la actualización incremental indefinidamente")
+    parser.add_argument("-i", "--interval", type=float, default=DAEMON_INTERVAL,
+                        help=f"segundos entre pasadas en modo --daemon (por defecto {DAEMON_INTERVAL})")
+    args = parser.parse_args()
+
+    print(f"[INFO] Usando base de datos: {DB_PATH}")
+
+    inserted = rebuild_telemetry_table(full=args.full)
     print(f"[OK] Filas insertadas/actualizadas: {inserted}")
 
+    if not args.daemon:
+        return
+
+    print(f"[INFO] Modo daemon: actualizando cada {args.interval} s (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(args.interval)
+            inserted = rebuild_telemetry_table()
+            if inserted:
+                print(f"[OK] {datetime.now():%H:%M:%S} filas insertadas/actualizadas: {inserted}")
+    except KeyboardInterrupt:
+        print("\n[INFO] Saliendo del modo daemon.")
+
 
 if __name__ == "__main__":
-    rebuild_telemetry_table()
+    main()
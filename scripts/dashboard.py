@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import sqlite3
+import sys
 from pathlib import Path
 from datetime import datetime, timedelta
 
@@ -11,10 +11,11 @@ import streamlit as st
 # ----------------------------------------------------------
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DB_PATH = BASE_DIR / "storage" / "telemetria.db"   # adapta si tu DB está en storage/
 
-# Si realmente está en storage/, cambia por:
-# DB_PATH = BASE_DIR / "storage" / "telemetria.db"
+# Las muestras se leen de los shards de storage/ (ver config.SHARD_PERIOD),
+# incluidas las ya compactadas en bloques por storage/archive.py
+sys.path.append(str(BASE_DIR))
+from storage import archive
 
 
 # ----------------------------------------------------------
@@ -23,14 +24,9 @@ DB_PATH = BASE_DIR / "storage" / "telemetria.db"   # adapta si tu DB está en st
 
 @st.cache_data
 def cargar_gps(desde: float | None = None):
-    conn = sqlite3.connect(DB_PATH)
-    query = """
-        SELECT timestamp_utc, lat_deg, lon_deg, alt_msl_m, vel_m_s, hdg_deg
-        FROM gps_samples
-        ORDER BY timestamp_utc ASC;
-    """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    columnas = ["timestamp_utc", "lat_deg", "lon_deg", "alt_msl_m", "vel_m_s", "hdg_deg"]
+    # Solo se leen los shards que se solapan con el rango pedido
+    df = pd.DataFrame(list(archive.read_samples("gps_samples", t_min=desde, columns=columnas)), columns=columnas)
 
     if df.empty:
         return df
@@ -53,14 +49,8 @@ def cargar_gps(desde: float | None = None):
 
 @st.cache_data
 def cargar_viento(desde: float | None = None):
-    conn = sqlite3.connect(DB_PATH)
-    query = """
-        SELECT timestamp_utc, wind_speed_ms, wind_dir_deg
-        FROM wind_samples
-        ORDER BY timestamp_utc ASC;
-    """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    columnas = ["timestamp_utc", "wind_speed_ms", "wind_dir_deg"]
+    df = pd.DataFrame(list(archive.read_samples("wind_samples", t_min=desde, columns=columnas)), columns=columnas)
 
     if df.empty:
         return df
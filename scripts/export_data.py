@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 import os
+import sys
+import math
 import sqlite3
 import csv
 
-# 🔧 Cambia esta ruta si tu BD se llama distinto o está en otra carpeta
-DB_PATH = "telemetria.db"
+# Añadimos la carpeta raíz al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import shards, archive
 
 # Tablas de medidas que quieres exportar
 TABLES = [
@@ -18,36 +21,36 @@ OUTPUT_DIR = "outputs"
 N_LAST = 50  # número de filas recientes a exportar
 
 
-def export_table_last_n(conn, table, n, output_dir):
-    cur = conn.cursor()
-
-    # Intentamos ordenar por timestamp_utc si existe; si no, usamos rowid
-    cur.execute(f"PRAGMA table_info({table})")
-    cols_info = cur.fetchall()
-    col_names = [c[1] for c in cols_info]
-
-    if "timestamp_utc" in col_names:
-        order_col = "timestamp_utc"
-    else:
-        order_col = "rowid"
-
-    query = f"""
-        SELECT *
-        FROM {table}
-        ORDER BY {order_col} DESC
-        LIMIT ?
+def last_rows(table, n):
     """
-
-    cur.execute(query, (n,))
-    rows = cur.fetchall()
+    Últimas n filas de 'table' (calientes y archivadas en bloques), de la más
+    antigua a la más reciente.
+    """
+    i_ts = shards.table_columns(table).index("timestamp_utc")
+    rows = []
+    # Recorremos los shards del más reciente al más antiguo hasta tener n filas
+    for start, end, _ in reversed(shards.list_shards()):
+        t_min = None if start == -math.inf else start
+        t_max = None if end == math.inf else end
+        # Cada shard cubre [inicio, fin): la fila en 'fin' es del siguiente
+        shard_rows = [
+            row for row in archive.read_samples(table, t_min, t_max)
+            if t_max is None or row[i_ts] < t_max
+        ]
+        rows = shard_rows[-(n - len(rows)):] + rows
+        if len(rows) >= n:
+            break
+    return rows
+
+
+def export_table_last_n(table, n, output_dir):
+    col_names = shards.table_columns(table)
+    rows = last_rows(table, n)
 
     if not rows:
         print(f"[INFO] La tabla {table} no tiene datos, no genero CSV.")
         return
 
-    # Invertimos para que en el CSV salgan de más antiguo a más reciente
-    rows = rows[::-1]
-
     # Nombres de columna
     headers = col_names
 
@@ -63,22 +66,16 @@ def export_table_last_n(conn, table, n, output_dir):
 
 
 def main():
-    if not os.path.exists(DB_PATH):
-        print(f"[ERROR] No se encuentra la base de datos en: {DB_PATH}")
-        print("       Edita DB_PATH al principio del script con la ruta correcta.")
+    if not any(os.path.exists(path) for _, _, path in shards.list_shards()):
+        print("[ERROR] No se encuentra ninguna base de datos de telemetría.")
+        print(f"       Revisa SHARD_DIR / SHARD_PERIOD en config.py ({shards.SHARD_DIR}).")
         return
 
-    conn = sqlite3.connect(DB_PATH)
-
-    try:
-        for table in TABLES:
-            try:
-                export_table_last_n(conn, table, N_LAST, OUTPUT_DIR)
-            except sqlite3.Error as e:
-                print(f"[WARN] No se ha podido exportar {table}: {e}")
-    finally:
-        conn.close()
-        print("[INFO] Conexión a la BD cerrada.")
+    for table in TABLES:
+        try:
+            export_table_last_n(table, N_LAST, OUTPUT_DIR)
+        except sqlite3.Error as e:
+            print(f"[WARN] No se ha podido exportar {table}: {e}")
 
 
 if __name__ == "__main__":
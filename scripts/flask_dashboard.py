@@ -1,133 +1,468 @@
 #!/usr/bin/env python3
+import sys
+import gzip
+import json
 import time
+import zlib
+import hashlib
 import sqlite3
+import threading
+from collections import OrderedDict
+from itertools import islice
 from datetime import datetime
 from pathlib import Path
 
-from flask import Flask, jsonify, request, render_template_string
+import numpy as np
 
-app = Flask(__name__)
+from flask import Flask, Response, jsonify, request, render_template_string
 
-# -------------------------------------------------------------------
-# RUTA A LA BD (la misma que en build_telemetry_table.py)
-# -------------------------------------------------------------------
-BASE_DIR = Path(__file__).resolve().parent.parent
-DB_PATH = BASE_DIR / "storage" / "telemetria.db"
+# Añadimos la carpeta raíz al path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from storage import shards, rollups, downsample
+from core.live_buffer import open_reader
+from core import latency
+from core.live_stream import StreamHub
+from config import LIVE_STREAM_HEARTBEAT
+from scripts import build_telemetry_table
 
+app = Flask(__name__)
+
+# Un lector del canal de main.py para todo el proceso, repartido a cada /api/stream
+hub = StreamHub()
 
 # -------------------------------------------------------------------
 # UTILIDAD: LEER DE telemetry_samples
 # -------------------------------------------------------------------
+#
+# Las lecturas devuelven una tabla (nombres, matriz float64 fila x campo,
+# resolucion del agregado o None) sin pasar por un dict por fila; los
+# formatos de respuesta (ver mas abajo) se construyen desde esa matriz.
+
+# Columnas numericas de telemetry_samples que se sirven
+SAMPLE_COLUMNS = (
+    "timestamp_utc", "lat_deg", "lon_deg", "alt_msl_m", "sog_kn", "hdg_deg",
+    "wind_speed_ms", "wind_speed_kn", "wind_dir_deg", "wind_vertical",
+    "roll_deg", "pitch_deg", "yaw_deg",
+)
+# Filas que se pasan a NumPy de cada vez al recorrer el rango
+CHUNK_ROWS = 20000
 
-def fetch_telemetry_samples(hours: float | None = None, limit: int = 1000):
+
+def rows_to_array(rows, n_columns: int):
+    """Filas del cursor -> matriz float64 por bloques (None -> NaN)."""
+    chunks = []
+    while True:
+        chunk = list(islice(rows, CHUNK_ROWS))
+        if not chunk:
+            break
+        chunks.append(np.array(chunk, dtype=float))
+    return np.concatenate(chunks) if chunks else np.empty((0, n_columns))
+
+
+def read_telemetry_samples(hours: float | None = None, limit: int | None = 1000, after: float | None = None):
     """
-    Devuelve una lista de diccionarios con muestras combinadas de:
+    Tabla de muestras combinadas de:
     - GPS (lat, lon, alt, sog, hdg)
     - Viento (wind_speed_kn, wind_dir_deg)
     - Actitud (roll_deg, pitch_deg, yaw_deg)
 
-    leyendo de telemetry_samples.
+    leyendo de telemetry_samples (solo los shards del rango pedido).
+    Con 'after' solo devuelve las filas con timestamp_utc > after (cursor
+    del refresco incremental: solo se adjuntan los shards recientes).
+    Sin 'after', 'limit' se queda con las filas MÁS RECIENTES del rango (en
+    orden ascendente); con 'after', con las primeras tras el cursor.
+    Con limit=None recorre TODO el rango por bloques, sin lista de filas.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
+    where = []
+    params = []
+    ts_min = None
     if hours is not None:
         ts_min = time.time() - hours * 3600.0
-        cur.execute(
-            """
-            SELECT
-                timestamp_utc,
-                timestamp_text,
-                lat_deg,
-                lon_deg,
-                alt_msl_m,
-                sog_kn,
-                hdg_deg,
-                wind_speed_ms,
-                wind_speed_kn,
-                wind_dir_deg,
-                wind_vertical,
-                roll_deg,
-                pitch_deg,
-                yaw_deg
-            FROM telemetry_samples
-            WHERE timestamp_utc >= ?
-            ORDER BY timestamp_utc ASC
-            LIMIT ?;
-            """,
-            (ts_min, limit),
-        )
+        where.append("timestamp_utc >= ?")
+        params.append(ts_min)
+    if after is not None:
+        ts_min = after if ts_min is None else max(ts_min, after)
+        where.append("timestamp_utc > ?")
+        params.append(after)
+    if limit is not None:
+        params.append(limit)
+    newest = limit is not None and after is None
+
+    rows = shards.query(
+        f"""
+        SELECT {", ".join(SAMPLE_COLUMNS)}
+        FROM telemetry_samples
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY timestamp_utc {"DESC" if newest else "ASC"}
+        {"LIMIT ?" if limit is not None else ""};
+        """,
+        params,
+        t_min=ts_min, tables=("telemetry_samples",), newest_first=newest,
+    )
+    # El LIMIT se aplica por grupo de shards adjuntos: recortamos el total
+    if limit is not None:
+        rows = islice(rows, limit)
+    data = rows_to_array(rows, len(SAMPLE_COLUMNS))
+    return SAMPLE_COLUMNS, data[::-1].copy() if newest else data, None
+
+
+def fetch_telemetry_samples(hours: float | None = None, limit: int = 1000, after: float | None = None):
+    """Como read_telemetry_samples, en lista de diccionarios (formato 'rows')."""
+    return table_to_rows(*read_telemetry_samples(hours=hours, limit=limit, after=after))
+
+
+# -------------------------------------------------------------------
+# UTILIDAD: LEER DE telemetry_rollups (rangos largos)
+# -------------------------------------------------------------------
+
+# Columna de telemetry_rollups -> clave servida (mismas claves que las muestras)
+ROLLUP_KEYS = {
+    "bucket_start": "timestamp_utc",
+    "count": "count",
+    "lat_deg": "lat_deg",
+    "lon_deg": "lon_deg",
+    "alt_msl_m": "alt_msl_m",
+    "sog_mean": "sog_kn",
+    "sog_min": "sog_kn_min",
+    "sog_max": "sog_kn_max",
+    "hdg_mean_deg": "hdg_deg",
+    "wind_mean": "wind_speed_kn",
+    "wind_min": "wind_speed_kn_min",
+    "wind_max": "wind_speed_kn_max",
+    "wind_dir_mean_deg": "wind_dir_deg",
+    "heel_mean": "roll_deg",
+    "heel_min": "roll_deg_min",
+    "heel_max": "roll_deg_max",
+}
+
+
+def telemetry_time_span():
+    """(primer, ultimo) timestamp_utc de telemetry_samples, o (None, None)."""
+    t_first, t_last = None, None
+    for lo, hi in shards.query(
+        "SELECT MIN(timestamp_utc), MAX(timestamp_utc) FROM telemetry_samples;",
+        tables=("telemetry_samples",),
+    ):
+        if lo is not None:
+            t_first = lo if t_first is None else min(t_first, lo)
+            t_last = hi if t_last is None else max(t_last, hi)
+    return t_first, t_last
+
+
+def read_telemetry_rollups(hours: float | None, points: int, after: float | None = None):
+    """
+    Tabla del rango pedido agregado a la resolucion mas gruesa que aun da
+    'points' puntos (ver storage/rollups.py), con las mismas claves que
+    las muestras (valores medios) mas min/max por bucket.
+
+    Con 'after' solo devuelve los buckets desde el que contiene 'after'
+    (incluido: el ultimo bucket se recalcula mientras se va llenando).
+
+    Devuelve None si el rango es tan corto que conviene leer filas crudas.
+    """
+    names = tuple(ROLLUP_KEYS.values())
+    t_max = time.time()
+    if hours is not None:
+        t_min = t_max - hours * 3600.0
     else:
-        cur.execute(
-            """
-            SELECT
-                timestamp_utc,
-                timestamp_text,
-                lat_deg,
-                lon_deg,
-                alt_msl_m,
-                sog_kn,
-                hdg_deg,
-                wind_speed_ms,
-                wind_speed_kn,
-                wind_dir_deg,
-                wind_vertical,
-                roll_deg,
-                pitch_deg,
-                yaw_deg
-            FROM telemetry_samples
-            ORDER BY timestamp_utc ASC
-            LIMIT ?;
-            """,
-            (limit,),
-        )
-
-    rows = cur.fetchall()
-    conn.close()
-
-    data = []
-    for (
-        ts_utc,
-        ts_text,
-        lat,
-        lon,
-        alt,
-        sog_kn,
-        hdg_deg,
-        wind_ms,
-        wind_kn,
-        wind_dir_deg,
-        wind_vertical,
-        roll_deg,
-        pitch_deg,
-        yaw_deg,
-    ) in rows:
-        # timestamp ISO
-        try:
-            ts_iso = datetime.fromtimestamp(ts_utc).isoformat(sep=" ")
-        except Exception:
-            ts_iso = ts_text or ""
-
-        data.append(
-            {
-                "timestamp_utc": ts_utc,
-                "timestamp_iso": ts_iso,
-                "lat_deg": lat,
-                "lon_deg": lon,
-                "alt_msl_m": alt,
-                "sog_kn": sog_kn,
-                "hdg_deg": hdg_deg,
-                "wind_speed_ms": wind_ms,
-                "wind_speed_kn": wind_kn,
-                "wind_dir_deg": wind_dir_deg,
-                "wind_vertical": wind_vertical,
-                "roll_deg": roll_deg,
-                "pitch_deg": pitch_deg,
-                "yaw_deg": yaw_deg,
-            }
-        )
-
-    return data
+        t_min, _ = telemetry_time_span()
+        if t_min is None:
+            return names, np.empty((0, len(names))), None
+
+    resolution = rollups.choose_resolution(t_max - t_min, points)
+    if resolution is None:
+        return None
+
+    if after is not None:
+        t_min = max(t_min, after)
+
+    columns = rollups.rollup_columns()
+    select = [columns.index(c) for c in ROLLUP_KEYS]
+    rows = (tuple(row[i] for i in select) for row in rollups.fetch_rollups(resolution, t_min=t_min))
+    return names, rows_to_array(rows, len(names)), resolution
+
+
+def fetch_telemetry_rollups(hours: float | None, points: int, after: float | None = None):
+    """Como read_telemetry_rollups, en lista de diccionarios (formato 'rows')."""
+    table = read_telemetry_rollups(hours, points, after)
+    return table_to_rows(*table) if table is not None else None
+
+
+def downsample_table(names, data, max_points: int):
+    """Filas de la tabla que conserva storage/downsample.py (LTTB / min-max)."""
+    columns = {name: data[:, i] for i, name in enumerate(names)}
+    return data[downsample.select(columns["timestamp_utc"], columns, max_points)]
+
+
+# -------------------------------------------------------------------
+# FORMATOS DE RESPUESTA
+# -------------------------------------------------------------------
+#
+#   rows      lista de diccionarios, uno por fila, con timestamp_iso (por defecto)
+#   columnar  {"fields": [...], "columns": {campo: [valores]}}: un array por
+#             campo, tiempos en epoch y null donde no hay dato
+#   f32       binario: uint32 LE con la longitud de una cabecera JSON
+#             (rellena a multiplo de 4), y tras ella los campos uno detras de
+#             otro como Float32 little-endian (NaN = sin dato). Los tiempos
+#             van como segundos desde 't0' de la cabecera (en Float32 un
+#             epoch perderia ~2 min de resolucion); 't_last' es el ultimo
+#             exacto, para usarlo de cursor en 'after'.
+
+def _column_list(col):
+    """Array 1D -> lista JSON (NaN -> None)."""
+    values = col.tolist()
+    if np.isnan(col).any():
+        values = [None if v != v else v for v in values]
+    return values
+
+
+def table_to_rows(names, data, resolution):
+    """Formato 'rows' (el de siempre)."""
+    out = []
+    for row in data.tolist():
+        d = {name: (None if v != v else v) for name, v in zip(names, row)}
+        d["timestamp_iso"] = datetime.fromtimestamp(d["timestamp_utc"]).isoformat(sep=" ")
+        if resolution is not None:
+            d["resolution_s"] = resolution
+            d["count"] = int(d["count"])
+        out.append(d)
+    return out
+
+
+def encode_rows(names, data, resolution):
+    return json.dumps(table_to_rows(names, data, resolution), separators=(",", ":")).encode()
+
+
+def encode_columnar(names, data, resolution):
+    return json.dumps(
+        {
+            "format": "columnar",
+            "n": len(data),
+            "resolution_s": resolution,
+            "fields": list(names),
+            "columns": {name: _column_list(data[:, i]) for i, name in enumerate(names)},
+        },
+        separators=(",", ":"),
+    ).encode()
+
+
+def encode_f32(names, data, resolution):
+    t0 = float(data[0, 0]) if len(data) else 0.0
+    t_last = float(data[-1, 0]) if len(data) else 0.0
+    header = json.dumps(
+        {"format": "f32", "n": len(data), "resolution_s": resolution, "fields": list(names),
+         "t0": t0, "t_last": t_last},
+        separators=(",", ":"),
+    ).encode()
+    header += b" " * (-len(header) % 4)
+
+    columns = np.empty((len(names), len(data)), dtype="<f4")
+    columns[:] = data.T
+    columns[0] = data[:, 0] - t0
+    return len(header).to_bytes(4, "little") + header + columns.tobytes()
+
+
+# Formato -> (codificador, tipo MIME)
+FORMATS = {
+    "rows": (encode_rows, "application/json"),
+    "columnar": (encode_columnar, "application/json"),
+    "f32": (encode_f32, "application/octet-stream"),
+}
+
+
+# -------------------------------------------------------------------
+# CACHE DE RESPUESTAS (ETag, 304, gzip/deflate)
+# -------------------------------------------------------------------
+
+# Respuestas guardadas (LRU) y su tamaño total maximo sin comprimir
+CACHE_ENTRIES = 64
+CACHE_MAX_BYTES = 16 * 1024 * 1024
+# Segundos que vale una entrada aunque no cambie la generacion: los rangos
+# "ultimas N horas" se desplazan con el reloj aunque no lleguen filas
+CACHE_TTL = 60.0
+# Por debajo de este tamaño no compensa comprimir
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+
+
+# Conexion de solo lectura por hilo para consultar la generacion (sin PRAGMAs
+# ni perfil de escritor: se abre en cada hilo de Flask una sola vez)
+_generation_local = threading.local()
+
+
+def generation_connection():
+    """Conexion mode=ro del hilo a la BD de telemetria (se reabre si cambia DB_PATH)."""
+    path = str(build_telemetry_table.DB_PATH)
+    conn = getattr(_generation_local, "conn", None)
+    if conn is not None and _generation_local.path == path:
+        return conn
+    if conn is not None:
+        conn.close()
+    _generation_local.conn = None
+    conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    _generation_local.conn, _generation_local.path = conn, path
+    return conn
+
+
+def data_generation():
+    """Generacion de telemetry_samples (la sube build_telemetry_table.py), o None si no se puede leer."""
+    try:
+        return build_telemetry_table.get_generation(generation_connection())
+    except sqlite3.Error:
+        # BD aun no creada (o conexion rota): se reabre en la siguiente peticion
+        conn = getattr(_generation_local, "conn", None)
+        if conn is not None:
+            conn.close()
+        _generation_local.conn = None
+        return None
+
+
+def accepted_encoding(header: str):
+    """'gzip' o 'deflate' segun Accept-Encoding (con q > 0), o None."""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ("gzip", "deflate"):
+        if accepted.get(encoding, 0) > 0:
+            return encoding
+    return None
+
+
+class CachedResponse:
+    """Cuerpo de una respuesta, su hash y sus versiones comprimidas (bajo demanda)."""
+
+    def __init__(self, body: bytes, timing: str, mimetype: str):
+        self.body = body
+        self.timing = timing
+        self.mimetype = mimetype
+        self.digest = hashlib.sha1(body).hexdigest()[:20]
+        self.created = time.monotonic()
+        self.encoded = {None: body}
+
+    def encode(self, encoding):
+        data = self.encoded.get(encoding)
+        if data is None:
+            if encoding == "gzip":
+                data = gzip.compress(self.body, GZIP_LEVEL, mtime=0)
+            else:
+                data = zlib.compress(self.body, GZIP_LEVEL)
+            self.encoded[encoding] = data
+        return data
+
+    def etag(self, encoding):
+        # ETag fuerte por representacion: cada codificacion tiene la suya
+        return self.digest + (f"-{encoding}" if encoding else "")
+
+
+class ResponseCache:
+    """
+    Cache en proceso de respuestas GET, por (ruta y parametros, generacion
+    de los datos). Los clientes que sondean el mismo rango comparten una
+    sola consulta; con If-None-Match reciben 304 sin cuerpo.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.size = 0
+        self.stats = {
+            "hits": 0, "misses": 0, "not_modified": 0, "uncacheable": 0,
+            "bytes_body": 0, "bytes_sent": 0, "bytes_saved_compression": 0, "bytes_saved_304": 0,
+        }
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry.created > CACHE_TTL:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.size -= len(entry.body)
+
+    def _put(self, key, entry):
+        with self._lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = entry
+            self.size += len(entry.body)
+            while self.entries and (len(self.entries) > CACHE_ENTRIES or self.size > CACHE_MAX_BYTES):
+                self._remove(next(iter(self.entries)))
+
+    def respond(self, build):
+        """
+        Respuesta para la peticion actual. 'build()' devuelve (cuerpo en
+        bytes, valor de Server-Timing, tipo MIME) y solo se llama si no hay
+        entrada.
+        """
+        generation = data_generation()
+        key = (request.path, tuple(sorted(request.args.items(multi=True))), generation)
+
+        entry = self._get(key) if generation is not None else None
+        if entry is not None:
+            self.stats["hits"] += 1
+            timing = "cache;desc=hit"
+        else:
+            body, timing, mimetype = build()
+            entry = CachedResponse(body, timing, mimetype)
+            if generation is None:
+                self.stats["uncacheable"] += 1
+            else:
+                self.stats["misses"] += 1
+                self._put(key, entry)
+
+        encoding = accepted_encoding(request.headers.get("Accept-Encoding", ""))
+        if len(entry.body) < COMPRESS_MIN_BYTES:
+            encoding = None
+        etag = entry.etag(encoding)
+        self.stats["bytes_body"] += len(entry.body)
+
+        # El mismo contenido en cualquier codificacion sigue siendo valido
+        variants = (entry.etag(None), entry.etag("gzip"), entry.etag("deflate"))
+        if any(request.if_none_match.contains(tag) for tag in variants):
+            self.stats["not_modified"] += 1
+            self.stats["bytes_saved_304"] += len(entry.body)
+            response = app.response_class(status=304)
+        else:
+            data = entry.encode(encoding) if encoding else entry.body
+            self.stats["bytes_sent"] += len(data)
+            self.stats["bytes_saved_compression"] += len(entry.body) - len(data)
+            response = app.response_class(data, mimetype=entry.mimetype)
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+
+        response.set_etag(etag)
+        response.headers["Vary"] = "Accept-Encoding"
+        # Siempre revalidar: con la generacion sin cambios la respuesta es un 304 vacio
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["Server-Timing"] = timing
+        return response
+
+    def stats_summary(self):
+        with self._lock:
+            entries, size = len(self.entries), self.size
+        st = dict(self.stats)
+        lookups = st["hits"] + st["misses"]
+        st["hit_rate"] = round(st["hits"] / lookups, 3) if lookups else None
+        st["entries"] = entries
+        st["cached_bytes"] = size
+        st["generation"] = data_generation()
+        return st
+
+
+cache = ResponseCache()
 
 
 # -------------------------------------------------------------------
@@ -139,16 +474,183 @@ def api_telemetry():
     """
     Devuelve la telemetria combinada (GPS + viento + actitud) desde telemetry_samples.
 
-    Parametro opcional:
+    Parametros opcionales:
       - hours: ultimas N horas (float)
+      - points: numero de puntos deseado; si se indica, los rangos largos
+        se sirven desde telemetry_rollups en lugar de filas crudas
+      - after: timestamp_utc de la ultima fila que ya tiene el cliente;
+        solo se devuelven las posteriores (con rollups, desde el bucket
+        de 'after', que puede haber cambiado). El coste depende de lo
+        nuevo, no del tamaño del rango.
+      - max_points: tope de filas de la respuesta (como minimo
+        downsample.MIN_POINTS, 3 por serie). Sin rollups se recorre el
+        rango entero y se reduce (LTTB en magnitudes, min/max por bucket
+        en angulos); con rollups o 'after' se reduce lo leido.
+      - format: rows (por defecto), columnar o f32 (ver FORMATOS DE RESPUESTA)
+
+    La cabecera Server-Timing da los ms de SQL, reduccion y codificacion
+    (o "cache;desc=hit"). Las respuestas pasan por la cache de respuestas:
+    ETag, 304 con If-None-Match y gzip/deflate segun Accept-Encoding.
     """
-    hours_str = request.args.get("hours")
-    hours = float(hours_str) if hours_str not in (None, "") else None
+    if (request.args.get("format") or "rows") not in FORMATS:
+        return jsonify({"error": f"format debe ser uno de {', '.join(FORMATS)}"}), 400
+    try:
+        for name, kind, minimum in TELEMETRY_ARGS:
+            query_arg(name, kind, minimum)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return cache.respond(build_telemetry)
+
+
+# Parametros numericos de /api/telemetry: (nombre, tipo, minimo)
+TELEMETRY_ARGS = (
+    ("hours", float, 0),
+    ("after", float, None),
+    ("points", int, 1),
+    ("max_points", int, downsample.MIN_POINTS),
+)
+
+
+def query_arg(name, kind=float, minimum=None):
+    """Parametro numerico opcional de la peticion (None si falta); ValueError si no es valido."""
+    value = request.args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        value = kind(value)
+    except ValueError:
+        value = None
+    # value != value: NaN
+    if value is None or value != value or (minimum is not None and value < minimum):
+        expected = "un entero" if kind is int else "un numero"
+        if minimum is not None:
+            expected += f" >= {minimum}"
+        raise ValueError(f"{name} debe ser {expected}")
+    return value
+
+
+def build_telemetry():
+    """Cuerpo de /api/telemetry para la peticion actual, su Server-Timing y su tipo MIME."""
+    hours = query_arg("hours")
+    after = query_arg("after")
+    max_points = query_arg("max_points", int)
+    points = query_arg("points", int)
+
+    encode, mimetype = FORMATS[request.args.get("format") or "rows"]
+
+    t0 = time.perf_counter()
+    table = None
+    if points is not None:
+        table = read_telemetry_rollups(hours=hours, points=points, after=after)
+    if table is None:
+        # Con max_points se lee el rango entero (se reduce despues)
+        full_range = max_points is not None and after is None
+        table = read_telemetry_samples(hours=hours, after=after, limit=None if full_range else 1000)
+    names, data, resolution = table
+    t1 = time.perf_counter()
+
+    rows_read = len(data)
+    if max_points is not None and len(data) > max_points:
+        data = downsample_table(names, data, max_points)
+    t2 = time.perf_counter()
 
-    data = fetch_telemetry_samples(hours=hours)
+    body = encode(names, data, resolution)
+    t3 = time.perf_counter()
+
+    timing = (f"sql;dur={(t1 - t0) * 1000:.1f}, downsample;dur={(t2 - t1) * 1000:.1f}, "
+              f"encode;dur={(t3 - t2) * 1000:.1f}, rows;desc={rows_read}")
+    return body, timing, mimetype
+
+
+@app.route("/api/cache/stats")
+def api_cache_stats():
+    """Aciertos, 304 y bytes ahorrados (compresion y 304) de la cache de respuestas."""
+    return jsonify(cache.stats_summary())
+
+
+@app.route("/api/live")
+def api_live():
+    """
+    Ultimos segundos de la fila fusionada que publica main.py en memoria
+    compartida (core/live_buffer.py). No toca la base de datos.
+
+    Parametros opcionales:
+      - seconds: ventana en segundos (por defecto 60)
+    """
+    try:
+        seconds = query_arg("seconds", float, 0)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if seconds is None:
+        seconds = 60.0
+
+    reader = open_reader()
+    if reader is None:
+        return jsonify({"error": "main.py no esta publicando el buffer en vivo"}), 503
+    try:
+        # Copia: la lista JSON se construye fuera del seqlock
+        cols = reader.columns(seconds=seconds, copy=True)
+        # NaN no es JSON valido: se envia como null
+        data = {name: [None if v != v else v for v in col.tolist()] for name, col in cols.items()}
+    finally:
+        reader.close()
+    # Edad de la fila mas reciente al servirla (fila publicada -> respuesta)
+    if data.get("t"):
+        latency.record_since_wall("commit_served", data["t"][-1])
     return jsonify(data)
 
 
+@app.route("/api/latency")
+def api_latency():
+    """
+    Latencias por salto: las que exporta main.py (lectura -> MWV -> commit)
+    mas commit_served y publish_pushed, medidas en este proceso al responder
+    /api/live y al empujar por /api/stream.
+    """
+    exported = latency.load_metrics() or {"updated": None, "budget_ms": latency.LATENCY_BUDGET_MS, "hops": {}}
+    exported["hops"].update(latency.summary())
+    return jsonify(exported)
+
+
+@app.route("/api/stream")
+def api_stream():
+    """
+    Server-Sent Events: cada fila fusionada que empuja main.py, tal cual
+    llega (JSON con 't' = epoch de publicacion). Todos los clientes
+    comparten una sola lectura del canal; cada uno tiene su propia cola
+    acotada, asi que un navegador lento solo pierde sus filas antiguas.
+    """
+    client = hub.subscribe()
+
+    def events():
+        try:
+            # El navegador reintenta a los 2 s si se corta la conexion
+            yield b"retry: 2000\n\n"
+            while True:
+                item = client.get(timeout=LIVE_STREAM_HEARTBEAT)
+                if item is None:
+                    # Comentario SSE: mantiene viva la conexion y detecta desconexiones
+                    yield b": ping\n\n"
+                    continue
+                t, data = item
+                yield b"data: " + data + b"\n\n"
+                latency.record_since_wall("publish_pushed", t)
+        finally:
+            hub.unsubscribe(client)
+
+    return Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/stream/stats")
+def api_stream_stats():
+    """Estado del canal: filas recibidas, reconexiones y cola/enviadas/descartadas por cliente."""
+    return jsonify(hub.stats_summary())
+
+
 # -------------------------------------------------------------------
 # PAGINA PRINCIPAL (HTML + JS con Chart.js)
 # -------------------------------------------------------------------
@@ -297,16 +799,75 @@ HTML_TEMPLATE = """
 
   <script>
     const hoursSelect = document.getElementById("hoursSelect");
+    // Puntos por grafica: el servidor elige la resolucion de agregado
+    const CHART_POINTS = 500;
+    // Tope de filas por respuesta: el servidor reduce el rango (LTTB / min-max)
+    const CHART_MAX_POINTS = 1500;
     let gpsChart = null;
     let windChart = null;
 
-    async function fetchJson(url) {
+    // Formato de /api/telemetry: "f32" (binario) o "columnar" (JSON por columnas)
+    const PAYLOAD_FORMAT = "f32";
+
+    // Tabla por columnas: {n, t: [epoch], cols: {campo: [valores]}, resolution}
+    function emptyTable() {
+      return { n: 0, t: [], cols: {}, resolution: 0 };
+    }
+
+    // Float32 -> array normal (Chart.js necesita push/splice), NaN -> null
+    function toArray(values) {
+      return Array.from(values, v => (Number.isNaN(v) ? null : v));
+    }
+
+    function decodeF32(buffer) {
+      const headerLen = new DataView(buffer).getUint32(0, true);
+      const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLen)));
+      const n = header.n;
+      const values = new Float32Array(buffer, 4 + headerLen, n * header.fields.length);
+      const cols = {};
+      header.fields.forEach((name, i) => {
+        cols[name] = toArray(values.subarray(i * n, (i + 1) * n));
+      });
+      // Los tiempos llegan como segundos desde t0; el ultimo, exacto (cursor)
+      const t = cols.timestamp_utc.map(dt => header.t0 + dt);
+      if (n > 0) t[n - 1] = header.t_last;
+      return { n: n, t: t, cols: cols, resolution: header.resolution_s || 0 };
+    }
+
+    function decodeColumnar(payload) {
+      return {
+        n: payload.n,
+        t: payload.columns.timestamp_utc,
+        cols: payload.columns,
+        resolution: payload.resolution_s || 0,
+      };
+    }
+
+    async function fetchTable(url) {
       const res = await fetch(url);
       if (!res.ok) throw new Error("Error al cargar " + url);
-      return await res.json();
+      if (PAYLOAD_FORMAT === "f32") return decodeF32(await res.arrayBuffer());
+      return decodeColumnar(await res.json());
     }
 
-    function updateCards(telemetryData) {
+    function pad(v) {
+      return String(v).padStart(2, "0");
+    }
+
+    // Etiqueta del eje: fecha y hora local, como timestamp_iso
+    function timeLabel(t) {
+      const d = new Date(t * 1000);
+      return `${d.getFullYear()}-${pad(d.getMonth() + 1)}-${pad(d.getDate())} `
+        + `${pad(d.getHours())}:${pad(d.getMinutes())}:${pad(d.getSeconds())}`;
+    }
+
+    // Momento de la ultima fila recibida por /api/stream
+    let lastLive = 0;
+
+    function updateCards(table) {
+      // Con el canal en vivo activo las tarjetas las mantiene onLiveRow
+      if (Date.now() - lastLive < 5000) return;
+
       const posMetric = document.getElementById("posMetric");
       const altMetric = document.getElementById("altMetric");
       const sogMetric = document.getElementById("sogMetric");
@@ -314,44 +875,51 @@ HTML_TEMPLATE = """
       const windSpdMetric = document.getElementById("windSpdMetric");
       const windDirMetric = document.getElementById("windDirMetric");
 
-      if (telemetryData.length > 0) {
-        const last = telemetryData[telemetryData.length - 1];
+      if (table.n > 0) {
+        const last = name => (table.cols[name] ? table.cols[name][table.n - 1] : null);
+        const lat = last("lat_deg");
+        const lon = last("lon_deg");
+        const alt = last("alt_msl_m");
+        const sog = last("sog_kn");
+        const hdg = last("hdg_deg");
+        const windSpd = last("wind_speed_kn");
+        const windDir = last("wind_dir_deg");
 
         // Posicion
-        if (last.lat_deg != null && last.lon_deg != null) {
-          posMetric.textContent = `${last.lat_deg.toFixed(5)}, ${last.lon_deg.toFixed(5)}`;
+        if (lat != null && lon != null) {
+          posMetric.textContent = `${lat.toFixed(5)}, ${lon.toFixed(5)}`;
         } else {
           posMetric.textContent = "Sin datos";
         }
 
-        if (last.alt_msl_m != null) {
-          altMetric.textContent = `Altitud: ${last.alt_msl_m.toFixed(1)} m`;
+        if (alt != null) {
+          altMetric.textContent = `Altitud: ${alt.toFixed(1)} m`;
         } else {
           altMetric.textContent = "Altitud: N/D";
         }
 
         // Movimiento
-        if (last.sog_kn != null) {
-          sogMetric.textContent = `SOG: ${last.sog_kn.toFixed(2)} kn`;
+        if (sog != null) {
+          sogMetric.textContent = `SOG: ${sog.toFixed(2)} kn`;
         } else {
           sogMetric.textContent = "SOG: N/D";
         }
 
-        if (last.hdg_deg != null) {
-          cogMetric.textContent = `COG: ${last.hdg_deg.toFixed(1)}º`;
+        if (hdg != null) {
+          cogMetric.textContent = `COG: ${hdg.toFixed(1)}º`;
         } else {
           cogMetric.textContent = "COG: N/D";
         }
 
         // Viento
-        if (last.wind_speed_kn != null) {
-          windSpdMetric.textContent = `${last.wind_speed_kn.toFixed(1)} kn`;
+        if (windSpd != null) {
+          windSpdMetric.textContent = `${windSpd.toFixed(1)} kn`;
         } else {
           windSpdMetric.textContent = "-";
         }
 
-        if (last.wind_dir_deg != null) {
-          windDirMetric.textContent = `Direccion: ${last.wind_dir_deg.toFixed(0)}º`;
+        if (windDir != null) {
+          windDirMetric.textContent = `Direccion: ${windDir.toFixed(0)}º`;
         } else {
           windDirMetric.textContent = "Direccion: N/D";
         }
@@ -366,102 +934,184 @@ HTML_TEMPLATE = """
       }
     }
 
-    function updateCharts(telemetryData) {
+    // Datos que ya tiene la pagina (cursor = ultimo tiempo de la tabla)
+    let telemetry = emptyTable();
+    // Cambia en cada recarga completa: invalida los refrescos en vuelo
+    let loadGeneration = 0;
+
+    // Campos de cada grafica, en el orden de sus datasets
+    const GPS_FIELDS = ["sog_kn", "hdg_deg"];
+    const WIND_FIELDS = ["wind_speed_kn", "wind_dir_deg"];
+
+    function makeChart(ctx, labels, series, names) {
+      return new Chart(ctx, {
+        type: "line",
+        data: {
+          labels: labels,
+          datasets: names.map((name, i) => ({
+            label: name,
+            data: series[i],
+            borderWidth: 1.5,
+          }))
+        },
+        options: {
+          responsive: true,
+          maintainAspectRatio: false,
+          animation: false,
+        }
+      });
+    }
+
+    // Copia de una columna (las graficas modifican sus arrays al anadir filas)
+    function series(table, name) {
+      return table.cols[name] ? table.cols[name].slice() : new Array(table.n).fill(null);
+    }
+
+    function updateCharts(table) {
       const gpsCtx = document.getElementById("gpsChart").getContext("2d");
       const windCtx = document.getElementById("windChart").getContext("2d");
 
-      const labels = telemetryData.map(d => d.timestamp_iso);
-      const sogSeries = telemetryData.map(d => d.sog_kn);
-      const cogSeries = telemetryData.map(d => d.hdg_deg);
-
-      const windSpdSeries = telemetryData.map(d => d.wind_speed_kn);
-      const windDirSeries = telemetryData.map(d => d.wind_dir_deg);
+      const labels = table.t.map(timeLabel);
 
       // Crear / actualizar grafico GPS
       if (!gpsChart) {
-        gpsChart = new Chart(gpsCtx, {
-          type: "line",
-          data: {
-            labels: labels,
-            datasets: [
-              {
-                label: "SOG (kn)",
-                data: sogSeries,
-                borderWidth: 1.5,
-              },
-              {
-                label: "COG (º)",
-                data: cogSeries,
-                borderWidth: 1.5,
-              }
-            ]
-          },
-          options: {
-            responsive: true,
-            maintainAspectRatio: false,
-          }
-        });
+        gpsChart = makeChart(gpsCtx, labels, GPS_FIELDS.map(f => series(table, f)), ["SOG (kn)", "COG (º)"]);
       } else {
         gpsChart.data.labels = labels;
-        gpsChart.data.datasets[0].data = sogSeries;
-        gpsChart.data.datasets[1].data = cogSeries;
+        GPS_FIELDS.forEach((f, i) => { gpsChart.data.datasets[i].data = series(table, f); });
         gpsChart.update();
       }
 
       // Crear / actualizar grafico viento
       if (!windChart) {
-        windChart = new Chart(windCtx, {
-          type: "line",
-          data: {
-            labels: labels,
-            datasets: [
-              {
-                label: "Viento (kn)",
-                data: windSpdSeries,
-                borderWidth: 1.5,
-              },
-              {
-                label: "Direccion (º)",
-                data: windDirSeries,
-                borderWidth: 1.5,
-              }
-            ]
-          },
-          options: {
-            responsive: true,
-            maintainAspectRatio: false,
-          }
-        });
+        windChart = makeChart(windCtx, labels.slice(), WIND_FIELDS.map(f => series(table, f)), ["Viento (kn)", "Direccion (º)"]);
       } else {
-        windChart.data.labels = labels;
-        windChart.data.datasets[0].data = windSpdSeries;
-        windChart.data.datasets[1].data = windDirSeries;
+        windChart.data.labels = labels.slice();
+        WIND_FIELDS.forEach((f, i) => { windChart.data.datasets[i].data = series(table, f); });
         windChart.update();
       }
     }
 
+    // Quita 'drop' puntos del principio y 'cut' del final, y anade las filas de 'added'
+    function spliceChart(chart, drop, cut, added, fields) {
+      const arrays = [chart.data.labels, ...chart.data.datasets.map(ds => ds.data)];
+      for (const arr of arrays) {
+        if (cut > 0) arr.splice(arr.length - cut, cut);
+        if (drop > 0) arr.splice(0, drop);
+      }
+      chart.data.labels.push(...added.t.map(timeLabel));
+      fields.forEach((f, i) => chart.data.datasets[i].data.push(...series(added, f)));
+      chart.update("none");
+    }
+
+    // Aplica el mismo recorte a todas las columnas de la tabla
+    function spliceTable(table, drop, cut, added) {
+      const names = Object.keys(table.cols);
+      for (const arr of [table.t, ...names.map(name => table.cols[name])]) {
+        if (cut > 0) arr.splice(arr.length - cut, cut);
+        if (drop > 0) arr.splice(0, drop);
+      }
+      table.t.push(...added.t);
+      for (const name of names) table.cols[name].push(...series(added, name));
+      table.n = table.t.length;
+    }
+
+    function appendTable(added) {
+      // Con rollups el ultimo bucket vuelve a llegar recalculado: se sustituye
+      const first = added.t[0];
+      let cut = 0;
+      while (cut < telemetry.n && telemetry.t[telemetry.n - 1 - cut] >= first) cut++;
+
+      // Con un rango en horas se descarta lo que ya ha salido de la ventana
+      let drop = 0;
+      const hoursValue = hoursSelect.value;
+      if (hoursValue) {
+        const tMin = Date.now() / 1000 - parseFloat(hoursValue) * 3600;
+        while (drop < telemetry.n - cut && telemetry.t[drop] < tMin) drop++;
+      }
+
+      spliceTable(telemetry, drop, cut, added);
+      spliceChart(gpsChart, drop, cut, added, GPS_FIELDS);
+      spliceChart(windChart, drop, cut, added, WIND_FIELDS);
+      updateCards(telemetry);
+    }
+
+    function telemetryUrl(after) {
+      const hoursValue = hoursSelect.value;
+      const hoursParam = hoursValue ? `&hours=${hoursValue}` : "";
+      const afterParam = after != null ? `&after=${after}` : "";
+      return `/api/telemetry?format=${PAYLOAD_FORMAT}&points=${CHART_POINTS}&max_points=${CHART_MAX_POINTS}`
+        + hoursParam + afterParam;
+    }
+
     async function cargarDatosYActualizar() {
+      const gen = ++loadGeneration;
       try {
-        const hoursValue = hoursSelect.value;
-        const hoursParam = hoursValue ? `?hours=${hoursValue}` : "";
+        const table = await fetchTable(telemetryUrl(null));
+        if (gen !== loadGeneration) return;
+        telemetry = table;
 
-        const telemetryData = await fetchJson("/api/telemetry" + hoursParam);
-
-        updateCards(telemetryData);
-        updateCharts(telemetryData);
+        updateCards(telemetry);
+        updateCharts(telemetry);
       } catch (err) {
         console.error("Error cargando datos:", err);
       }
     }
 
+    let refreshing = false;
+
+    async function refrescarIncremental() {
+      if (refreshing) return;
+      if (!gpsChart || telemetry.n === 0) {
+        return cargarDatosYActualizar();
+      }
+      refreshing = true;
+      const gen = loadGeneration;
+      try {
+        const after = telemetry.t[telemetry.n - 1];
+        const added = await fetchTable(telemetryUrl(after));
+        if (gen !== loadGeneration || added.n === 0) return;
+        if (added.resolution !== telemetry.resolution || telemetry.n + added.n > 2 * CHART_MAX_POINTS) {
+          // Otra resolucion de agregado, o la cola sin reducir ya pesa tanto
+          // como el rango entero: recarga completa (reducida por el servidor)
+          await cargarDatosYActualizar();
+        } else {
+          appendTable(added);
+        }
+      } catch (err) {
+        console.error("Error refrescando datos:", err);
+      } finally {
+        refreshing = false;
+      }
+    }
+
+    // Filas fusionadas empujadas por main.py (SSE): actualizan las tarjetas al momento
+    function onLiveRow(row) {
+      lastLive = Date.now();
+      const fmt = (v, d) => (v != null ? v.toFixed(d) : null);
+      const set = (id, text) => { document.getElementById(id).textContent = text; };
+
+      if (row.lat != null && row.lon != null) set("posMetric", `${row.lat.toFixed(5)}, ${row.lon.toFixed(5)}`);
+      set("altMetric", `Altitud: ${fmt(row.alt, 1) ?? "N/D"} m`);
+      set("sogMetric", `SOG: ${fmt(row.sog, 2) ?? "N/D"} kn`);
+      set("cogMetric", `COG: ${fmt(row.cog, 1) ?? "N/D"}º`);
+      set("windSpdMetric", row.wind_speed != null ? `${row.wind_speed.toFixed(1)} kn` : "-");
+      set("windDirMetric", `Direccion: ${fmt(row.wind_angle, 0) ?? "N/D"}º`);
+    }
+
+    if (window.EventSource) {
+      const stream = new EventSource("/api/stream");
+      stream.onmessage = (ev) => onLiveRow(JSON.parse(ev.data));
+    }
+
     hoursSelect.addEventListener("change", () => {
       cargarDatosYActualizar();
     });
 
     // Cargar al entrar
     cargarDatosYActualizar();
-    // Refrescar cada 30 s
-    setInterval(cargarDatosYActualizar, 30000);
+    // Refrescar cada 2 s pidiendo solo las filas nuevas
+    setInterval(refrescarIncremental, 2000);
   </script>
 </body>
 </html>
@@ -478,5 +1128,6 @@ def index():
 # -------------------------------------------------------------------
 
 if __name__ == "__main__":
-    # Escuchar en todas las interfaces, puerto 8501
-    app.run(host="0.0.0.0", port=8501, debug=False)
+    # Escuchar en todas las interfaces, puerto 8501 (un hilo por peticion:
+    # cada navegador conectado a /api/stream ocupa uno)
+    app.run(host="0.0.0.0", port=8501, debug=False, threaded=True)
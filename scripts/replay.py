@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+replay.py
+
+Reproduce grabaciones reales a través del código real de main.py
+(mavlink_loop, wind_loop, fusion_loop y el escritor de DB), más rápido que
+en tiempo real si se quiere, para reproducir problemas de campo y dar carga
+al sistema en un portátil.
+
+Entradas:
+  --mavlink RUTA   tlog de storage/tlog.py (fichero o carpeta) o .tlog estándar
+  --n2k RUTA       flujo binario del NGT-1 (bench_actisense.py --record) o
+                   salida de 'analyzer -json' (una línea JSON por mensaje)
+  --synthetic S    sin grabaciones: S segundos sintéticos de ambos (los
+                   flujos de bench_tlog.py y bench_actisense.py)
+
+Los puertos serie se sustituyen por pseudoterminales (o UDP local para
+MAVLink con --mavlink-link udp, que puede perder paquetes a --speed max).
+Con la salida de analyzer, actisense-serial y analyzer se sustituyen por
+'cat', de forma que se ejercita el camino real de subprocesos de
+wind_manager. La base de datos va a un directorio temporal.
+
+Al final se informa del rendimiento sostenido de cada fuente y de dónde se
+fue el tiempo: por etapa (llamadas y µs/llamada) y CPU por hilo.
+
+Uso (desde la raíz del proyecto):
+
+    python scripts/replay.py --mavlink storage/tlog --n2k viento.bin --speed 10
+    python scripts/replay.py --synthetic 600 --speed max
+    python scripts/replay.py --n2k analyzer.jsonl --speed 1
+"""
+
+import os
+import sys
+import tty
+import json
+import time
+import socket
+import calendar
+import argparse
+import tempfile
+import threading
+import functools
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from pymavlink import mavutil
+
+import main as sailbridge
+from core import actisense, database, n2k_dispatch, wind_manager, mavlink_manager, state_manager
+from core import latency, supervisor
+from storage import db as storage_db, shards, tlog
+
+
+# ----------------------------------------------------------
+# LECTURA DE GRABACIONES: listas de (t, bytes)
+# ----------------------------------------------------------
+
+def cargar_mavlink(ruta):
+    """Tlog de storage/tlog.py (fichero o carpeta) o .tlog estándar (t_us + paquete)."""
+    if os.path.isdir(ruta):
+        ficheros = [p for _, p in tlog.list_files(ruta)]
+    else:
+        ficheros = [ruta]
+    try:
+        return [(t_us / 1e6, data) for p in ficheros for t_us, data in tlog.iter_records(p)]
+    except ValueError:
+        pass
+
+    log = mavutil.mavlink_connection(ruta, notimestamps=False)
+    salida = []
+    while True:
+        msg = log.recv_msg()
+        if msg is None:
+            break
+        if msg.get_type() != "BAD_DATA":
+            salida.append((msg._timestamp, msg.get_msgbuf()))
+    return salida
+
+
+def cargar_n2k(ruta):
+    """(t, bytes, formato): flujo binario del NGT-1 o líneas JSON de analyzer."""
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    if datos.lstrip()[:1] == b"{":
+        return lineas_analyzer(datos.splitlines(keepends=True)), "analyzer"
+    return tramas_ngt1(datos), "native"
+
+
+def tramas_ngt1(datos):
+    """Separa el flujo en tramas y usa el reloj del NGT-1 (ms, 32 bits) como tiempo."""
+    parser = actisense.FrameParser()
+    salida = []
+    base = 0
+    anterior = None
+    for msg in parser.feed(datos):
+        if anterior is not None and msg.timestamp_ms < anterior:
+            base += 1 << 32
+        anterior = msg.timestamp_ms
+        trama = actisense.encode_n2k(msg.pgn, msg.data, msg.prio, msg.src, msg.dst, msg.timestamp_ms)
+        salida.append(((base + msg.timestamp_ms) / 1000.0, trama))
+    return salida
+
+
+def lineas_analyzer(lineas):
+    """Usa el campo 'timestamp' de cada línea (AAAA-MM-DD-HH:MM:SS.mmm) como tiempo."""
+    salida = []
+    t = 0.0
+    for linea in lineas:
+        try:
+            ts = json.loads(linea)["timestamp"]
+            segundos, _, ms = ts.partition(".")
+            t = calendar.timegm(time.strptime(segundos, "%Y-%m-%d-%H:%M:%S")) + float("0." + (ms or "0"))
+        except (ValueError, KeyError):
+            pass
+        salida.append((t, linea))
+    return salida
+
+
+def sinteticos(segundos, decodificador):
+    from scripts.bench_tlog import mensajes
+    from scripts.bench_actisense import generar_flujo
+
+    mav = mavutil.mavlink.MAVLink(None, srcSystem=1, srcComponent=1)
+    mavlink = [(t, paquete) for t, _, paquete in mensajes(segundos, 100)]
+    latidos = [(mavlink[0][0] + s, mav.heartbeat_encode(10, 3, 0, 0, 4).pack(mav)) for s in range(int(segundos))]
+    mavlink = sorted(mavlink + latidos, key=lambda e: e[0])
+
+    flujo, lineas, _ = generar_flujo(segundos, 10)
+    if decodificador == "analyzer":
+        return mavlink, lineas_analyzer(lineas), "analyzer"
+    return mavlink, tramas_ngt1(flujo), "native"
+
+
+# ----------------------------------------------------------
+# INSTRUMENTACIÓN
+# ----------------------------------------------------------
+
+# (etapa, objeto, atributo, nivel): el nivel 1 va dentro de la etapa anterior de nivel 0
+ETAPAS = [
+    ("mavlink: recv_msg (lectura + parse)", mavutil.mavfile, "recv_msg", 0),
+    ("mavlink: recv_msg UDP (lectura + parse)", mavutil.mavudp, "recv_msg", 0),
+    ("mavlink: procesar_mensaje", mavlink_manager, "procesar_mensaje", 0),
+    ("mavlink: StreamMonitor.observe", mavlink_manager.StreamMonitor, "observe", 0),
+    ("n2k: FrameParser.feed", actisense.FrameParser, "feed", 0),
+    ("n2k: dispatch (extractor + manejador)", n2k_dispatch, "dispatch", 0),
+    ("db: insert_sample (encolar muestra cruda)", database, "insert_sample", 1),
+    ("analyzer: viento_de_json", wind_manager, "viento_de_json", 0),
+    ("viento: enviar_viento (MWV + estado)", wind_manager, "enviar_viento", 0),
+    ("fusión: emit_row", state_manager, "emit_row", 0),
+    ("db: _write_batch (commit telemetria y muestras)", database, "_write_batch", 0),
+    ("storage.db.write_samples (commit muestras)", storage_db, "write_samples", 1),
+]
+
+medidas = {nombre: [0, 0.0, 0] for nombre, _, _, _ in ETAPAS}   # llamadas, segundos, no vacías
+
+
+def instrumentar():
+    for nombre, objeto, attr, _ in ETAPAS:
+        original = getattr(objeto, attr)
+        m = medidas[nombre]
+
+        def envoltorio(*args, _original=original, _m=m, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                r = _original(*args, **kwargs)
+            finally:
+                _m[0] += 1
+                _m[1] += time.perf_counter() - t0
+            if r:
+                _m[2] += 1
+            return r
+
+        setattr(objeto, attr, functools.wraps(original)(envoltorio))
+
+
+def cpu_hilos():
+    """Segundos de CPU (usuario + sistema) de cada hilo vivo, leídos de /proc."""
+    tick = os.sysconf("SC_CLK_TCK")
+    cpu = {}
+    for hilo in threading.enumerate():
+        try:
+            with open(f"/proc/self/task/{hilo.native_id}/stat") as f:
+                campos = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        cpu[hilo.name] = (int(campos[11]) + int(campos[12])) / tick
+    return cpu
+
+
+# ----------------------------------------------------------
+# REPRODUCCIÓN
+# ----------------------------------------------------------
+
+def pty():
+    maestro, esclavo = os.openpty()
+    tty.setraw(esclavo)
+    return maestro, esclavo, os.ttyname(esclavo)
+
+
+def reproducir(eventos, escribir, velocidad, estado):
+    """Escribe cada evento cuando le toca según su tiempo grabado / velocidad."""
+    t_rec0 = eventos[0][0]
+    t0 = time.monotonic()
+    estado["inicio"] = time.time()
+    for t, datos in eventos:
+        if velocidad:
+            espera = t0 + (t - t_rec0) / velocidad - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+        escribir(datos)
+        estado["enviados"] += 1
+    estado["fin"] = time.time()
+
+
+def vaciar(fd, contador=None):
+    """Lee y descarta lo que el sistema escribe hacia el dispositivo (MWV, peticiones)."""
+    while True:
+        try:
+            datos = os.read(fd, 4096)
+        except OSError:
+            return
+        if not datos:
+            return
+        if contador is not None:
+            contador[0] += datos.count(b"$WIMWV")
+
+
+def procesados():
+    mav = medidas["mavlink: recv_msg (lectura + parse)"][2] + medidas["mavlink: recv_msg UDP (lectura + parse)"][2]
+    return (mav, medidas["n2k: dispatch (extractor + manejador)"][0],
+            medidas["analyzer: viento_de_json"][0], medidas["viento: enviar_viento (MWV + estado)"][0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce grabaciones MAVLink/NMEA2000 a través de main.py.")
+    parser.add_argument("--mavlink", help="tlog (storage/tlog.py o estándar)")
+    parser.add_argument("--n2k", help="flujo binario del NGT-1 o líneas JSON de analyzer")
+    parser.add_argument("--synthetic", type=float, help="segundos sintéticos en lugar de grabaciones")
+    parser.add_argument("--decoder", choices=("native", "analyzer"), default="native",
+                        help="decodificador NMEA2000 con --synthetic")
+    parser.add_argument("--speed", default="1", help="factor de aceleración (1, 10...) o 'max'")
+    parser.add_argument("--mavlink-link", choices=("pty", "udp"), default="pty")
+    parser.add_argument("--startup", type=float, default=3.0, help="segundos de arranque antes de reproducir")
+    args = parser.parse_args()
+
+    velocidad = None if args.speed == "max" else float(args.speed)
+    if args.synthetic:
+        mavlink, n2k, formato = sinteticos(args.synthetic, args.decoder)
+    else:
+        mavlink = cargar_mavlink(args.mavlink) if args.mavlink else []
+        n2k, formato = cargar_n2k(args.n2k) if args.n2k else ([], "native")
+    if not mavlink and not n2k:
+        parser.error("indica --mavlink, --n2k o --synthetic")
+
+    for nombre, eventos in (("MAVLink", mavlink), ("NMEA2000", n2k)):
+        if eventos:
+            print(f"[INFO] {nombre}: {len(eventos):,} mensajes, {eventos[-1][0] - eventos[0][0]:.0f} s grabados")
+    print(f"[INFO] Velocidad: {'max' if velocidad is None else f'{velocidad:g}x'}, decodificador NMEA2000: {formato}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "telemetria_core.db")
+        storage_db.DB_PATH = shards.LEGACY_DB_PATH = os.path.join(tmp, "telemetria.db")
+        shards.SHARD_DIR = os.path.join(tmp, "shards")
+        latency.LATENCY_METRICS_PATH = os.path.join(tmp, "latency.json")
+        supervisor.SUPERVISOR_METRICS_PATH = os.path.join(tmp, "supervisor.json")
+        database.init_db()
+
+        # Dispositivos sustitutos
+        hilos_aux = []
+        mwv = [0]
+        n2k_m, n2k_s, n2k_nombre = pty()
+        out_m, out_s, out_nombre = pty()
+        wind_manager.PORT_WIND_IN, wind_manager.PORT_WIND_OUT = n2k_nombre, out_nombre
+        wind_manager.WIND_DECODER = formato
+        wind_manager.limpiar_procesos = lambda: None    # no matar procesos del sistema real
+        hilos_aux.append(threading.Thread(target=vaciar, args=(out_m, mwv), name="ReplayMWV", daemon=True))
+        if formato == "analyzer":
+            # actisense-serial PUERTO -> cat PUERTO ; analyzer -json -> cat
+            bin_dir = os.path.join(tmp, "bin")
+            os.makedirs(bin_dir)
+            for nombre, guion in (("actisense-serial", 'exec cat "$1"'), ("analyzer", "exec cat")):
+                ruta = os.path.join(bin_dir, nombre)
+                with open(ruta, "w") as f:
+                    f.write(f"#!/bin/sh\n{guion}\n")
+                os.chmod(ruta, 0o755)
+            os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+        else:
+            hilos_aux.append(threading.Thread(target=vaciar, args=(n2k_m,), name="ReplayNGT1", daemon=True))
+
+        if args.mavlink_link == "udp":
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.bind(("127.0.0.1", 0))
+                puerto = s.getsockname()[1]
+            mavlink_manager.PORT_MAVLINK = f"udpin:127.0.0.1:{puerto}"
+            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            escribir_mavlink = lambda datos: udp.sendto(datos, ("127.0.0.1", puerto))
+        else:
+            mav_m, mav_s, mav_nombre = pty()
+            mavlink_manager.PORT_MAVLINK = mav_nombre
+            escribir_mavlink = lambda datos: os.write(mav_m, datos)
+            hilos_aux.append(threading.Thread(target=vaciar, args=(mav_m,), name="ReplayMavOut", daemon=True))
+
+        instrumentar()
+        for h in hilos_aux:
+            h.start()
+        sailbridge.start_threads(archive=False)
+        time.sleep(args.startup)
+
+        # Reproducción
+        estados = {}
+        alimentadores = []
+        if mavlink:
+            estados["MAVLink"] = {"enviados": 0}
+            alimentadores.append(threading.Thread(
+                target=reproducir, args=(mavlink, escribir_mavlink, velocidad, estados["MAVLink"]),
+                name="ReplayMAVLink", daemon=True))
+        if n2k:
+            estados["NMEA2000"] = {"enviados": 0}
+            alimentadores.append(threading.Thread(
+                target=reproducir, args=(n2k, lambda datos: os.write(n2k_m, datos), velocidad, estados["NMEA2000"]),
+                name="ReplayNMEA2000", daemon=True))
+
+        cpu0 = cpu_hilos()
+        t_inicio = time.time()
+        for h in alimentadores:
+            h.start()
+        for h in alimentadores:
+            h.join()
+
+        # Esperar a que el sistema termine de procesar lo enviado (1 s sin cambios)
+        ultimo, t_ultimo = procesados(), time.time()
+        while time.time() - t_ultimo < 1.0:
+            time.sleep(0.1)
+            actual = procesados()
+            if actual != ultimo:
+                ultimo, t_ultimo = actual, time.time()
+        t_fin = t_ultimo
+        cpu1 = cpu_hilos()
+        # La fusión seguiría escribiendo en la BD temporal después de borrarla
+        state_manager.emit_row = lambda *args, **kwargs: None
+        database.flush_and_stop()
+
+    # Informe
+    duracion = t_fin - t_inicio
+    print(f"\n[OK] Reproducción completa en {duracion:.1f} s")
+    grabados = {"MAVLink": mavlink, "NMEA2000": n2k}
+    for nombre, estado in estados.items():
+        eventos = grabados[nombre]
+        grabado = eventos[-1][0] - eventos[0][0]
+        envio = estado["fin"] - estado["inicio"]
+        print(f"[{nombre}] {estado['enviados']:,} mensajes enviados en {envio:.1f} s "
+              f"({estado['enviados'] / envio:,.0f}/s, x{grabado / envio:.1f} tiempo real)")
+    mav_ok, n2k_ok, json_ok, viento = procesados()
+    if mavlink:
+        print(f"[MAVLink]  {mav_ok:,} mensajes decodificados -> {mav_ok / duracion:,.0f}/s sostenidos")
+        if mav_ok < len(mavlink):
+            print(f"[WARN] {len(mavlink) - mav_ok:,} mensajes MAVLink perdidos (¿UDP a más velocidad de la que se procesa?)")
+    if n2k:
+        recibidos = n2k_ok if formato == "native" else json_ok
+        print(f"[NMEA2000] {recibidos:,} mensajes procesados -> {recibidos / duracion:,.0f}/s sostenidos, "
+              f"{viento:,} de viento, {mwv[0]:,} MWV enviadas")
+    print(f"[DB]       {database.stats['written']:,} filas en telemetria, {database.stats['dropped']:,} descartadas")
+
+    cpu_total = sum(cpu1.get(h, 0) - cpu0.get(h, 0) for h in cpu1)
+    print(f"\nTiempo por etapa (CPU total del proceso {cpu_total:.2f} s en {duracion:.1f} s):")
+    for nombre, _, _, nivel in ETAPAS:
+        llamadas, segundos, _ = medidas[nombre]
+        if not llamadas:
+            continue
+        sangria = "    └ " if nivel else "  "
+        print(f"{sangria}{nombre:{40 - len(sangria) + 2}s} {llamadas:10,} llamadas  {segundos:7.2f} s  "
+              f"{segundos / llamadas * 1e6:8.1f} µs/llamada")
+    print("\nCPU por hilo:")
+    for hilo in sorted(cpu1, key=lambda h: cpu0.get(h, 0) - cpu1[h]):
+        seg = cpu1[hilo] - cpu0.get(hilo, 0)
+        if seg > 0:
+            print(f"  {hilo:22s} {seg:7.2f} s  ({seg / duracion * 100:5.1f}% de un núcleo)")
+
+    saltos = latency.summary()
+    if saltos:
+        print(f"\nLatencia por salto (presupuesto {latency.LATENCY_BUDGET_MS} ms):")
+        for salto, s in saltos.items():
+            print(f"  {salto:14s} {s['count']:10,} muestras  p50 {s['p50_ms']:8.2f} ms  p99 {s['p99_ms']:8.2f} ms  "
+                  f"máx {s['max_ms']:8.2f} ms  {s['over_budget']:,} fuera de presupuesto")
+
+
+if __name__ == "__main__":
+    main()
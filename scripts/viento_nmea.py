@@ -6,6 +6,8 @@ import time
 import logging
 import serial
 from storage import db
+from core import nmea0183
+from core.mwv_output import MwvOutput
 # ----------------------------------------------------------
 # CONFIGURACIÓN
 # ----------------------------------------------------------
@@ -35,21 +37,6 @@ PRINT_INTERVAL = 5.0       # segundos
 # FUNCIONES AUXILIARES
 # ----------------------------------------------------------
 
-def nmea_checksum(sentence):
-    """Calcula checksum NMEA (parte después del '$')."""
-    c = 0
-    for ch in sentence:
-        c ^= ord(ch)
-    return "{:02X}".format(c)
-
-
-def build_mwv_sentence(wind_dir_deg, wind_speed_knots):
-    """Construye frase MWV completa con *checksum*."""
-    body = f"WIMWV,{wind_dir_deg:.1f},R,{wind_speed_knots:.1f},N,A"
-    checksum = nmea_checksum(body)
-    return f"${body}*{checksum}"
-
-
 def print_wind_status():
     """Muestra estado cada 5 segundos."""
     if last_wind_dir is None or last_wind_speed is None:
@@ -79,12 +66,16 @@ def main():
     
     # Abrir UART hacia la Pixhawk
     try:
-        ser = serial.Serial(PIXHAWK_DEV, PIXHAWK_BAUD, timeout=1)
+        ser = serial.Serial(PIXHAWK_DEV, PIXHAWK_BAUD, timeout=1, write_timeout=0)
         logging.info(f"Puerto serie abierto: {PIXHAWK_DEV} @ {PIXHAWK_BAUD}")
     except Exception as e:
         logging.error(f"No se pudo abrir {PIXHAWK_DEV}: {e}")
         return
 
+    # Salida MWV: solo el último viento, a ritmo fijo y sin bloquear la lectura
+    salida = MwvOutput(ser.write, nmea0183.mwv, queue_depth=lambda: ser.out_waiting,
+                       baud=PIXHAWK_BAUD).start()
+
     # Lanzar actisense-serial y analyzer (NMEA2000 → JSON)
     try:
         p1 = subprocess.Popen(
@@ -139,8 +130,7 @@ def main():
                 last_wind_speed = wind_speed_knots
 
                 # Enviar MWV a Pixhawk
-                mwv = build_mwv_sentence(wind_dir_deg, wind_speed_knots)
-                ser.write(mwv.encode("ascii") + b"\r\n")
+                salida.submit(wind_dir_deg, wind_speed_knots)
 
                 # Imprimir cada 5 s
                 #now = time.time()
@@ -154,6 +144,7 @@ def main():
 
     finally:
         conn.close()
+        salida.stop()
         logging.info("Finalizando módulo de viento.")
         try:
             if ser.is_open:
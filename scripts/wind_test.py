@@ -5,6 +5,11 @@ import math
 import time
 import logging
 import serial
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import nmea0183
 
 # --- CONFIGURACIÓN ---
 ACTISENSE_PORT = "/dev/ttyUSB0"    # Veleta -> Raspberry
@@ -17,19 +22,6 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 
-def nmea_checksum(sentence):
-    """Calcula el checksum XOR para NMEA."""
-    c = 0
-    for ch in sentence:
-        c ^= ord(ch)
-    return "{:02X}".format(c)
-
-def build_mwv_sentence(wind_dir_deg, wind_speed_knots):
-    """Construye la frase $WIMWV."""
-    body = f"WIMWV,{wind_dir_deg:.1f},R,{wind_speed_knots:.1f},N,A"
-    checksum = nmea_checksum(body)
-    return f"${body}*{checksum}"
-
 def main():
     print("-" * 50)
     print("SISTEMA DE MONITOREO DE VIENTO (NMEA2000 -> PIXHAWK)")
@@ -72,12 +64,12 @@ def main():
                 angle_deg = math.degrees(angle_rad) % 360
 
                 # Enviar a Pixhawk
-                mwv = build_mwv_sentence(angle_deg, speed_kn)
-                ser.write((mwv + "\r\n").encode("ascii"))
+                mwv = nmea0183.mwv(angle_deg, speed_kn)
+                ser.write(mwv)
 
                 # --- VISUALIZACIÓN POR PANTALLA ---
                 # Usamos \r y end="" para que se actualice en la misma línea
-                print(f"\r⛵ VIENTO: {angle_deg:5.1f}° | VELOCIDAD: {speed_kn:4.1f} kn | SENTENCIA: {mwv}", end="")
+                print(f"\r⛵ VIENTO: {angle_deg:5.1f}° | VELOCIDAD: {speed_kn:4.1f} kn | SENTENCIA: {mwv.decode().strip()}", end="")
 
     except KeyboardInterrupt:
         print("\n\nDeteniendo prueba...")
@@ -6,6 +6,7 @@ import time
 import logging
 import serial
 from storage import db  # Mantenemos tu conexión a base de datos
+from core import nmea0183
 
 # ----------------------------------------------------------
 # CONFIGURACIÓN ORIGINAL
@@ -25,20 +26,6 @@ logging.basicConfig(
     format="%(asctime)s [WIND-DB] %(message)s"
 )
 
-# ----------------------------------------------------------
-# FUNCIONES AUXILIARES
-# ----------------------------------------------------------
-def nmea_checksum(sentence):
-    c = 0
-    for ch in sentence:
-        c ^= ord(ch)
-    return "{:02X}".format(c)
-
-def build_mwv_sentence(wind_dir_deg, wind_speed_knots):
-    body = f"WIMWV,{wind_dir_deg:.1f},R,{wind_speed_knots:.1f},N,A"
-    checksum = nmea_checksum(body)
-    return f"${body}*{checksum}"
-
 # ----------------------------------------------------------
 # PROCESO PRINCIPAL
 # ----------------------------------------------------------
@@ -102,11 +89,11 @@ def main():
                         last_db_save = now
                     
                     # B. Enviar MWV a Pixhawk
-                    mwv = build_mwv_sentence(wind_dir_deg, wind_speed_knots)
-                    ser.write((mwv + "\r\n").encode("ascii"))
+                    mwv = nmea0183.mwv(wind_dir_deg, wind_speed_knots)
+                    ser.write(mwv)
 
                     # C. VISUALIZACIÓN EN UNA LÍNEA (Tu petición)
-                    print(f"\r⛵ DIR: {wind_dir_deg:5.1f}° | VEL: {wind_speed_knots:4.1f} kn | DB: OK | SENTENCIA: {mwv}", end="")
+                    print(f"\r⛵ DIR: {wind_dir_deg:5.1f}° | VEL: {wind_speed_knots:4.1f} kn | DB: OK | SENTENCIA: {mwv.decode().strip()}", end="")
 
                 except Exception as e:
                     continue
@@ -2,7 +2,9 @@
 import time
 import random
 import logging
-from core.database import insert_data
+from core.database import insert_data, flush_and_stop
+from core.live_buffer import start_publisher, publish, stop_publisher
+from core import live_stream
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [SIM] %(message)s")
 
@@ -33,6 +35,8 @@ def simulate_sailing():
         }
 
         try:
+            publish(data)
+            live_stream.publish(data)
             insert_data(data)
             logging.info(f"Insertado: Roll {data['roll']}° | Wind {data['wind_angle']}°")
         except Exception as e:
@@ -41,4 +45,13 @@ def simulate_sailing():
         time.sleep(1) # Frecuencia de 1Hz
 
 if __name__ == "__main__":
-    simulate_sailing()
+    start_publisher()
+    live_stream.start_stream()
+    try:
+        simulate_sailing()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        flush_and_stop()
+        stop_publisher()
+        live_stream.stop_stream()
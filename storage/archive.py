@@ -0,0 +1,354 @@
+import sys
+import time
+import math
+import heapq
+import bisect
+import struct
+import logging
+
+from config import ARCHIVE_AFTER_HOURS, ARCHIVE_INTERVAL
+from core.database import get_connection
+from storage import shards
+
+# Un bloque = una tabla (stream) x un minuto de muestras
+BLOCK_SECONDS = 60
+
+# Columnas que no se guardan en el bloque: id no tiene sentido fuera de la
+# tabla y timestamp_text se regenera a partir de timestamp_utc
+_SKIPPED = ("id", "timestamp_utc", "timestamp_text")
+
+_BLOCK_VERSION = 1
+_HEADER = struct.Struct(">BIB")   # versión, filas, columnas
+_LEN = struct.Struct(">I")
+
+# Delta-of-delta de timestamps (µs): (prefijo, bits de prefijo, bits de valor)
+_DOD_BUCKETS = (
+    (0b10, 2, 7),
+    (0b110, 3, 14),
+    (0b1110, 4, 20),
+    (0b1111, 4, 64),
+)
+
+
+# ============================================================
+#   FLUJO DE BITS
+# ============================================================
+class _BitWriter:
+    def __init__(self):
+        self.buf = bytearray()
+        self.acc = 0
+        self.n = 0
+
+    def write(self, value, nbits):
+        self.acc = (self.acc << nbits) | (value & ((1 << nbits) - 1))
+        self.n += nbits
+        while self.n >= 8:
+            self.n -= 8
+            self.buf.append((self.acc >> self.n) & 0xFF)
+        self.acc &= (1 << self.n) - 1
+
+    def getvalue(self):
+        if self.n:
+            return bytes(self.buf) + bytes([(self.acc << (8 - self.n)) & 0xFF])
+        return bytes(self.buf)
+
+
+class _BitReader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, nbits):
+        start = self.pos >> 3
+        end = (self.pos + nbits + 7) >> 3
+        chunk = int.from_bytes(self.data[start:end], "big")
+        self.pos += nbits
+        return (chunk >> (end * 8 - self.pos)) & ((1 << nbits) - 1)
+
+
+def _signed(value, nbits):
+    return value - (1 << nbits) if value >> (nbits - 1) else value
+
+
+# ============================================================
+#   CODIFICACIÓN (Gorilla)
+# ============================================================
+def encode_timestamps(ts_us):
+    """Timestamps enteros (µs) con delta-of-delta de longitud variable."""
+    w = _BitWriter()
+    w.write(ts_us[0], 64)
+    prev, prev_delta = ts_us[0], 0
+    for t in ts_us[1:]:
+        delta = t - prev
+        dod = delta - prev_delta
+        if dod == 0:
+            w.write(0, 1)
+        else:
+            for prefix, plen, bits in _DOD_BUCKETS:
+                if -(1 << (bits - 1)) <= dod < (1 << (bits - 1)):
+                    w.write(prefix, plen)
+                    w.write(dod, bits)
+                    break
+        prev, prev_delta = t, delta
+    return w.getvalue()
+
+
+def decode_timestamps(data, n):
+    r = _BitReader(data)
+    t = r.read(64)
+    out = [t]
+    delta = 0
+    for _ in range(n - 1):
+        if r.read(1) == 0:
+            dod = 0
+        else:
+            # Prefijo unario: 10, 110, 1110, 1111
+            bucket = 0
+            while bucket < len(_DOD_BUCKETS) - 1 and r.read(1) == 1:
+                bucket += 1
+            bits = _DOD_BUCKETS[bucket][2]
+            dod = _signed(r.read(bits), bits)
+        delta += dod
+        t += delta
+        out.append(t)
+    return out
+
+
+def encode_floats(values):
+    """Floats (None -> NaN) con XOR respecto al anterior, estilo Gorilla."""
+    n = len(values)
+    bits = struct.unpack(f">{n}Q", struct.pack(f">{n}d", *(math.nan if v is None else v for v in values)))
+
+    w = _BitWriter()
+    w.write(bits[0], 64)
+    prev = bits[0]
+    prev_lead, prev_trail = -1, -1
+    for b in bits[1:]:
+        x = b ^ prev
+        if x == 0:
+            w.write(0, 1)
+        else:
+            lead = min(64 - x.bit_length(), 31)
+            trail = (x & -x).bit_length() - 1
+            if prev_lead >= 0 and lead >= prev_lead and trail >= prev_trail:
+                # Cabe en la ventana de bits significativos anterior
+                w.write(0b10, 2)
+                w.write(x >> prev_trail, 64 - prev_lead - prev_trail)
+            else:
+                sig = 64 - lead - trail
+                w.write(0b11, 2)
+                w.write(lead, 5)
+                w.write(sig - 1, 6)
+                w.write(x >> trail, sig)
+                prev_lead, prev_trail = lead, trail
+        prev = b
+    return w.getvalue()
+
+
+def decode_floats(data, n):
+    r = _BitReader(data)
+    b = r.read(64)
+    bits = [b]
+    lead = trail = 0
+    for _ in range(n - 1):
+        if r.read(1):
+            if r.read(1):
+                lead = r.read(5)
+                sig = r.read(6) + 1
+                trail = 64 - lead - sig
+            b ^= r.read(64 - lead - trail) << trail
+        bits.append(b)
+    values = struct.unpack(f">{n}d", struct.pack(f">{n}Q", *bits))
+    return [None if v != v else v for v in values]
+
+
+def encode_block(ts, columns):
+    """Bloque binario: cabecera + timestamps (µs) + una columna XOR por campo."""
+    parts = [_HEADER.pack(_BLOCK_VERSION, len(ts), len(columns))]
+    for payload in [encode_timestamps([round(t * 1e6) for t in ts])] + [encode_floats(c) for c in columns]:
+        parts.append(_LEN.pack(len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def decode_block(data):
+    """Devuelve (timestamps, [columna, ...]) de un bloque."""
+    version, n, n_cols = _HEADER.unpack_from(data, 0)
+    if version != _BLOCK_VERSION:
+        raise ValueError(f"Versión de bloque desconocida: {version}")
+    pos = _HEADER.size
+    payloads = []
+    for _ in range(n_cols + 1):
+        (length,) = _LEN.unpack_from(data, pos)
+        pos += _LEN.size
+        payloads.append(data[pos:pos + length])
+        pos += length
+    ts = [t / 1e6 for t in decode_timestamps(payloads[0], n)]
+    return ts, [decode_floats(p, n) for p in payloads[1:]]
+
+
+# ============================================================
+#   TABLA DE BLOQUES
+# ============================================================
+def create_block_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sample_blocks (
+        stream     TEXT NOT NULL,
+        t_start    REAL NOT NULL,
+        t_end      REAL NOT NULL,
+        n_samples  INTEGER NOT NULL,
+        columns    TEXT NOT NULL,
+        data       BLOB NOT NULL
+    );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_blocks_time ON sample_blocks(stream, t_start);")
+
+
+def _archived_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})") if row[1] not in _SKIPPED]
+
+
+def compact_shard(conn, cutoff, window_s=3600):
+    """
+    Mueve a sample_blocks las muestras de este shard anteriores a 'cutoff'
+    (alineado a minuto). Trabaja por ventanas de 'window_s' segundos, una
+    transacción cada una, para no retener el bloqueo de escritura.
+    """
+    cutoff = math.floor(cutoff / BLOCK_SECONDS) * BLOCK_SECONDS
+    moved = 0
+    for table in shards.SAMPLE_TABLES:
+        cols = _archived_columns(conn, table)
+        if not cols:
+            continue
+        col_list = ", ".join(cols)
+
+        while True:
+            (t_first,) = conn.execute(
+                f"SELECT MIN(timestamp_utc) FROM {table} WHERE timestamp_utc < ?;", (cutoff,)
+            ).fetchone()
+            if t_first is None:
+                break
+            t_stop = min(cutoff, math.floor(t_first / BLOCK_SECONDS) * BLOCK_SECONDS + window_s)
+
+            rows = conn.execute(
+                f"""
+                SELECT timestamp_utc, {col_list}
+                FROM {table}
+                WHERE timestamp_utc < ?
+                ORDER BY timestamp_utc ASC;
+                """,
+                (t_stop,),
+            ).fetchall()
+
+            blocks = []
+            start = 0
+            while start < len(rows):
+                minute = math.floor(rows[start][0] / BLOCK_SECONDS)
+                end = start
+                while end < len(rows) and math.floor(rows[end][0] / BLOCK_SECONDS) == minute:
+                    end += 1
+                chunk = rows[start:end]
+                ts = [r[0] for r in chunk]
+                columns = [[r[i] for r in chunk] for i in range(1, len(cols) + 1)]
+                blocks.append((table, ts[0], ts[-1], len(ts), ",".join(cols), encode_block(ts, columns)))
+                start = end
+
+            with conn:
+                conn.executemany(
+                    "INSERT INTO sample_blocks (stream, t_start, t_end, n_samples, columns, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?);",
+                    blocks,
+                )
+                conn.execute(f"DELETE FROM {table} WHERE timestamp_utc < ?;", (t_stop,))
+            moved += len(rows)
+    return moved
+
+
+def compact(older_than_hours=None):
+    """Compacta en todos los shards las muestras más antiguas que el umbral."""
+    hours = ARCHIVE_AFTER_HOURS if older_than_hours is None else older_than_hours
+    cutoff = time.time() - hours * 3600
+    moved = 0
+    for start, _, path in shards.shards_for_range(t_max=cutoff):
+        conn = get_connection(path)
+        create_block_table(conn)
+        moved += compact_shard(conn, cutoff)
+    return moved
+
+
+def compactor_loop():
+    """Hilo de fondo: compacta cada ARCHIVE_INTERVAL segundos."""
+    logging.info(f"🗜️ Hilo de archivo iniciado (muestras > {ARCHIVE_AFTER_HOURS} h)")
+    while True:
+        try:
+            moved = compact()
+            if moved:
+                logging.info(f"Archivo: {moved} muestras movidas a bloques comprimidos.")
+        except Exception as e:
+            logging.error(f"Error compactando muestras: {e}")
+        time.sleep(ARCHIVE_INTERVAL)
+
+
+# ============================================================
+#   LECTURA (bloques + filas calientes)
+# ============================================================
+def _timestamp_text(ts):
+    return time.strftime("%a %Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+def read_samples(table, t_min=None, t_max=None, columns=None):
+    """
+    Filas de 'table' en [t_min, t_max], ordenadas por timestamp_utc, uniendo
+    de forma transparente los bloques archivados y las filas calientes.
+
+    'columns' es la lista de columnas a devolver (por defecto todas, como
+    SELECT *); en las filas archivadas id es None.
+    """
+    columns = list(columns or shards.table_columns(table))
+    lo = -math.inf if t_min is None else t_min
+    hi = math.inf if t_max is None else t_max
+
+    hot = shards.query(
+        f"""
+        SELECT {", ".join(columns)}, timestamp_utc
+        FROM {table}
+        WHERE timestamp_utc BETWEEN ? AND ?
+        ORDER BY timestamp_utc ASC;
+        """,
+        (lo, hi),
+        t_min=t_min, t_max=t_max, tables=(table,),
+    )
+
+    def cold():
+        blocks = shards.query(
+            """
+            SELECT columns, data
+            FROM sample_blocks
+            WHERE stream = ? AND t_start <= ? AND t_end >= ?
+            ORDER BY t_start ASC;
+            """,
+            (table, hi, lo),
+            t_min=t_min, t_max=t_max, tables=("sample_blocks",),
+        )
+        for col_names, data in blocks:
+            ts, values = decode_block(data)
+            i0 = bisect.bisect_left(ts, lo)
+            i1 = bisect.bisect_right(ts, hi)
+            if i0 >= i1:
+                continue
+            ts = ts[i0:i1]
+            by_name = {name: v[i0:i1] for name, v in zip(col_names.split(","), values)}
+            by_name["timestamp_utc"] = ts
+            if "timestamp_text" in columns:
+                by_name["timestamp_text"] = [_timestamp_text(t) for t in ts]
+            empty = [None] * len(ts)
+            yield from zip(*(by_name.get(c, empty) for c in columns), ts)
+
+    # Ambas fuentes vienen ordenadas: mezcla por el timestamp añadido al final
+    for row in heapq.merge(cold(), hot, key=lambda r: r[-1]):
+        yield row[:-1]
+
+
+if __name__ == "__main__":
+    horas = float(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(f"[OK] Muestras archivadas: {compact(horas)}")
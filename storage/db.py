@@ -4,6 +4,10 @@ import math
 import logging
 import os
 
+from config import SHARD_PERIOD
+from core.database import get_connection
+from storage import shards, archive
+
 # Directorio donde está este fichero (storage/)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -15,8 +19,20 @@ DB_PATH = os.path.join(BASE_DIR, "telemetria.db")
 #   CONEXIÓN A BASE DE DATOS
 # ============================================================
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.execute("PRAGMA journal_mode=WAL;")
+    """
+    Conexión del hilo actual a telemetria.db, compartida con core.database
+    (misma conexión por hilo y mismo perfil de PRAGMAs, ver config.DB_PRAGMAS).
+    """
+    return get_connection(DB_PATH)
+
+
+def _target_connection(conn, ts_utc):
+    """
+    Con particionado activo (config.SHARD_PERIOD) la muestra se escribe en
+    el shard de su periodo; si no, en la conexión recibida.
+    """
+    if SHARD_PERIOD:
+        return shards.get_shard_connection(ts_utc)
     return conn
 
 
@@ -91,6 +107,40 @@ def init_db(conn):
     """)
     cur.execute("CREATE INDEX IF NOT EXISTS idx_wind_time ON wind_samples(timestamp_utc);")
 
+    # ---------- NAVEGACIÓN NMEA2000 (rumbo, STW, COG/SOG, posición) ----------
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS nav_samples (
+        id             INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp_utc  REAL NOT NULL,
+        timestamp_text TEXT,
+        heading_deg    REAL,
+        deviation_deg  REAL,
+        variation_deg  REAL,
+        stw_ms         REAL,
+        cog_deg        REAL,
+        sog_ms         REAL,
+        lat_deg        REAL,
+        lon_deg        REAL
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_nav_time ON nav_samples(timestamp_utc);")
+
+    # ---------- AMBIENTE NMEA2000 ----------
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS environment_samples (
+        id             INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp_utc  REAL NOT NULL,
+        timestamp_text TEXT,
+        water_temp_c   REAL,
+        air_temp_c     REAL,
+        humidity_pct   REAL,
+        pressure_hpa   REAL
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_env_time ON environment_samples(timestamp_utc);")
+
+    # ---------- ARCHIVO (bloques comprimidos) ----------
+    archive.create_block_table(conn)
 
     conn.commit()
 
@@ -99,8 +149,10 @@ def init_db(conn):
 #   INSERCIÓN DE DATOS GPS
 # ============================================================
 def insert_gps(conn, msg):
-    ts_utc = time.time()
+    # pymavlink marca cada mensaje al recibirlo (_timestamp): esa es su hora
+    ts_utc = getattr(msg, "_timestamp", None) or time.time()
     timestamp_text = time.strftime("%a %Y-%m-%d %H:%M:%S", time.localtime(ts_utc))
+    conn = _target_connection(conn, ts_utc)
 
     try:
         time_boot_s = msg.time_boot_ms / 1000.0
@@ -136,8 +188,9 @@ def insert_gps(conn, msg):
 #   INSERCIÓN DE DATOS ACTITUD
 # ============================================================
 def insert_attitude(conn, msg):
-    ts_utc = time.time()
+    ts_utc = getattr(msg, "_timestamp", None) or time.time()
     timestamp_text = time.strftime("%a %Y-%m-%d %H:%M:%S", time.localtime(ts_utc))
+    conn = _target_connection(conn, ts_utc)
 
     try:
         time_boot_s = msg.time_boot_ms / 1000.0
@@ -161,55 +214,49 @@ def insert_attitude(conn, msg):
 #   INSERCIÓN DE DATOS IMU
 # ============================================================
 def insert_imu(conn, msg):
-    ts_utc = time.time()
-    timestamp_text = time.strftime("%a %Y-%m-%d %H:%M:%S", time.localtime(ts_utc))
+    write_samples([("imu_samples", imu_row(msg))], conn)
 
+
+def imu_row(msg):
+    """Fila de imu_samples de un RAW_IMU (insert_imu o la cola de core.database)."""
+    # RAW_IMU no trae time_boot_ms: su tiempo desde el arranque es time_usec
     try:
-        time_boot_s = msg.time_boot_ms / 1000.0
-    except:
+        time_boot_s = msg.time_usec / 1e6
+    except AttributeError:
         time_boot_s = None
 
-    conn.execute("""
-        INSERT INTO imu_samples (
-            timestamp_utc, timestamp_text, time_boot_s,
-            ax_mg, ay_mg, az_mg,
-            gx_mrad_s, gy_mrad_s, gz_mrad_s
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
-    """, (
-        ts_utc, timestamp_text, time_boot_s,
-        msg.xacc, msg.yacc, msg.zacc,
-        msg.xgyro, msg.ygyro, msg.zgyro
-    ))
-    conn.commit()
+    return sample_row(
+        getattr(msg, "_timestamp", None), time_boot_s=time_boot_s,
+        ax_mg=msg.xacc, ay_mg=msg.yacc, az_mg=msg.zacc,
+        gx_mrad_s=msg.xgyro, gy_mrad_s=msg.ygyro, gz_mrad_s=msg.zgyro,
+    )
 
 # ============================================================
 #   INSERCIÓN DE DATOS VIENTO NMEA
 # ============================================================
-def insert_wind_NMEA(conn, wind_speed_ms, wind_dir_deg, time_boot_s=None, wind_vertical=None):
+def insert_wind_NMEA(conn, wind_speed_ms, wind_dir_deg, time_boot_s=None, wind_vertical=None, ts_utc=None):
     """
     Inserta una muestra de viento a partir de valores simples (no MAVLink),
-    pensada para el flujo NMEA (Actisense + analyzer).
+    pensada para el flujo NMEA (Actisense + analyzer). 'ts_utc' es la hora
+    de lectura de la trama (por defecto, ahora).
     """
-    ts_utc = time.time()
-    timestamp_text = time.strftime("%a %Y-%m-%d %H:%M:%S", time.localtime(ts_utc))
+    write_samples([("wind_samples", wind_nmea_row(wind_speed_ms, wind_dir_deg, time_boot_s, wind_vertical, ts_utc))], conn)
 
-    conn.execute("""
-        INSERT INTO wind_samples (
-            timestamp_utc, timestamp_text, time_boot_s,
-            wind_speed_ms, wind_dir_deg, wind_vertical
-        ) VALUES (?, ?, ?, ?, ?, ?);
-    """, (
-        ts_utc, timestamp_text, time_boot_s,
-        wind_speed_ms, wind_dir_deg, wind_vertical
-    ))
-    conn.commit()
+
+def wind_nmea_row(wind_speed_ms, wind_dir_deg, time_boot_s=None, wind_vertical=None, ts_utc=None):
+    """Fila de wind_samples para insert_wind_NMEA o la cola de core.database."""
+    return sample_row(
+        ts_utc, time_boot_s=time_boot_s,
+        wind_speed_ms=wind_speed_ms, wind_dir_deg=wind_dir_deg, wind_vertical=wind_vertical,
+    )
 
 # ============================================================
 #   INSERCIÓN DE DATOS VIENTO MAVLINK
 # ============================================================
 def insert_wind(conn, msg):
-    ts_utc = time.time()
+    ts_utc = getattr(msg, "_timestamp", None) or time.time()
     timestamp_text = time.strftime("%a %Y-%m-%d %H:%M:%S", time.localtime(ts_utc))
+    conn = _target_connection(conn, ts_utc)
 
     mtype = msg.get_type()
 
@@ -260,6 +307,70 @@ def insert_wind(conn, msg):
     except Exception as e:
         logging.error(f"Error insertando viento ({mtype}): {e}")
 
+# ============================================================
+#   INSERCIÓN DE DATOS NMEA2000 (navegación y ambiente)
+# ============================================================
+NAV_COLUMNS = ("heading_deg", "deviation_deg", "variation_deg", "stw_ms", "cog_deg", "sog_ms", "lat_deg", "lon_deg")
+ENVIRONMENT_COLUMNS = ("water_temp_c", "air_temp_c", "humidity_pct", "pressure_hpa")
+
+
+def _partial_row(allowed, values, ts_utc=None):
+    """Fila con solo las columnas de 'values' (el resto queda NULL)."""
+    return sample_row(ts_utc, **{c: values[c] for c in allowed if c in values})
+
+
+def nav_row(ts_utc=None, **values):
+    """Fila de nav_samples (solo los campos que trae el PGN, p.ej. heading_deg)."""
+    return _partial_row(NAV_COLUMNS, values, ts_utc)
+
+
+def environment_row(ts_utc=None, **values):
+    """Fila de environment_samples (temperaturas en °C, presión en hPa, humedad en %)."""
+    return _partial_row(ENVIRONMENT_COLUMNS, values, ts_utc)
+
+
+def insert_nav(conn, ts_utc=None, **values):
+    """Una muestra de navegación (solo los campos que trae el PGN, p.ej. heading_deg)."""
+    write_samples([("nav_samples", nav_row(ts_utc, **values))], conn)
+
+
+def insert_environment(conn, ts_utc=None, **values):
+    """Una muestra ambiental (temperaturas en °C, presión en hPa, humedad en %)."""
+    write_samples([("environment_samples", environment_row(ts_utc, **values))], conn)
+
+
+# ============================================================
+#   ESCRITURA POR LOTES (cola de core.database)
+# ============================================================
+def sample_row(ts_utc=None, **values):
+    """Fila de una tabla de muestras con su hora 'ts_utc' (por defecto, ahora)."""
+    ts_utc = ts_utc or time.time()
+    timestamp_text = time.strftime("%a %Y-%m-%d %H:%M:%S", time.localtime(ts_utc))
+    return {"timestamp_utc": ts_utc, "timestamp_text": timestamp_text, **values}
+
+
+def write_samples(samples, conn=None):
+    """
+    Escribe una lista de (tabla, fila) con executemany y una sola transacción
+    por BD destino (el shard de cada muestra). Devuelve el número de commits.
+    """
+    # Con shards la BD monolítica no se usa: no se abre (ni se crea) el fichero
+    if conn is None and not SHARD_PERIOD:
+        conn = get_db_connection()
+    targets = {}
+    for table, row in samples:
+        target = _target_connection(conn, row["timestamp_utc"])
+        targets.setdefault(target, {}).setdefault((table, tuple(row)), []).append(row)
+
+    for target, groups in targets.items():
+        with target:
+            for (table, keys), rows in groups.items():
+                target.executemany(
+                    f"INSERT INTO {table} ({', '.join(keys)}) VALUES (:{', :'.join(keys)});", rows
+                )
+    return len(targets)
+
+
 # ============================================================
 #   EJECUCIÓN DIRECTA (crear tablas)
 # ============================================================
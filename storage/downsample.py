@@ -0,0 +1,93 @@
+import numpy as np
+
+from storage.rollups import LINEAR_FIELDS, ANGLE_FIELDS
+
+# Reducción de series para las gráficas conservando su forma:
+#   - Magnitudes (LINEAR_FIELDS): Largest-Triangle-Three-Buckets (LTTB), que
+#     en cada bucket se queda con el punto que forma el triángulo más grande
+#     con el elegido antes y la media del bucket siguiente (picos incluidos).
+#   - Ángulos (ANGLE_FIELDS): mínimo y máximo de cada bucket; LTTB trataría
+#     el salto 359 -> 0 como un pico.
+# Cada serie elige sus índices y se devuelve la unión, con el total acotado
+# a max_points (presupuesto repartido entre las series).
+
+SERIES = tuple(LINEAR_FIELDS) + tuple(ANGLE_FIELDS)
+
+# max_points mínimo para que cada serie tenga al menos 3 puntos (más el
+# primero y el último); por debajo se recorta la unión y se pierde la forma
+MIN_POINTS = 2 + 3 * len(SERIES)
+
+
+def _valid(y):
+    """Índices de los valores no NaN."""
+    return np.flatnonzero(~np.isnan(y))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Índices (ordenados) de los n_out puntos que elige LTTB; ignora los NaN."""
+    valid = _valid(y)
+    x, y = x[valid], y[valid]
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return valid
+
+    # n_out - 2 buckets de igual número de puntos entre el primero y el último
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            avg_x = x[hi:edges[i + 2]].mean()
+            avg_y = y[hi:edges[i + 2]].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return valid[out]
+
+
+def minmax(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Índices del mínimo y el máximo de n_out // 2 buckets (más el primero y el último)."""
+    valid = _valid(y)
+    y = y[valid]
+    n = len(y)
+    if n_out >= n:
+        return valid
+
+    n_buckets = max((n_out - 2) // 2, 1)
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    out = [0, n - 1]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            out += (lo + int(y[lo:hi].argmin()), lo + int(y[lo:hi].argmax()))
+    return valid[np.unique(out)]
+
+
+def select(ts: np.ndarray, columns: dict, max_points: int) -> np.ndarray:
+    """
+    Índices de las filas a conservar para dibujar 'columns' (nombre ->
+    array alineado con 'ts') con max_points filas como mucho en total.
+    """
+    n = len(ts)
+    if n <= max_points:
+        return np.arange(n)
+
+    series = [name for name in SERIES if name in columns]
+    # El primero y el último van siempre; el resto se reparte entre las series
+    budget = max((max_points - 2) // max(len(series), 1), 3)
+    keep = [np.array([0, n - 1])]
+    for name in series:
+        y = np.asarray(columns[name], dtype=float)
+        if name in ANGLE_FIELDS:
+            keep.append(minmax(y, budget))
+        else:
+            keep.append(lttb(ts, y, budget))
+    keep = np.unique(np.concatenate(keep))
+    if len(keep) > max_points:
+        # Presupuesto por serie por debajo de 3 puntos: se recorta la unión
+        keep = keep[np.unique(np.linspace(0, len(keep) - 1, max_points).astype(np.int64))]
+    return keep
+
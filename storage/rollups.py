@@ -0,0 +1,196 @@
+import math
+import sqlite3
+
+import numpy as np
+
+from storage import shards
+
+# Resoluciones de agregación (segundos): 1 s / 10 s / 1 min / 10 min.
+# Todas dividen 86400, así que un bucket nunca cruza dos shards diarios.
+RESOLUTIONS = (1, 10, 60, 600)
+
+# Columna de telemetry_samples -> prefijo en telemetry_rollups (min/max/mean)
+LINEAR_FIELDS = {
+    "sog_kn": "sog",
+    "roll_deg": "heel",
+    "wind_speed_kn": "wind",
+}
+
+# Ángulos: media vectorial (circular), no aritmética
+ANGLE_FIELDS = {
+    "wind_dir_deg": "wind_dir",
+    "hdg_deg": "hdg",
+}
+
+# Posición: último valor del bucket (para las tarjetas del dashboard)
+LAST_FIELDS = ("lat_deg", "lon_deg", "alt_msl_m")
+
+
+# ============================================================
+#   CREACIÓN DE TABLAS
+# ============================================================
+def create_rollup_table(conn: sqlite3.Connection):
+    """Crea telemetry_rollups (una fila por resolución y bucket) si no existe."""
+    linear = ",\n".join(
+        f"{p}_min REAL, {p}_max REAL, {p}_mean REAL" for p in LINEAR_FIELDS.values()
+    )
+    angles = ",\n".join(f"{p}_mean_deg REAL" for p in ANGLE_FIELDS.values())
+    last = ",\n".join(f"{c} REAL" for c in LAST_FIELDS)
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS telemetry_rollups (
+            resolution_s  INTEGER NOT NULL,
+            bucket_start  REAL NOT NULL,
+            count         INTEGER NOT NULL,
+            {linear},
+            {angles},
+            {last},
+            PRIMARY KEY (resolution_s, bucket_start)
+        );
+        """
+    )
+    conn.commit()
+
+
+# ============================================================
+#   ACTUALIZACIÓN INCREMENTAL
+# ============================================================
+def _circular_mean(deg: np.ndarray, inverse: np.ndarray, n_buckets: int):
+    """Media vectorial por bucket (en grados, 0-360); NaN si no hay datos."""
+    ok = ~np.isnan(deg)
+    rad = np.radians(deg[ok])
+    s = np.bincount(inverse[ok], weights=np.sin(rad), minlength=n_buckets)
+    c = np.bincount(inverse[ok], weights=np.cos(rad), minlength=n_buckets)
+    n = np.bincount(inverse[ok], minlength=n_buckets)
+    mean = np.degrees(np.arctan2(s, c)) % 360.0
+    mean[n == 0] = np.nan
+    return mean
+
+
+def _group_stats(values: np.ndarray, inverse: np.ndarray, n_buckets: int):
+    """min/max/media por bucket ignorando NaN."""
+    ok = ~np.isnan(values)
+    idx = inverse[ok]
+    v = values[ok]
+
+    n = np.bincount(idx, minlength=n_buckets)
+    total = np.bincount(idx, weights=v, minlength=n_buckets)
+    v_min = np.full(n_buckets, np.inf)
+    v_max = np.full(n_buckets, -np.inf)
+    np.minimum.at(v_min, idx, v)
+    np.maximum.at(v_max, idx, v)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / n
+    empty = n == 0
+    v_min[empty] = np.nan
+    v_max[empty] = np.nan
+    mean[empty] = np.nan
+    return v_min, v_max, mean
+
+
+def update_rollups(conn: sqlite3.Connection, t_min: float, t_max: float):
+    """
+    Recalcula los buckets de todas las resoluciones que tocan [t_min, t_max]
+    a partir de telemetry_samples de esta conexión (un shard).
+
+    Se recalcula el bucket entero en lugar de sumar al existente, así que
+    es idempotente: volver a unir la ventana de frontera no duplica cuentas.
+    """
+    create_rollup_table(conn)
+
+    coarsest = max(RESOLUTIONS)
+    lo = math.floor(t_min / coarsest) * coarsest
+    hi = (math.floor(t_max / coarsest) + 1) * coarsest
+
+    columns = list(LINEAR_FIELDS) + list(ANGLE_FIELDS) + list(LAST_FIELDS)
+    rows = conn.execute(
+        f"""
+        SELECT timestamp_utc, {", ".join(columns)}
+        FROM telemetry_samples
+        WHERE timestamp_utc >= ? AND timestamp_utc < ?
+        ORDER BY timestamp_utc ASC;
+        """,
+        (lo, hi),
+    ).fetchall()
+    if not rows:
+        return
+
+    data = np.array(rows, dtype=float)
+    ts = data[:, 0]
+
+    out = []
+    for res in RESOLUTIONS:
+        buckets, inverse, counts = np.unique(
+            np.floor(ts / res) * res, return_inverse=True, return_counts=True
+        )
+        n_buckets = buckets.size
+        cols = [buckets, counts]
+        for i in range(len(LINEAR_FIELDS)):
+            cols.extend(_group_stats(data[:, 1 + i], inverse, n_buckets))
+        for i in range(len(ANGLE_FIELDS)):
+            cols.append(_circular_mean(data[:, 1 + len(LINEAR_FIELDS) + i], inverse, n_buckets))
+        # Filas ordenadas por tiempo: la última de cada bucket
+        last_idx = np.cumsum(counts) - 1
+        for i in range(len(LAST_FIELDS)):
+            cols.append(data[last_idx, 1 + len(LINEAR_FIELDS) + len(ANGLE_FIELDS) + i])
+
+        # NaN se guarda como NULL en SQLite
+        for row in zip(*(c.tolist() for c in cols)):
+            out.append((res,) + row)
+
+    placeholders = ", ".join("?" for _ in out[0])
+    with conn:
+        conn.execute(
+            "DELETE FROM telemetry_rollups WHERE bucket_start >= ? AND bucket_start < ?;", (lo, hi)
+        )
+        conn.executemany(f"INSERT INTO telemetry_rollups VALUES ({placeholders});", out)
+
+
+def clear_rollups(conn: sqlite3.Connection):
+    """Vacía telemetry_rollups (reconstrucción completa)."""
+    create_rollup_table(conn)
+    conn.execute("DELETE FROM telemetry_rollups;")
+    conn.commit()
+
+
+# ============================================================
+#   CONSULTA
+# ============================================================
+def choose_resolution(span_s: float, points: int):
+    """
+    Resolución más gruesa que aún da al menos 'points' buckets en 'span_s'
+    segundos. Devuelve None si ni la de 1 s basta (usar filas crudas).
+    """
+    fitting = [res for res in RESOLUTIONS if span_s / res >= points]
+    return max(fitting) if fitting else None
+
+
+def fetch_rollups(resolution_s: int, t_min: float | None = None, t_max: float | None = None):
+    """Filas de telemetry_rollups de una resolución en [t_min, t_max], en orden temporal."""
+    where = ["resolution_s = ?"]
+    params = [resolution_s]
+    if t_min is not None:
+        where.append("bucket_start >= ?")
+        params.append(math.floor(t_min / resolution_s) * resolution_s)
+    if t_max is not None:
+        where.append("bucket_start <= ?")
+        params.append(t_max)
+
+    sql = f"""
+        SELECT *
+        FROM telemetry_rollups
+        WHERE {" AND ".join(where)}
+        ORDER BY bucket_start ASC;
+    """
+    return shards.query(sql, params, t_min=t_min, t_max=t_max, tables=("telemetry_rollups",))
+
+
+def rollup_columns():
+    """Nombres de columna de telemetry_rollups, en el orden de SELECT *."""
+    cols = ["resolution_s", "bucket_start", "count"]
+    for p in LINEAR_FIELDS.values():
+        cols += [f"{p}_min", f"{p}_max", f"{p}_mean"]
+    cols += [f"{p}_mean_deg" for p in ANGLE_FIELDS.values()]
+    cols += list(LAST_FIELDS)
+    return cols
@@ -0,0 +1,297 @@
+import os
+import re
+import sys
+import time
+import math
+import calendar
+import sqlite3
+import logging
+import threading
+
+from config import SHARD_PERIOD, SHARD_DIR, SHARD_RETENTION_DAYS, DB_PRAGMAS
+from core.database import get_connection, close_path
+
+# Ruta ABSOLUTA a la BD monolítica (la de storage/db.py, usada si no hay shards)
+LEGACY_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "telemetria.db")
+
+# Tablas de muestras que se particionan
+SAMPLE_TABLES = (
+    "gps_samples", "attitude_samples", "imu_samples", "wind_samples",
+    "nav_samples", "environment_samples",
+)
+
+# Límite por defecto de SQLite para bases de datos adjuntas (SQLITE_MAX_ATTACHED)
+MAX_ATTACHED = 10
+
+SHARD_PREFIX = "telemetria_"
+_SHARD_RE = re.compile(r"^telemetria_(\d{8}T\d{6})\.db$")
+
+_session_start = None
+_initialized = set()     # shards con tablas ya creadas en este proceso
+_shard_lock = threading.Lock()
+
+
+# ============================================================
+#   LOCALIZACIÓN DE SHARDS
+# ============================================================
+def shard_start(ts):
+    """Inicio (epoch UTC) del shard al que pertenece una muestra con timestamp ts."""
+    global _session_start
+    if SHARD_PERIOD == "session":
+        if _session_start is None:
+            _session_start = math.floor(ts)
+        return _session_start
+    return ts - ts % 86400
+
+
+def shard_path(start):
+    """Ruta del fichero de shard que empieza en 'start'."""
+    name = time.strftime("%Y%m%dT%H%M%S", time.gmtime(start))
+    return os.path.join(SHARD_DIR, f"{SHARD_PREFIX}{name}.db")
+
+
+def list_shards():
+    """
+    Lista los shards existentes como (inicio, fin, ruta), ordenados por tiempo.
+    Cada shard cubre [inicio, inicio del siguiente); el último no tiene fin.
+    Sin particionado devuelve solo la BD monolítica.
+    """
+    if not SHARD_PERIOD:
+        return [(-math.inf, math.inf, LEGACY_DB_PATH)]
+
+    starts = []
+    if os.path.isdir(SHARD_DIR):
+        for name in os.listdir(SHARD_DIR):
+            m = _SHARD_RE.match(name)
+            if m:
+                start = calendar.timegm(time.strptime(m.group(1), "%Y%m%dT%H%M%S"))
+                starts.append((start, os.path.join(SHARD_DIR, name)))
+    starts.sort()
+
+    shards = []
+    for i, (start, path) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else math.inf
+        shards.append((start, end, path))
+    return shards
+
+
+def shards_for_range(t_min=None, t_max=None):
+    """Shards que se solapan con [t_min, t_max] (None = sin límite)."""
+    return [
+        (start, end, path)
+        for start, end, path in list_shards()
+        if (t_max is None or start <= t_max) and (t_min is None or end > t_min)
+    ]
+
+
+# ============================================================
+#   ESCRITURA
+# ============================================================
+def get_shard_connection(ts, retention=True):
+    """
+    Conexión del hilo actual al shard donde va una muestra con timestamp ts.
+    Crea el shard (y sus tablas) si no existe; al abrir uno nuevo se aplica
+    la retención (salvo con retention=False, p.ej. en la migración).
+    """
+    if not SHARD_PERIOD:
+        path = LEGACY_DB_PATH
+    else:
+        path = shard_path(shard_start(ts))
+
+    if path not in _initialized:
+        from storage.db import init_db
+
+        with _shard_lock:
+            if path not in _initialized:
+                is_new = not os.path.exists(path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                init_db(get_connection(path))
+                _initialized.add(path)
+                if is_new and SHARD_PERIOD:
+                    logging.info(f"Nuevo shard de telemetría: {path}")
+                    if retention:
+                        apply_retention()
+
+    return get_connection(path)
+
+
+def retention_limit(now=None, days=None):
+    """Epoch antes del cual terminan los shards que borra la retención (None si no hay retención)."""
+    days = SHARD_RETENTION_DAYS if days is None else days
+    if not SHARD_PERIOD or not days:
+        return None
+    return (now or time.time()) - days * 86400
+
+
+def apply_retention(now=None, days=None):
+    """
+    Borra los shards cuyo periodo terminó hace más de 'days' días
+    (por defecto SHARD_RETENTION_DAYS; None en config desactiva la retención).
+    Sustituye a DELETE + VACUUM: no bloquea a los escritores.
+    """
+    limit = retention_limit(now, days)
+    if limit is None:
+        return []
+
+    removed = []
+    for start, end, path in list_shards():
+        if end >= limit:
+            break
+        # Sin esto, los hilos que ya tenían el shard abierto seguirían
+        # escribiendo sin error en el fichero borrado
+        close_path(path)
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+        _initialized.discard(path)
+        removed.append(path)
+        logging.info(f"Retención: shard eliminado {os.path.basename(path)}")
+    return removed
+
+
+# ============================================================
+#   CONSULTA (ATTACH)
+# ============================================================
+def _attach_group(shards, tables):
+    """
+    Abre una conexión en memoria, adjunta 'shards' y crea vistas temporales
+    con el nombre de cada tabla que unen (UNION ALL) sus filas.
+    Devuelve None si alguna tabla no existe en ningún shard del grupo.
+    """
+    conn = sqlite3.connect(":memory:", timeout=DB_PRAGMAS.get("busy_timeout", 5000) / 1000.0)
+    sources = {table: [] for table in tables}
+
+    for i, (_, _, path) in enumerate(shards):
+        alias = f"s{i}"
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        present = {row[0] for row in conn.execute(f"SELECT name FROM {alias}.sqlite_master WHERE type = 'table'")}
+        for table in tables:
+            if table in present:
+                sources[table].append(alias)
+
+    for table, aliases in sources.items():
+        if not aliases:
+            conn.close()
+            return None
+        union = " UNION ALL ".join(f"SELECT * FROM {alias}.{table}" for alias in aliases)
+        conn.execute(f"CREATE TEMP VIEW {table} AS {union}")
+
+    return conn
+
+
+def query(sql, params=(), t_min=None, t_max=None, tables=SAMPLE_TABLES, newest_first=False):
+    """
+    Ejecuta 'sql' sobre los shards que se solapan con [t_min, t_max].
+
+    'sql' se escribe como si fuese una única BD: cada tabla de 'tables' es
+    una vista que une los shards adjuntos. Si hay más shards que
+    MAX_ATTACHED se consulta por grupos, en orden temporal (o inverso con
+    newest_first), así que un ORDER BY timestamp_utc coherente con ese orden
+    mantiene el orden global. Es un generador de filas: cortarlo (p.ej. con
+    itertools.islice) evita adjuntar los grupos restantes.
+    """
+    shards = shards_for_range(t_min, t_max)
+    shards = [s for s in shards if os.path.exists(s[2])]
+    if newest_first:
+        shards.reverse()
+
+    for i in range(0, len(shards), MAX_ATTACHED):
+        conn = _attach_group(shards[i:i + MAX_ATTACHED], tables)
+        if conn is None:
+            continue
+        try:
+            cur = conn.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(1000)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+
+def table_columns(table):
+    """Nombres de columna de 'table' según el shard más reciente que la tenga."""
+    for _, _, path in reversed(list_shards()):
+        if not os.path.exists(path):
+            continue
+        cols = [row[1] for row in get_connection(path).execute(f"PRAGMA table_info({table})")]
+        if cols:
+            return cols
+    return []
+
+
+# ============================================================
+#   MIGRACIÓN DE LA BD MONOLÍTICA
+# ============================================================
+def migrate_legacy_db(legacy_path=None):
+    """
+    Copia las filas *_samples de la BD monolítica a sus shards por día.
+    Cada (tabla, shard) copiado se apunta en migrated_to_shards de la BD
+    monolítica, así que repetir la migración no duplica filas. No aplica la
+    retención: los días que ya caen fuera de SHARD_RETENTION_DAYS se saltan.
+    """
+    legacy_path = legacy_path or LEGACY_DB_PATH
+    if not SHARD_PERIOD or not os.path.exists(legacy_path):
+        return 0
+
+    legacy = sqlite3.connect(legacy_path)
+    legacy.execute("""
+        CREATE TABLE IF NOT EXISTS migrated_to_shards (
+            table_name  TEXT NOT NULL,
+            shard_start REAL NOT NULL,
+            rows        INTEGER,
+            PRIMARY KEY (table_name, shard_start)
+        );
+    """)
+    done = set(legacy.execute("SELECT table_name, shard_start FROM migrated_to_shards"))
+    # Los días que la retención ya borraría no se copian (ni se marcan como hechos)
+    limit = retention_limit()
+    copied = 0
+    for table in SAMPLE_TABLES:
+        try:
+            cols = [row[1] for row in legacy.execute(f"PRAGMA table_info({table})") if row[1] != "id"]
+            ts_min, ts_max = legacy.execute(f"SELECT MIN(timestamp_utc), MAX(timestamp_utc) FROM {table}").fetchone()
+        except sqlite3.Error:
+            continue
+        if not cols or ts_min is None:
+            continue
+
+        col_list = ", ".join(cols)
+        start = shard_start(ts_min)
+        while start <= ts_max:
+            end = start + 86400 if SHARD_PERIOD == "day" else math.inf
+            if (table, start) in done or (limit is not None and end < limit):
+                start = end
+                continue
+            conn = get_shard_connection(start, retention=False)
+            rows = legacy.execute(
+                f"SELECT {col_list} FROM {table} WHERE timestamp_utc >= ? AND timestamp_utc < ?",
+                (start, end),
+            ).fetchall()
+            if rows:
+                placeholders = ", ".join("?" for _ in cols)
+                with conn:
+                    conn.executemany(f"INSERT INTO {table} ({col_list}) VALUES ({placeholders})", rows)
+                copied += len(rows)
+            with legacy:
+                legacy.execute("INSERT INTO migrated_to_shards VALUES (?, ?, ?);", (table, start, len(rows)))
+            start = end
+    legacy.close()
+    return copied
+
+
+if __name__ == "__main__":
+    accion = sys.argv[1] if len(sys.argv) > 1 else "list"
+
+    if accion == "migrate":
+        print(f"[OK] Filas copiadas a shards: {migrate_legacy_db()}")
+    elif accion == "retention":
+        removed = apply_retention()
+        print(f"[OK] Shards eliminados: {len(removed)}")
+    else:
+        for start, end, path in list_shards():
+            size_mb = os.path.getsize(path) / 1e6 if os.path.exists(path) else 0.0
+            print(f"{os.path.basename(path)}  {size_mb:8.2f} MB")
@@ -0,0 +1,312 @@
+import os
+import re
+import sys
+import time
+import bisect
+import struct
+import calendar
+import logging
+import threading
+
+from pymavlink import mavutil
+
+from config import TLOG_DIR, TLOG_MAX_FILE_MB, TLOG_MAX_TOTAL_MB
+
+# Fichero: cabecera + registros (t_us, longitud, bytes crudos del enlace).
+# Los bytes se guardan tal cual llegan de la Pixhawk (sin decodificar); las
+# lecturas consecutivas en menos de RECORD_WINDOW s van en un solo registro.
+_FILE_MAGIC = b"SBTLOG\x00\x01"
+_RECORD = struct.Struct(">QI")
+RECORD_WINDOW = 0.01
+
+# Índice disperso (<fichero>.idx): (t_us, posición) como mucho cada INDEX_INTERVAL s
+_INDEX = struct.Struct(">QQ")
+INDEX_INTERVAL = 1.0
+
+# Cada cuánto se vuelca a disco lo que hay en los buffers de Python
+FLUSH_INTERVAL = 1.0
+
+TLOG_PREFIX = "mavlink_"
+_TLOG_RE = re.compile(r"^mavlink_(\d{8}T\d{6})(?:_\d+)?\.tlog$")
+
+
+# ============================================================
+#   GRABACIÓN
+# ============================================================
+class TlogRecorder:
+    """
+    Grabador de bytes crudos MAVLink. Se engancha a pymavlink como
+    'master.logfile_raw': write() recibe cada trozo leído del puerto y solo
+    lo copia a un buffer; el registro se escribe al pasar RECORD_WINDOW.
+    """
+
+    def __init__(self, directory=None, max_file_bytes=None, max_total_bytes=None):
+        self.directory = directory or TLOG_DIR
+        self.max_file_bytes = max_file_bytes or TLOG_MAX_FILE_MB * 1024 * 1024
+        self.max_total_bytes = max_total_bytes or TLOG_MAX_TOTAL_MB * 1024 * 1024
+        self.path = None
+        self.stats = {"bytes": 0, "records": 0, "files": 0, "removed": 0}
+        self._f = None
+        self._idx = None
+        self._offset = 0
+        self._pending = bytearray()
+        self._pending_t = 0.0
+        self._last_index_t = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def write(self, data, t=None):
+        now = time.time() if t is None else t
+        with self._lock:
+            if self._pending and now - self._pending_t >= RECORD_WINDOW:
+                self._write_record()
+            if not self._pending:
+                self._pending_t = now
+            self._pending += data
+
+    def _write_record(self):
+        if self._f is None or self._offset >= self.max_file_bytes:
+            self._rotate()
+
+        t = self._pending_t
+        t_us = int(t * 1e6)
+        if self._last_index_t is None or t - self._last_index_t >= INDEX_INTERVAL:
+            self._idx.write(_INDEX.pack(t_us, self._offset))
+            self._last_index_t = t
+
+        self._f.write(_RECORD.pack(t_us, len(self._pending)))
+        self._f.write(self._pending)
+        self._offset += _RECORD.size + len(self._pending)
+        self.stats["bytes"] += len(self._pending)
+        self.stats["records"] += 1
+        self._pending.clear()
+
+        if t - self._last_flush >= FLUSH_INTERVAL:
+            self._f.flush()
+            self._idx.flush()
+            self._last_flush = t
+
+    def _rotate(self):
+        self._close_files()
+        os.makedirs(self.directory, exist_ok=True)
+
+        name = time.strftime("%Y%m%dT%H%M%S", time.gmtime(self._pending_t))
+        path = os.path.join(self.directory, f"{TLOG_PREFIX}{name}.tlog")
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f"{TLOG_PREFIX}{name}_{n}.tlog")
+            n += 1
+
+        self._f = open(path, "wb", buffering=64 * 1024)
+        self._f.write(_FILE_MAGIC)
+        self._idx = open(index_path(path), "wb")
+        self._offset = len(_FILE_MAGIC)
+        self._last_index_t = None
+        self.path = path
+        self.stats["files"] += 1
+        logging.info(f"📼 Nuevo tlog MAVLink: {path}")
+        self._apply_retention()
+
+    def _apply_retention(self):
+        """Borra los tlog más antiguos mientras el total supere max_total_bytes."""
+        files = [path for _, path in list_files(self.directory)]
+        sizes = {path: os.path.getsize(path) for path in files}
+        total = sum(sizes.values())
+        for path in files:
+            if total <= self.max_total_bytes or path == self.path:
+                break
+            for p in (path, index_path(path)):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= sizes[path]
+            self.stats["removed"] += 1
+            logging.info(f"🧹 tlog eliminado por espacio: {path}")
+
+    def _close_files(self):
+        for f in (self._f, self._idx):
+            if f is not None:
+                f.close()
+        self._f = self._idx = None
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._write_record()
+            if self._f is not None:
+                self._f.flush()
+                self._idx.flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._close_files()
+
+
+_recorder = None
+
+
+def start_recorder():
+    """Grabador del proceso (idempotente): se conserva entre reconexiones."""
+    global _recorder
+    if _recorder is None:
+        _recorder = TlogRecorder()
+        logging.info(f"📼 Grabación cruda MAVLink en {_recorder.directory}")
+    return _recorder
+
+
+def stop_recorder():
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+# ============================================================
+#   LECTURA Y DECODIFICACIÓN BAJO DEMANDA
+# ============================================================
+def index_path(path):
+    return os.path.splitext(path)[0] + ".idx"
+
+
+def list_files(directory=None):
+    """tlog existentes como (inicio epoch UTC, ruta), ordenados por tiempo."""
+    directory = directory or TLOG_DIR
+    files = []
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            m = _TLOG_RE.match(name)
+            if m:
+                start = calendar.timegm(time.strptime(m.group(1), "%Y%m%dT%H%M%S"))
+                files.append((start, os.path.join(directory, name)))
+    files.sort()
+    return files
+
+
+def read_index(path):
+    """[(t_us, posición)] del índice disperso de un tlog."""
+    try:
+        with open(index_path(path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return []
+    n = len(data) // _INDEX.size
+    return list(_INDEX.iter_unpack(data[:n * _INDEX.size]))
+
+
+def iter_records(path, offset=None):
+    """(t_us, bytes) de cada registro desde 'offset' (un registro final a medias se ignora)."""
+    with open(path, "rb") as f:
+        if f.read(len(_FILE_MAGIC)) != _FILE_MAGIC:
+            raise ValueError(f"{path} no es un tlog de SailBridge")
+        if offset:
+            f.seek(offset)
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                return
+            t_us, length = _RECORD.unpack(head)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield t_us, data
+
+
+def decode(t_min=None, t_max=None, types=None, directory=None):
+    """
+    Mensajes MAVLink recibidos en [t_min, t_max] como (t, msg), con 't' el
+    momento de llegada (epoch UTC). Solo se leen los ficheros del rango y,
+    dentro de cada uno, desde la entrada del índice anterior a t_min.
+    """
+    types = set(types) if types else None
+    files = list_files(directory)
+    parser = mavutil.mavlink.MAVLink(None)
+    parser.robust_parsing = True
+
+    for i, (start, path) in enumerate(files):
+        end = files[i + 1][0] if i + 1 < len(files) else None
+        if t_max is not None and start > t_max:
+            return
+        if t_min is not None and end is not None and end < t_min:
+            continue
+
+        offset = None
+        if t_min is not None:
+            index = read_index(path)
+            pos = bisect.bisect_right([t for t, _ in index], int(t_min * 1e6)) - 1
+            if pos >= 0:
+                offset = index[pos][1]
+
+        for t_us, data in iter_records(path, offset):
+            t = t_us / 1e6
+            if t_max is not None and t > t_max:
+                return
+            msgs = parser.parse_buffer(data)
+            if not msgs or (t_min is not None and t < t_min):
+                continue
+            for msg in msgs:
+                msg_type = msg.get_type()
+                if msg_type == "BAD_DATA" or (types is not None and msg_type not in types):
+                    continue
+                yield t, msg
+
+
+def decode_table(msg_type, t_min=None, t_max=None, directory=None):
+    """Mensajes 'msg_type' del rango como columnas: {'timestamp_utc': [...], campo: [...]}."""
+    table = None
+    for t, msg in decode(t_min, t_max, (msg_type,), directory):
+        if table is None:
+            table = {"timestamp_utc": []}
+            table.update({name: [] for name in msg.get_fieldnames()})
+        table["timestamp_utc"].append(t)
+        for name in msg.get_fieldnames():
+            table[name].append(getattr(msg, name))
+    return table or {"timestamp_utc": []}
+
+
+def export(path, t_min=None, t_max=None, types=None, directory=None):
+    """Exporta el rango a un .tlog estándar (abre con mavlogdump/MAVExplorer)."""
+    n = 0
+    with open(path, "wb") as f:
+        for t, msg in decode(t_min, t_max, types, directory):
+            f.write(struct.pack(">Q", int(t * 1e6)) + msg.get_msgbuf())
+            n += 1
+    return n
+
+
+def _parse_time(text):
+    """Epoch en segundos o fecha UTC 'AAAA-MM-DDTHH:MM:SS'."""
+    try:
+        return float(text)
+    except ValueError:
+        return calendar.timegm(time.strptime(text.replace(" ", "T"), "%Y-%m-%dT%H:%M:%S"))
+
+
+if __name__ == "__main__":
+    # python -m storage.tlog                                  -> ficheros
+    # python -m storage.tlog decode TIPO DESDE HASTA [salida.csv]
+    # python -m storage.tlog export DESDE HASTA salida.tlog [TIPO,TIPO...]
+    accion = sys.argv[1] if len(sys.argv) > 1 else "list"
+
+    if accion == "decode":
+        msg_type, t_min, t_max = sys.argv[2], _parse_time(sys.argv[3]), _parse_time(sys.argv[4])
+        table = decode_table(msg_type, t_min, t_max)
+        columns = list(table)
+        out = open(sys.argv[5], "w") if len(sys.argv) > 5 else sys.stdout
+        out.write(",".join(columns) + "\n")
+        for row in zip(*(table[c] for c in columns)):
+            out.write(",".join(str(v) for v in row) + "\n")
+        if out is not sys.stdout:
+            out.close()
+            print(f"[OK] {len(table['timestamp_utc'])} mensajes {msg_type} en {sys.argv[5]}")
+    elif accion == "export":
+        types = sys.argv[5].split(",") if len(sys.argv) > 5 else None
+        n = export(sys.argv[4], _parse_time(sys.argv[2]), _parse_time(sys.argv[3]), types)
+        print(f"[OK] {n} mensajes exportados a {sys.argv[4]}")
+    else:
+        for start, path in list_files():
+            index = read_index(path)
+            last = time.strftime("%H:%M:%S", time.gmtime(index[-1][0] / 1e6)) if index else "-"
+            print(f"{os.path.basename(path)}  {os.path.getsize(path) / 1e6:8.2f} MB  "
+                  f"hasta {last} UTC  ({len(index)} entradas de índice)")
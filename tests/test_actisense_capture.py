@@ -0,0 +1,82 @@
+"""
+Decodificación de una captura del NGT-1 (fixtures/ngt1_capture.bin, en el
+formato de scripts/bench_actisense.py --record) leída en trozos de tamaño
+aleatorio, como llegan del puerto.
+
+La captura empieza y acaba a mitad de trama e incluye un mensaje de estado
+del propio NGT-1, PGN sin extractor, DLE escapados en los datos y una trama
+con el checksum roto. fixtures/ngt1_capture.json tiene los mensajes de
+130306 / 127250 / 129026 que deben salir, con sus campos.
+"""
+
+import os
+import sys
+import json
+import random
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(TESTS_DIR))
+from core import actisense
+
+FIXTURES_DIR = os.path.join(TESTS_DIR, "fixtures")
+PGNS = (130306, 127250, 129026)
+
+# Media resolución de cada campo: 0.01 m/s y 0.0001 rad
+TOLERANCE = {"wind_speed_ms": 0.005, "sog_ms": 0.005}
+ANGLE_TOLERANCE = actisense._RAD4 / 2
+
+
+def load_capture():
+    with open(os.path.join(FIXTURES_DIR, "ngt1_capture.bin"), "rb") as f:
+        data = f.read()
+    with open(os.path.join(FIXTURES_DIR, "ngt1_capture.json")) as f:
+        expected = json.load(f)
+    return data, expected
+
+
+def feed_in_chunks(parser, data, rng, max_chunk=64):
+    messages = []
+    i = 0
+    while i < len(data):
+        n = rng.randint(1, max_chunk)
+        messages += parser.feed(data[i:i + n])
+        i += n
+    return messages
+
+
+def assert_fields(fields, expected):
+    assert set(fields) == set(expected)
+    for name, value in expected.items():
+        if value is None or isinstance(value, int) and name not in TOLERANCE:
+            assert fields[name] == value, name
+        elif name.endswith("_deg"):
+            assert fields[name] == pytest.approx(value, abs=ANGLE_TOLERANCE), name
+        else:
+            assert fields[name] == pytest.approx(value, abs=TOLERANCE[name]), name
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_capture_random_chunks(seed):
+    data, expected = load_capture()
+    parser = actisense.FrameParser(pgns=PGNS)
+    messages = feed_in_chunks(parser, data, random.Random(seed))
+
+    assert [(m.pgn, m.timestamp_ms) for m in messages] == [(e["pgn"], e["timestamp_ms"]) for e in expected]
+    for msg, exp in zip(messages, expected):
+        assert msg.src == 35
+        assert_fields(actisense.decode_fields(msg), exp["fields"])
+
+
+def test_capture_without_filter():
+    data, expected = load_capture()
+    parser = actisense.FrameParser()
+    messages = feed_in_chunks(parser, data, random.Random(0), max_chunk=7)
+
+    decoded = [m for m in messages if m.pgn in PGNS]
+    assert [m.pgn for m in decoded] == [e["pgn"] for e in expected]
+    # Además de los de la tabla salen Attitude y GNSS Position Data
+    assert {m.pgn for m in messages} - set(PGNS) == {127257, 129029}
+    # El estado del NGT-1 y la trama con el checksum roto
+    assert parser.stats["bad_frames"] == 2
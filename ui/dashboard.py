@@ -2,25 +2,29 @@ import sys
 import os
 import streamlit as st
 import pandas as pd
-import sqlite3
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates # <--- Nuevo: Para formatear el tiempo
 import time
 
 # Añadimos la carpeta raíz al path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import DB_PATH
+from core.live_buffer import open_reader
 
 def load_data():
+    # Vista en vivo: se lee del anillo en memoria compartida de main.py, no de la BD
+    reader = open_reader()
+    if reader is None:
+        return pd.DataFrame()
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query("SELECT * FROM telemetria ORDER BY timestamp DESC LIMIT 50", conn)
-        conn.close()
-        # Convertimos el string de la DB a objeto datetime real de Python
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df = pd.DataFrame(reader.columns(n=50))
+    finally:
+        reader.close()
+    if df.empty:
         return df
-    except Exception as e:
-        return pd.DataFrame()
+    # Más reciente primero, como antes; 't' es epoch UTC
+    df = df.iloc[::-1].reset_index(drop=True)
+    df['timestamp'] = pd.to_datetime(df['t'], unit='s')
+    return df
 
 st.set_page_config(page_title="SailBridge Dashboard", layout="wide")
 st.title("⛵ SailBridge OS: Telemetría en Tiempo Real")
@@ -66,16 +70,24 @@ if not data.empty:
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("Latitud", f"{last_row['lat']:.5f}")
     c2.metric("Longitud", f"{last_row['lon']:.5f}")
-    c3.metric("Timón (PWM)", f"{last_row['servo_rudder']}")
-    c4.metric("Vela (PWM)", f"{last_row['servo_sail']}")
+    c3.metric("Timón (PWM)", f"{last_row['servo_rudder']:.0f}")
+    c4.metric("Vela (PWM)", f"{last_row['servo_sail']:.0f}")
     
     st.caption(f"Última actualización: {last_row['timestamp'].strftime('%H:%M:%S')}")
+    # Edad de cada grupo de datos en la fila fusionada (sample-and-hold)
+    edades = [
+        f"{nombre} {last_row[col]:.1f}s"
+        for col, nombre in [('age_att', 'actitud'), ('age_gps', 'GPS'), ('age_wind', 'viento'), ('age_servo', 'servos')]
+        if col in last_row and pd.notna(last_row[col])
+    ]
+    if edades:
+        st.caption("Edad de los datos: " + " | ".join(edades))
 
     # --- BUCLE DE AUTO-REFRESCO ---
     time.sleep(2)
     st.rerun()
 
 else:
-    st.info("Esperando datos... Comprueba que 'simulator.py' esté funcionando.")
+    st.info("Esperando datos... Comprueba que 'main.py' o 'simulator.py' esté funcionando.")
     time.sleep(5)
     st.rerun()